@@ -0,0 +1,30 @@
+'''
+Benchmark: handler dispatch cost with large `conditions`/`exceptions` tables
+
+The handled outcome is the last key of the table, measured on the first
+attempt (its handler returns a result, so there's no retry).
+'''
+from common import record, timed
+from resilient_caller import resilient_call, RetryPolicy
+
+SIZES = (1, 100, 10000)
+
+def run(quick=False):
+    number = 2000 if quick else 20000
+    results = []
+    for size in SIZES:
+        conditions = {value: None for value in range(size - 1)}
+        conditions[size - 1] = lambda response: response
+        by_condition = resilient_call(policy=RetryPolicy(conditions=conditions))(lambda: size - 1)
+        results.append(record("dispatch", "conditions", timed(by_condition, number), size=size))
+
+        errors = [type(f"Error{index}", (Exception,), {}) for index in range(size)]
+        exceptions = {error: "handled" for error in errors}
+        last = errors[-1]
+
+        def fail():
+            raise last()
+
+        by_exception = resilient_call(policy=RetryPolicy(exceptions=exceptions))(fail)
+        results.append(record("dispatch", "exceptions", timed(by_exception, number), size=size))
+    return results
@@ -0,0 +1,81 @@
+'''
+Benchmark: cold-start cost of importing the package
+
+Every case runs in a fresh interpreter, timed with `-X importtime` (only the
+package's own imports count, not the interpreter startup). The core decorator
+must not import the HTTP stack or `asyncio`: run this file directly to guard it.
+
+Usage:
+    python benchmarks/bench_import.py [--budget-ms 50]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from common import record
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the core decorator must not import
+HEAVY = ("requests", "urllib3", "asyncio", "aiohttp", "sqlite3", "concurrent.futures")
+
+CASES = {
+    "core": "import resilient_caller",
+    "decorator": "from resilient_caller import resilient_call\n"
+                 "resilient_call()(lambda: 1)(retries=1)",
+    "http": "from resilient_caller import send_request",
+}
+
+def _probe(code):
+    """Runs `code` in a fresh interpreter, returns the import time in seconds and the heavy modules loaded"""
+    script = code + "\nimport sys\nprint(','.join(m for m in %r if m in sys.modules))" % (HEAVY,)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (PACKAGE_ROOT, os.environ.get("PYTHONPATH")))))
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True, env=env, check=True,
+    )
+    total = 0
+    for line in process.stderr.splitlines():
+        # "import time: self | cumulative | name", top level imports aren't indented
+        parts = line.split("|")
+        if len(parts) == 3 and not parts[2].startswith("  ") and parts[2].strip() != "package":
+            name = parts[2].strip()
+            if name.startswith("resilient_caller") or name in HEAVY:
+                total += int(parts[1])
+    heavy = [module for module in process.stdout.strip().split(",") if module]
+    return total / 1e6, heavy
+
+def run(quick=False):
+    repeat = 3 if quick else 10
+    results = []
+    for case, code in CASES.items():
+        samples, heavy = [], []
+        for _ in range(repeat):
+            elapsed, heavy = _probe(code)
+            samples.append(elapsed)
+        result = record("import", case, statistics.median(samples))
+        result["heavy_modules"] = heavy
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=50, help="maximum import time of the core decorator")
+    options = parser.parse_args()
+    results = run()
+    print(json.dumps(results, indent=2))
+    failures = []
+    for result in results:
+        if result["case"] == "http":
+            continue
+        if result["heavy_modules"]:
+            failures.append(f"{result['case']} imports {', '.join(result['heavy_modules'])}")
+        if result["per_call_us"] / 1000 > options.budget_ms:
+            failures.append(f"{result['case']} takes {result['per_call_us'] / 1000:.1f} ms")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+'''
+Benchmark: per-call overhead of the sync and async wrappers
+
+Every call fails `retries` times before succeeding, with no delay, so the
+numbers are the cost of the retry loop itself. The baseline is the undecorated
+function.
+'''
+import asyncio
+from common import record, timed
+from resilient_caller import resilient_call, RetryPolicy, RETRY_EVENT
+
+RETRIES = (0, 3, 50)
+POLICY = RetryPolicy(retries=100, exceptions={ValueError: RETRY_EVENT})
+
+class Flaky:
+    """Raises `ValueError` `failures` times out of every `failures + 1` calls"""
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls % (self.failures + 1):
+            raise ValueError("transient")
+        return self.calls
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    results = []
+    for retries in RETRIES:
+        flaky = Flaky(retries)
+        decorated = resilient_call(policy=POLICY)(flaky)
+        calls = max(1, number // (retries + 1))
+        baseline = timed(lambda: [_call(flaky) for _ in range(retries + 1)], calls)
+        per_call = timed(decorated, calls)
+        results.append(record("overhead", "sync", per_call, baseline, retries=retries))
+
+        async def target(flaky=Flaky(retries)):
+            return flaky()
+
+        decorated_async = resilient_call(policy=POLICY)(target)
+
+        async def batch(func, calls=calls):
+            for _ in range(calls):
+                await func()
+
+        per_call = timed(lambda: asyncio.run(batch(decorated_async)), 1, repeat=3) / calls
+        results.append(record("overhead", "async", per_call, retries=retries))
+    return results
+
+def _call(flaky):
+    try:
+        return flaky()
+    except ValueError:
+        return None
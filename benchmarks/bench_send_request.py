@@ -0,0 +1,61 @@
+'''
+Benchmark: `send_request` against a local HTTP stand-in server
+
+Compares a fresh `Session` per call, a reused one and the pooled default,
+with and without a proxy. The stand-in server also answers proxied
+(absolute URI) requests, so it doubles as the proxy.
+'''
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests import Session
+from common import record, timed
+from resilient_caller import send_request
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def fresh_session(url, **kwargs):
+    with Session() as session:
+        return send_request(url, session=session, **kwargs)
+
+def run(quick=False):
+    number = 50 if quick else 500
+    server = serve()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    proxy = f"127.0.0.1:{server.server_port}"
+    reused = Session()
+    results = []
+    try:
+        for proxied in (False, True):
+            kwargs = {"proxies": proxy} if proxied else {}
+            cases = (
+                ("fresh_session", lambda: fresh_session(url, **kwargs)),
+                ("reused_session", lambda: send_request(url, session=reused, **kwargs)),
+                ("pooled", lambda: send_request(url, **kwargs)),
+            )
+            for case, call in cases:
+                assert call().status_code == 200
+                results.append(record("send_request", case, timed(call, number, repeat=3), proxy=proxied))
+    finally:
+        reused.close()
+        server.shutdown()
+        server.server_close()
+    return results
@@ -0,0 +1,61 @@
+'''
+Benchmark: per-call overhead of the synchronous retry path
+
+Compares the native synchronous wrapper against the previous implementation,
+which ran every sync call through `asyncio.run` and `asyncio.to_thread`.
+
+Run it with the suite (`python benchmarks/run.py --only sync_wrapper`), or alone:
+    python benchmarks/bench_sync_wrapper.py [calls]
+'''
+import asyncio
+import sys
+from time import perf_counter
+from common import record, timed
+from resilient_caller import resilient_call, RetryPolicy, RETRY_EVENT
+
+def work(x):
+    return x
+
+@resilient_call()
+def native(x):
+    return work(x)
+
+KWARGS = {"retries": 3, "conditions": {-1: RETRY_EVENT}, "exceptions": {"all": RETRY_EVENT}}
+
+@resilient_call(policy=RetryPolicy(**KWARGS))
+def compiled(x):
+    return work(x)
+
+@resilient_call()
+async def legacy_async(x):
+    return await asyncio.to_thread(work, x)
+
+def legacy(x, **kwargs):
+    # What a decorated sync function used to do on every call
+    return asyncio.run(legacy_async(x, **kwargs))
+
+def measure(func, calls, **kwargs):
+    start = perf_counter()
+    for i in range(calls):
+        func(i, **kwargs)
+    return (perf_counter() - start) / calls
+
+CASES = (("compiled", compiled, {}), ("native", native, KWARGS), ("legacy", legacy, KWARGS))
+
+def run(quick=False):
+    number = 200 if quick else 2000
+    baseline = timed(lambda: work(0), number)
+    results = []
+    for name, func, kwargs in CASES:
+        # `asyncio.run` per call is slow, don't wait on it for as many calls
+        calls = number // 10 if name == "legacy" else number
+        per_call = timed(lambda: func(0, **kwargs), calls, repeat=3)
+        results.append(record("sync_wrapper", name, per_call, baseline))
+    return results
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    baseline = measure(work, calls)
+    for name, func, kwargs in CASES:
+        per_call = measure(func, calls, **kwargs)
+        print(f"{name:>8}: {per_call * 1e6:9.2f} us/call ({(per_call - baseline) * 1e6:9.2f} us overhead)")
@@ -0,0 +1,53 @@
+'''
+Benchmark: throughput of concurrent retried calls
+
+Every call fails once before succeeding and each attempt waits on simulated
+I/O, run with threads (`resilient_map`) and with asyncio (`gather_with_retry`).
+'''
+import asyncio
+from time import perf_counter, sleep
+from common import record
+from resilient_caller import resilient_call, resilient_map, gather_with_retry, RETRY_EVENT
+
+LATENCY = 0.001
+CONCURRENCY = (1, 16, 64)
+KWARGS = {"retries": 3, "exceptions": {ValueError: RETRY_EVENT}}
+
+def _first_attempt(item, seen):
+    if item in seen:
+        return False
+    seen.add(item)
+    return True
+
+@resilient_call()
+def fetch(item, seen):
+    sleep(LATENCY)
+    if _first_attempt(item, seen):
+        raise ValueError("transient")
+    return item
+
+@resilient_call()
+async def async_fetch(item, seen):
+    await asyncio.sleep(LATENCY)
+    if _first_attempt(item, seen):
+        raise ValueError("transient")
+    return item
+
+def run(quick=False):
+    calls = 200 if quick else 2000
+    results = []
+    for concurrency in CONCURRENCY:
+        start = perf_counter()
+        outcomes = list(resilient_map(fetch, range(calls), concurrency=concurrency, ordered=False, seen=set(), **KWARGS))
+        elapsed = perf_counter() - start
+        assert all(outcome.ok for outcome in outcomes)
+        results.append(record("throughput", "threads", elapsed / calls, concurrency=concurrency, calls=calls))
+
+        async def gather():
+            return await gather_with_retry(async_fetch, range(calls), concurrency=concurrency, seen=set(), **KWARGS)
+
+        start = perf_counter()
+        asyncio.run(gather())
+        elapsed = perf_counter() - start
+        results.append(record("throughput", "asyncio", elapsed / calls, concurrency=concurrency, calls=calls))
+    return results
@@ -0,0 +1,34 @@
+'''
+Shared helpers of the benchmark suite: timing and result records
+'''
+import os
+import sys
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+# Benchmark the checkout, installed or not: every benchmark imports this module first
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def timed(func: Callable[[], Any], number: int, repeat: int = 5) -> float:
+    """Returns the best per-call time in seconds of `repeat` runs of `number` calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (perf_counter() - start) / number)
+    return best
+
+def record(benchmark: str, case: str, per_call: float, baseline: Optional[float] = None,
+           **params) -> Dict[str, Any]:
+    """Returns a result record, `per_call` and `baseline` in seconds"""
+    result = {
+        "benchmark": benchmark,
+        "case": case,
+        "params": params,
+        "per_call_us": round(per_call * 1e6, 3),
+        "calls_per_second": round(1 / per_call, 1) if per_call else None,
+    }
+    if baseline is not None:
+        result["overhead_us"] = round((per_call - baseline) * 1e6, 3)
+    return result
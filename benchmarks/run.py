@@ -0,0 +1,91 @@
+'''
+Runs the benchmark suite and writes machine-readable results
+
+Results are JSON (one record per case, plus the environment), so runs of
+different versions can be compared with `--compare`.
+
+Usage:
+    python benchmarks/run.py [--quick] [--only overhead,dispatch] [--output results.json]
+    python benchmarks/run.py --compare baseline.json
+'''
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+# Imported first, puts the checkout on `sys.path`
+import common
+import bench_dispatch
+import bench_import
+import bench_overhead
+import bench_send_request
+import bench_sync_wrapper
+import bench_throughput
+
+SUITES = {
+    "import": bench_import,
+    "overhead": bench_overhead,
+    "sync_wrapper": bench_sync_wrapper,
+    "dispatch": bench_dispatch,
+    "throughput": bench_throughput,
+    "send_request": bench_send_request,
+}
+
+def package_version():
+    try:
+        from importlib.metadata import version
+        return version("resilient_caller")
+    except Exception:
+        return "unknown"
+
+def case_key(result):
+    return result["benchmark"], result["case"], json.dumps(result["params"], sort_keys=True)
+
+def compare(results, baseline):
+    """Prints the change of every case found in both runs"""
+    previous = {case_key(result): result for result in baseline["results"]}
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            continue
+        change = (result["per_call_us"] - old["per_call_us"]) / old["per_call_us"] * 100 if old["per_call_us"] else 0
+        print(
+            f"{result['benchmark']:>12} {result['case']:<16} {json.dumps(result['params']):<48} "
+            f"{old['per_call_us']:>10.2f} -> {result['per_call_us']:>10.2f} us ({change:+.1f}%)",
+            file=sys.stderr,
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke runs")
+    parser.add_argument("--only", help="comma separated suites to run: " + ",".join(SUITES))
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    parser.add_argument("--compare", help="results file of a previous run to compare with")
+    options = parser.parse_args()
+
+    names = options.only.split(",") if options.only else list(SUITES)
+    results = []
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results.extend(SUITES[name].run(quick=options.quick))
+
+    report = {
+        "version": package_version(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as file:
+            compare(results, json.load(file))
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
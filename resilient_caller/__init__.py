@@ -1,4 +1,53 @@
 from .wrapper import RETRY_EVENT, resilient_call, with_retry
-from .send_requests import send_request
-from .exceptions import UnhandledException, UnsupportedProxyType
-from .utils import update_session_proxy, proxy_to_dict
\ No newline at end of file
+from .policy import RetryPolicy
+from .exceptions import (
+    UnhandledException, UnsupportedProxyType, RetriesExhausted, CircuitOpenError, AttemptTimeout,
+    IncompleteDownload,
+)
+
+# Everything else is imported on first access, so using the decorator alone
+# doesn't pay for importing `requests`, `asyncio` or `sqlite3`
+_LAZY = {
+    "backoff": None,
+    "RetryScheduler": "scheduler",
+    "BatchLoader": "batching",
+    "Outcome": "bulk", "resilient_map": "bulk", "async_resilient_map": "bulk", "gather_with_retry": "bulk",
+    "send_request": "send_requests", "async_send_request": "send_requests",
+    "SessionPool": "sessions", "AsyncSessionPool": "sessions",
+    "Download": "downloads", "download": "downloads",
+    "Proxy": "proxies", "ProxyPool": "proxies", "proxy_healthy": "proxies",
+    "CircuitBreaker": "breaker",
+    "RetryBudget": "limits", "RateLimiter": "limits",
+    "AdaptiveLimiter": "adaptive",
+    "StateBackend": "shared", "LocalBackend": "shared", "MmapBackend": "shared", "RedisBackend": "shared",
+    "Hedge": "hedging",
+    "remaining_time": "timeouts",
+    "ResultCache": "cache", "request_cache_key": "cache", "http_cache_ttl": "cache",
+    "Observer": "observers", "MetricsRegistry": "observers", "SpanObserver": "observers",
+    "CallEvent": "observers", "AttemptEvent": "observers",
+    "DeadLetter": "deadletter", "DeadLetterQueue": "deadletter",
+    "update_session_proxy": "utils", "proxy_to_dict": "utils", "proxy_to_url": "utils", "host_key": "utils",
+}
+
+__all__ = [
+    "RETRY_EVENT", "resilient_call", "with_retry", "RetryPolicy",
+    "UnhandledException", "UnsupportedProxyType", "RetriesExhausted", "CircuitOpenError", "AttemptTimeout",
+    "IncompleteDownload",
+    *_LAZY,
+]
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    module = _LAZY[name]
+    if module is None:
+        value = import_module(f".{name}", __name__)
+    else:
+        value = getattr(import_module(f".{module}", __name__), name)
+    # Cache it, later accesses don't go through __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return __all__
@@ -0,0 +1,210 @@
+import functools
+import threading
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+
+from .observers import Observer, AttemptEvent, RETRY
+from .policy import iscoroutinefunction
+from .wrapper import with_retry
+
+class AdaptiveLimiter(Observer):
+    """An AIMD concurrency limiter fed by the outcome and latency of attempts.
+
+    The number of calls allowed in flight grows by `increase` on every fast,
+    successful attempt made while the limit is in use, and is multiplied by
+    `decrease` when an attempt is retried, fails, or is slower than
+    `latency_tolerance` times the baseline (the lowest recent latency). A
+    decrease only happens once per baseline latency, so a burst of failures
+    of the same wave doesn't collapse the limit.
+
+    Thread and async callers share the same limit. Wrap the calls with
+    `wrap` (or use the limiter as a decorator), the limiter then observes
+    their attempts.
+
+    Args:
+        initial (int): starting limit
+        min_limit (int): lowest limit
+        max_limit (int): highest limit
+        increase (float): added to the limit on a good attempt
+        decrease (float): factor applied to the limit on a bad attempt
+        latency_tolerance (float): latency ratio to the baseline considered as congestion
+
+    Example:
+        >>> from resilient_caller import AdaptiveLimiter, resilient_call, resilient_map, RETRY_EVENT
+        >>>
+        >>> limiter = AdaptiveLimiter(initial=10, max_limit=200)
+        >>>
+        >>> @limiter
+        ... @resilient_call()
+        ... def fetch(url):
+        ...     ...
+        >>>
+        >>> resilient_map(fetch, urls, concurrency=200, retries=3, exceptions={"all": RETRY_EVENT})
+        >>> limiter.limit
+        42
+    """
+    def __init__(self, initial: int = 10, min_limit: int = 1, max_limit: int = 1000, increase: float = 1,
+                 decrease: float = 0.5, latency_tolerance: float = 2.0):
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.inflight = 0
+        self.baseline: Optional[float] = None
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._decreased = 0.0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: List[tuple] = []
+
+    @property
+    def limit(self) -> int:
+        """Calls currently allowed in flight"""
+        return int(self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the limit, the calls in flight and waiting, and the baseline latency"""
+        return {
+            "limit": self.limit, "inflight": self.inflight,
+            "waiting": len(self._async_waiters), "baseline": self.baseline,
+        }
+
+    def acquire(self) -> None:
+        """Waits for a slot"""
+        with self._condition:
+            while self.inflight >= int(self._limit):
+                self._condition.wait()
+            self.inflight += 1
+
+    async def async_acquire(self) -> None:
+        """Waits for a slot without blocking the event loop"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while 1:
+            with self._lock:
+                if self.inflight < int(self._limit):
+                    self.inflight += 1
+                    return
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            except BaseException:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                    else:
+                        # Woken but cancelled before taking the slot, pass the wakeup on
+                        self._wake()
+                raise
+
+    def release(self) -> None:
+        """Frees a slot"""
+        with self._lock:
+            self.inflight -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        # Called with the lock held: let as many waiters as free slots check again
+        free = int(self._limit) - self.inflight
+        if free <= 0:
+            return
+        self._condition.notify(free)
+        for loop, future in self._async_waiters[:free]:
+            loop.call_soon_threadsafe(_resolve, future)
+        del self._async_waiters[:free]
+
+    def record(self, latency: float, dropped: bool) -> None:
+        """Adjusts the limit from the outcome of an attempt"""
+        with self._lock:
+            baseline = self.baseline
+            if baseline is None or latency < baseline:
+                baseline = self.baseline = latency
+            else:
+                # Let the baseline follow latency drifts slowly
+                baseline = self.baseline = baseline + (latency - baseline) * 0.01
+            if dropped or latency > baseline * self.latency_tolerance:
+                now = monotonic()
+                if now - self._decreased >= baseline:
+                    self._decreased = now
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+            elif self.inflight * 2 >= int(self._limit):
+                # Only grow a limit that's actually in use
+                self._limit = min(self.max_limit, self._limit + self.increase)
+                self._wake()
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        self.record(event.duration, event.outcome == RETRY or event.error is not None)
+
+    def _call_kwargs(self, policy, kwargs: dict) -> dict:
+        # Observe the attempts of the call, keeping the caller's observer
+        if "observer" in kwargs:
+            kwargs["observer"] = [self, kwargs["observer"]] if kwargs["observer"] else self
+        elif "policy" in kwargs:
+            call_policy = kwargs["policy"]
+            kwargs["policy"] = call_policy.replace(
+                observer=[self, call_policy.observer] if call_policy.observer else self
+            )
+        else:
+            kwargs["policy"] = policy
+        return kwargs
+
+    def wrap(self, func: Callable) -> Callable:
+        """Returns `func` (decorated with `resilient_call()` if it isn't) limited by this limiter"""
+        if not hasattr(func, "retry_policy"):
+            func = with_retry()(func)
+        base = func.retry_policy
+        policy = base.replace(observer=[self, base.observer] if base.observer else self)
+
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_limited(*args, **kwargs):
+                await self.async_acquire()
+                try:
+                    return await func(*args, **self._call_kwargs(policy, kwargs))
+                finally:
+                    self.release()
+            limited = async_limited
+        else:
+            @functools.wraps(func)
+            def limited(*args, **kwargs):
+                self.acquire()
+                try:
+                    return func(*args, **self._call_kwargs(policy, kwargs))
+                finally:
+                    self.release()
+
+            def retry_steps(*args, **kwargs):
+                # For the scheduler: a slot is held while an attempt runs, not while it's parked
+                steps = func.retry_steps(*args, **self._call_kwargs(policy, kwargs))
+                held = False
+                try:
+                    while 1:
+                        self.acquire()
+                        held = True
+                        try:
+                            delay = next(steps)
+                        except StopIteration as stop:
+                            return stop.value
+                        self.release()
+                        held = False
+                        yield delay
+                finally:
+                    if held:
+                        self.release()
+                    steps.close()
+
+            # `functools.wraps` copied the unlimited `retry_steps` of `func`
+            limited.retry_steps = retry_steps
+        # Still usable by the bulk helpers
+        limited.retry_policy = func.retry_policy
+        return limited
+
+    __call__ = wrap
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,84 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+# Statuses whose `Retry-After` header is honoured
+RETRY_AFTER_STATUSES = frozenset((429, 503))
+
+def exponential(base: float = 1, factor: float = 2, cap: float = 60) -> Callable[[int], float]:
+    """Returns an exponential backoff strategy: `base * factor ** (tries - 1)`, capped
+
+    Example:
+        >>> from resilient_caller import resilient_call, backoff
+        >>>
+        >>> @resilient_call(backoff_strategy=backoff.exponential(base=0.5, cap=30))
+        ... def fetch():
+        ...     ...
+    """
+    def strategy(tries):
+        # Avoid overflowing on large tries once the cap is reached
+        return min(cap, base * factor ** min(tries - 1, 64))
+    return strategy
+
+def full_jitter(base: float = 1, factor: float = 2, cap: float = 60) -> Callable[[int], float]:
+    """Returns an exponential backoff strategy with full jitter: `uniform(0, exponential)`"""
+    ceiling = exponential(base, factor, cap)
+    def strategy(tries):
+        return random.uniform(0, ceiling(tries))
+    return strategy
+
+def equal_jitter(base: float = 1, factor: float = 2, cap: float = 60) -> Callable[[int], float]:
+    """Returns an exponential backoff strategy with equal jitter: half fixed, half random"""
+    ceiling = exponential(base, factor, cap)
+    def strategy(tries):
+        half = ceiling(tries) / 2
+        return half + random.uniform(0, half)
+    return strategy
+
+def decorrelated_jitter(base: float = 1, cap: float = 60) -> Callable[[int, float], float]:
+    """Returns a decorrelated jitter strategy: `uniform(base, previous delay * 3)`, capped
+
+    The strategy takes the previous delay as second argument, which the wrapper
+    passes to any two arguments `backoff_strategy`.
+    """
+    def strategy(tries, delay):
+        return min(cap, random.uniform(base, max(base, delay * 3)))
+    return strategy
+
+def fibonacci(base: float = 1, cap: float = 60) -> Callable[[int], float]:
+    """Returns a Fibonacci backoff strategy: `base * fib(tries)`, capped"""
+    def strategy(tries):
+        previous, current = 0, 1
+        for _ in range(min(tries, 64) - 1):
+            previous, current = current, previous + current
+        return min(cap, base * current)
+    return strategy
+
+def retry_after_delay(outcome: Any) -> Optional[float]:
+    """Returns the delay asked by the `Retry-After` header of a 429 or 503 response
+
+    Works with `requests` and `aiohttp` responses, and with exceptions carrying
+    one in their `response` attribute (like `requests.HTTPError`).
+
+    Returns:
+        Optional[float]: seconds to wait, None if the response doesn't ask for one
+    """
+    response = getattr(outcome, "response", None) if isinstance(outcome, BaseException) else outcome
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    if status not in RETRY_AFTER_STATUSES:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,377 @@
+import heapq
+import itertools
+import logging
+import threading
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic, time
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from .exceptions import RetriesExhausted, UnhandledException
+from .policy import OPTIONS, RetryPolicy, iscoroutinefunction
+from .wrapper import RETRY_EVENT, _run_coroutine
+
+logger = logging.getLogger(__name__)
+
+# Options applied per item, the others (circuit breaker, observer...) are about
+# single calls and rejected, from the keyword arguments and the policy alike
+BATCH_OPTIONS = frozenset((
+    "conditions", "conditions_criteria", "exceptions", "retries", "delay", "on_retry",
+    "max_elapsed_time", "backoff_strategy", "raise_exhausted", "retry_budget", "retry_after",
+))
+
+class _Entry:
+    """An item waiting for its result, with its own retry state"""
+    __slots__ = ("item", "future", "tries", "delay", "start", "last", "ready")
+
+    def __init__(self, item: Any, future: Any, delay: float):
+        self.item = item
+        self.future = future
+        self.tries = 0
+        self.delay = delay
+        self.start = time()
+        self.last = None
+        self.ready = monotonic()
+
+def _settle(future: Any, result: Any = None, error: Optional[BaseException] = None) -> None:
+    # The caller may have cancelled it meanwhile
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+class BatchLoader:
+    """Coalesces single-item calls into calls of a batch function, retrying only the failed items.
+
+    Items requested within `max_wait` seconds of each other (or until
+    `max_batch_size` of them are waiting) are passed together to
+    `batch_func(items)`, which returns their results in the same order, or
+    a mapping from item to result. Every result is checked against the
+    `conditions`, and an `Exception` in place of a result (or raised by the
+    whole batch) against the `exceptions`, as for a single call. Items asking
+    for a retry go back in the queue after their own backoff, with their own
+    number of tries, and join the next batch with the new items.
+
+    Sync batch functions run on `max_concurrency` threads and can be
+    awaited from async code with `async_load`. Async batch functions run on
+    the event loop of their callers and only support `async_load`.
+
+    Args:
+        batch_func (Callable): takes a list of items, returns their results
+        max_batch_size (int): most items per batch
+        max_wait (float): seconds the first item of a batch waits for others
+        max_concurrency (int): most batches in flight
+        policy (RetryPolicy): retry options of every item
+        **retry_kwargs: retry options overriding the policy, see `BATCH_OPTIONS`
+
+    Raises:
+        TypeError: when a retry option outside `BATCH_OPTIONS` is set
+
+    Example:
+        >>> from resilient_caller import BatchLoader, RETRY_EVENT
+        >>>
+        >>> def get_users(ids):
+        ...     users = session.post("https://api.example.com/users:batch", json={"ids": ids}).json()
+        ...     return {user["id"]: user for user in users}
+        >>>
+        >>> users = BatchLoader(get_users, max_batch_size=50, retries=3, delay=1, exceptions={"all": RETRY_EVENT})
+        >>> with ThreadPoolExecutor(20) as pool:
+        ...     for user in pool.map(users.load, ids):
+        ...         ...
+    """
+    def __init__(self, batch_func: Callable[[List[Any]], Any], max_batch_size: int = 100,
+                 max_wait: float = 0.005, max_concurrency: int = 4, policy: Optional[RetryPolicy] = None,
+                 **retry_kwargs):
+        unknown = set(retry_kwargs) - BATCH_OPTIONS
+        policy = policy or RetryPolicy()
+        unknown.update(name for name in OPTIONS if name not in BATCH_OPTIONS and getattr(policy, name) is not None)
+        if unknown:
+            raise TypeError(f"Unsupported batch retry options: {', '.join(sorted(unknown))}")
+        self.policy = policy.replace(**retry_kwargs) if retry_kwargs else policy
+        self.batch_func = batch_func
+        self.name = getattr(batch_func, "__name__", repr(batch_func))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.is_async = iscoroutinefunction(batch_func)
+        self._ready: List[_Entry] = []
+        # (due, sequence, entry) of the items waiting to be retried
+        self._waiting: List[tuple] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._timer = None
+        self._semaphore = None
+        # Batches in flight on the event loop, which only keeps weak references to tasks
+        self._tasks = set()
+
+    @property
+    def pending(self) -> int:
+        """Items queued for the next batches, retries included"""
+        return len(self._ready) + len(self._waiting)
+
+    def _entry(self, item: Any, future: Any) -> _Entry:
+        if self.policy.retry_budget:
+            self.policy.retry_budget.deposit()
+        return _Entry(item, future, self.policy.delay)
+
+    # Sync batch functions
+
+    def submit(self, item: Any) -> Future:
+        """Queues an item, returns a future resolved with its result"""
+        if self.is_async:
+            raise TypeError(f"{self.name} is async, use `await loader.async_load(item)`")
+        entry = self._entry(item, Future())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BatchLoader is closed")
+            self._ready.append(entry)
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="BatchLoader")
+                self._thread = threading.Thread(target=self._dispatch, name="BatchLoader", daemon=True)
+                self._thread.start()
+            elif len(self._ready) == 1 or len(self._ready) >= self.max_batch_size:
+                # The dispatcher sleeps until the oldest item is due
+                self._condition.notify()
+        return entry.future
+
+    def load(self, item: Any) -> Any:
+        """Returns the result of an item, waiting for its batch"""
+        return self.submit(item).result()
+
+    def load_many(self, items: Iterable[Any]) -> List[Any]:
+        """Returns the results of several items, in order"""
+        return [future.result() for future in [self.submit(item) for item in items]]
+
+    def _dispatch(self) -> None:
+        # Dispatcher thread: cut batches from the ready items, release due retries
+        condition, ready, waiting = self._condition, self._ready, self._waiting
+        while 1:
+            with condition:
+                while 1:
+                    now = monotonic()
+                    while waiting and waiting[0][0] <= now:
+                        due, _, entry = heapq.heappop(waiting)
+                        entry.ready = due
+                        ready.append(entry)
+                    if ready and (
+                        len(ready) >= self.max_batch_size or now - ready[0].ready >= self.max_wait or self._closed
+                    ):
+                        batch = ready[:self.max_batch_size]
+                        del ready[:self.max_batch_size]
+                        self._running += 1
+                        break
+                    if self._closed and not waiting and not self._running:
+                        condition.notify_all()
+                        return
+                    timeout = ready[0].ready + self.max_wait - now if ready else None
+                    if waiting and (timeout is None or waiting[0][0] - now < timeout):
+                        timeout = waiting[0][0] - now
+                    condition.wait(timeout)
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[_Entry]) -> None:
+        try:
+            batch = [entry for entry in batch if not entry.future.done()]
+            if not batch:
+                return
+            try:
+                results = self._split(batch, self.batch_func([entry.item for entry in batch]))
+            except _BatchError as e:
+                for entry in batch:
+                    _settle(entry.future, error=e.error)
+                return
+            except Exception as e:
+                results = [(None, e)] * len(batch)
+            for entry, (value, error) in zip(batch, results):
+                try:
+                    picked = self._handler(entry, value, error)
+                    if picked is not None:
+                        handler, argument = picked
+                        result = handler(argument, entry.tries)
+                        if handler.is_async:
+                            result = _run_coroutine(result)
+                        self._handled(entry, result, argument)
+                except Exception as e:
+                    _settle(entry.future, error=e)
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify()
+
+    def _requeue_sync(self, entry: _Entry, wait: float) -> None:
+        with self._condition:
+            heapq.heappush(self._waiting, (monotonic() + wait, next(self._counter), entry))
+            self._condition.notify()
+
+    # Async batch functions
+
+    async def async_load(self, item: Any) -> Any:
+        """Returns the result of an item, waiting for its batch without blocking the event loop"""
+        import asyncio
+        if not self.is_async:
+            return await asyncio.wrap_future(self.submit(item))
+        if self._closed:
+            raise RuntimeError("BatchLoader is closed")
+        loop = asyncio.get_running_loop()
+        entry = self._entry(item, loop.create_future())
+        self._enqueue_async(loop, entry)
+        return await entry.future
+
+    async def async_load_many(self, items: Iterable[Any]) -> List[Any]:
+        """Returns the results of several items, in order"""
+        import asyncio
+        return list(await asyncio.gather(*(self.async_load(item) for item in items)))
+
+    def _enqueue_async(self, loop, entry: _Entry) -> None:
+        ready = self._ready
+        ready.append(entry)
+        if len(ready) >= self.max_batch_size:
+            batch = ready[:self.max_batch_size]
+            del ready[:self.max_batch_size]
+            self._start_async(loop, batch)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush_async, loop)
+
+    def _flush_async(self, loop) -> None:
+        self._timer = None
+        ready = self._ready
+        while ready:
+            batch = ready[:self.max_batch_size]
+            del ready[:self.max_batch_size]
+            self._start_async(loop, batch)
+
+    def _start_async(self, loop, batch: List[_Entry]) -> None:
+        task = loop.create_task(self._run_batch_async(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch_async(self, batch: List[_Entry]) -> None:
+        import asyncio
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            batch = [entry for entry in batch if not entry.future.done()]
+            if not batch:
+                return
+            try:
+                results = self._split(batch, await self.batch_func([entry.item for entry in batch]))
+            except _BatchError as e:
+                for entry in batch:
+                    _settle(entry.future, error=e.error)
+                return
+            except Exception as e:
+                results = [(None, e)] * len(batch)
+        for entry, (value, error) in zip(batch, results):
+            try:
+                picked = self._handler(entry, value, error)
+                if picked is not None:
+                    handler, argument = picked
+                    result = handler(argument, entry.tries)
+                    if handler.is_async:
+                        result = await result
+                    self._handled(entry, result, argument)
+            except Exception as e:
+                _settle(entry.future, error=e)
+
+    def _requeue_async(self, entry: _Entry, wait: float) -> None:
+        loop = entry.future.get_loop()
+        loop.call_later(wait, self._enqueue_async, loop, entry)
+
+    # Per item retry logic, shared by both flavours
+
+    def _split(self, batch: List[_Entry], results: Any) -> List[tuple]:
+        """Returns the `(value, error)` of every item of a batch"""
+        if isinstance(results, Mapping):
+            return [
+                (results[entry.item], None) if entry.item in results else (None, KeyError(entry.item))
+                for entry in batch
+            ]
+        if not isinstance(results, Sequence) or len(results) != len(batch):
+            # A broken batch function, retrying it won't help
+            size = len(results) if isinstance(results, Sequence) else type(results).__name__
+            raise _BatchError(ValueError(
+                f"Batch function {self.name} returned {size} results for {len(batch)} items"
+            ))
+        return [(None, value) if isinstance(value, Exception) else (value, None) for value in results]
+
+    def _handler(self, entry: _Entry, value: Any, error: Optional[Exception]):
+        """Returns the handler to run for an item and its argument, settles the items that need none"""
+        config = self.policy
+        if error is not None:
+            if config.exceptions:
+                if config.raise_exceptions:
+                    return _settle(entry.future, error=error)
+                handler = config.exception_handler(error)
+                if handler:
+                    return handler, error
+            logger.error("Unhandled exception %s (%s)", type(error).__name__, error)
+            return _settle(entry.future, error=UnhandledException(error))
+        if config.conditions:
+            handler = config.condition_handler(value)
+            if handler:
+                return handler, value
+        return _settle(entry.future, value)
+
+    def _handled(self, entry: _Entry, result: Any, argument: Any) -> None:
+        if result is not RETRY_EVENT:
+            return _settle(entry.future, result)
+        config = self.policy
+        entry.tries += 1
+        entry.last = argument
+        if config.retries and entry.tries >= config.retries:
+            return self._exhausted(entry, f"Max retries reached for item {entry.item!r} of {self.name}")
+        if config.retry_budget and not config.retry_budget.withdraw():
+            return self._exhausted(entry, f"Retry budget exhausted for item {entry.item!r} of {self.name}")
+        if config.on_retry:
+            config.on_retry(entry.tries)
+        if config.backoff_strategy:
+            if config.backoff_pass_delay:
+                entry.delay = config.backoff_strategy(entry.tries, entry.delay)
+            else:
+                entry.delay = config.backoff_strategy(entry.tries)
+        wait = entry.delay
+        if config.retry_after:
+            hint = config.retry_after(argument)
+            if hint is not None:
+                wait = hint
+        if config.max_elapsed_time and time() + wait >= entry.start + config.max_elapsed_time:
+            return self._exhausted(entry, f"Max elapsed time reached for item {entry.item!r} of {self.name}")
+        if self.is_async:
+            self._requeue_async(entry, wait)
+        else:
+            self._requeue_sync(entry, wait)
+
+    def _exhausted(self, entry: _Entry, message: str) -> None:
+        logger.error(message)
+        if self.policy.raise_exhausted:
+            _settle(entry.future, error=RetriesExhausted(message, entry.tries, entry.last))
+        else:
+            _settle(entry.future, None)
+
+    def close(self) -> None:
+        """Waits for the queued items, retries included, then stops the threads of a sync loader"""
+        with self._condition:
+            self._closed = True
+            thread = self._thread
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join()
+            self._executor.shutdown()
+
+    def __enter__(self) -> "BatchLoader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class _BatchError(Exception):
+    """A batch function broke its contract, every item of the batch fails with `error`"""
+    def __init__(self, error: Exception):
+        super().__init__(error)
+        self.error = error
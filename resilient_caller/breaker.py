@@ -0,0 +1,211 @@
+import threading
+from time import monotonic, time
+from typing import Any, Callable, Dict, List, Optional
+
+from .shared import StateBackend, shared_key
+from .timeouts import _clock
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class Circuit:
+    """State of one circuit, tracking the outcomes of the last `window` attempts
+    in a ring buffer so every update is O(1)"""
+    __slots__ = (
+        "breaker", "state", "outcomes", "position", "calls", "failures", "opened_at",
+        "trials", "trial_started", "lock",
+    )
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+        self.state = CLOSED
+        self.outcomes = bytearray(breaker.window)
+        self.position = self.calls = self.failures = self.trials = 0
+        self.opened_at = self.trial_started = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns whether an attempt may go through"""
+        if self.state is CLOSED:
+            return True
+        breaker, now = self.breaker, (_clock.get() or monotonic)()
+        with self.lock:
+            if self.state is OPEN:
+                if now - self.opened_at < breaker.reset_timeout:
+                    return False
+                self.state, self.trials = HALF_OPEN, 0
+            if self.state is HALF_OPEN:
+                # A trial that never reported back doesn't block the circuit forever
+                if self.trials >= breaker.half_open_calls and now - self.trial_started < breaker.reset_timeout:
+                    return False
+                self.trials += 1
+                self.trial_started = now
+            return True
+
+    def record(self, success: bool) -> None:
+        """Records the outcome of an attempt"""
+        breaker = self.breaker
+        with self.lock:
+            if self.state is HALF_OPEN:
+                if success:
+                    self._reset(CLOSED)
+                else:
+                    self._open()
+                return
+            failed = not success
+            if self.calls < breaker.window:
+                self.calls += 1
+            else:
+                self.failures -= self.outcomes[self.position]
+            self.outcomes[self.position] = failed
+            self.failures += failed
+            self.position = (self.position + 1) % breaker.window
+            if (failed and self.state is CLOSED and self.calls >= breaker.min_calls
+                    and self.failures >= breaker.failure_rate * self.calls):
+                self._open()
+
+    def _open(self) -> None:
+        self._reset(OPEN)
+        self.opened_at = (_clock.get() or monotonic)()
+
+    def _reset(self, state: str) -> None:
+        self.state = state
+        self.outcomes[:] = bytes(len(self.outcomes))
+        self.position = self.calls = self.failures = self.trials = 0
+
+    def __repr__(self):
+        return f"Circuit(state={self.state!r}, calls={self.calls}, failures={self.failures})"
+
+class SharedCircuit:
+    """A circuit kept in a `StateBackend`, so every process sharing it sees the same state.
+
+    The window is approximated by a running failure rate (the exact rate up
+    to `window` attempts, then a moving average over about `window`
+    attempts), and the state by cool-down timestamps: the values are
+    `(failure rate, calls, open_until, trial_until)`.
+    """
+    __slots__ = ("breaker", "key")
+
+    def __init__(self, breaker: "CircuitBreaker", key: str):
+        self.breaker = breaker
+        self.key = key
+
+    @property
+    def state(self) -> str:
+        rate, calls, open_until, trial_until = self.breaker.backend.get(self.key)
+        if not open_until:
+            return CLOSED
+        return OPEN if time() < open_until else HALF_OPEN
+
+    def allow(self) -> bool:
+        """Returns whether an attempt may go through"""
+        return self.breaker.backend.update(self.key, self._allow)
+
+    def _allow(self, values: List[float], now: float) -> bool:
+        open_until, trial_until = values[2], values[3]
+        if not open_until:
+            return True
+        if now < open_until or now < trial_until:
+            return False
+        # Half-open: one trial at a time across processes, until it reports back
+        values[3] = now + self.breaker.reset_timeout
+        return True
+
+    def record(self, success: bool) -> None:
+        """Records the outcome of an attempt"""
+        self.breaker.backend.update(self.key, self._record_success if success else self._record_failure)
+
+    def _count(self, values: List[float], failed: int) -> None:
+        calls = min(values[1] + 1, self.breaker.window)
+        values[0] += (failed - values[0]) / calls
+        values[1] = calls
+
+    @staticmethod
+    def _trial(values: List[float], now: float) -> bool:
+        # Half-open with a trial outstanding; outcomes of attempts started
+        # before the circuit opened don't change an open circuit
+        return now >= values[2] and bool(values[3])
+
+    def _record_success(self, values: List[float], now: float) -> None:
+        if values[2]:
+            if self._trial(values, now):
+                values[:] = [0.0, 0.0, 0.0, 0.0]
+            return
+        self._count(values, 0)
+
+    def _record_failure(self, values: List[float], now: float) -> None:
+        breaker = self.breaker
+        if values[2]:
+            if self._trial(values, now):
+                values[2], values[3] = now + breaker.reset_timeout, 0.0
+            return
+        self._count(values, 1)
+        if values[1] >= breaker.min_calls and values[0] >= breaker.failure_rate:
+            values[:] = [0.0, 0.0, now + breaker.reset_timeout, 0.0]
+
+    def __repr__(self):
+        return f"SharedCircuit({self.key!r}, state={self.state!r})"
+
+class CircuitBreaker:
+    """A circuit breaker shared by every call using it.
+
+    Each key (the decorated function, or the result of `key(*args, **kwargs)`)
+    gets its own circuit. A circuit opens when the failure rate over the last
+    `window` attempts reaches `failure_rate`, then fails fast with
+    `CircuitOpenError` for `reset_timeout` seconds before letting
+    `half_open_calls` trial attempts through; a successful trial closes it again.
+
+    Exceptions and `RETRY_EVENT` results count as failures.
+
+    Args:
+        failure_rate (float): failure ratio that opens the circuit
+        window (int): number of recent attempts the failure rate is computed on
+        min_calls (int): minimum attempts in the window before the circuit can open
+        reset_timeout (float): seconds to stay open before allowing trial attempts
+        half_open_calls (int): trial attempts allowed while half-open
+        key (Callable): returns the circuit key from the call arguments
+        backend (StateBackend): shares the circuits between processes, e.g. `MmapBackend`
+
+    Example:
+        >>> from resilient_caller import CircuitBreaker, send_request, host_key
+        >>>
+        >>> breaker = CircuitBreaker(failure_rate=0.5, window=20, key=host_key)
+        >>> send_request("https://example.com", circuit_breaker=breaker, retries=3)
+    """
+    def __init__(self, failure_rate: float = 0.5, window: int = 20, min_calls: int = 10,
+                 reset_timeout: float = 30, half_open_calls: int = 1, key: Optional[Callable] = None,
+                 backend: Optional[StateBackend] = None):
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min(min_calls, window)
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.key = key
+        self.backend = backend
+        self._circuits: Dict[Any, Circuit] = {}
+        self._lock = threading.Lock()
+
+    def circuit(self, key: Any) -> Circuit:
+        """Returns the circuit of a key, creating it if needed"""
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            with self._lock:
+                circuit = self._circuits.setdefault(
+                    key, Circuit(self) if self.backend is None else SharedCircuit(self, "circuit:" + shared_key(key)),
+                )
+        return circuit
+
+    def circuit_for(self, f: Callable, args: tuple, kwargs: dict) -> Circuit:
+        """Returns the circuit of a call"""
+        return self.circuit(self.key(*args, **kwargs) if self.key else f)
+
+    def state(self, key: Any) -> str:
+        """Returns the state of a key's circuit ("closed", "open" or "half_open")"""
+        if self.backend is not None:
+            # Another process may have opened it
+            return self.circuit(key).state
+        circuit = self._circuits.get(key)
+        return circuit.state if circuit else CLOSED
+
+    def states(self) -> Dict[Any, str]:
+        """Returns the state of every circuit, for monitoring"""
+        return {key: circuit.state for key, circuit in list(self._circuits.items())}
@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .exceptions import RetriesExhausted
+from .scheduler import RetryScheduler
+from .wrapper import with_retry
+
+OK, EXHAUSTED, ERROR = "ok", "exhausted", "error"
+
+class Outcome:
+    """The outcome of one item of a bulk call.
+
+    Attributes:
+        index (int): position of the item in the input iterable
+        item (Any): the item itself
+        status (str): "ok", "exhausted" (retries or elapsed time ran out) or "error"
+        result (Any): return value of the call, if it succeeded
+        error (BaseException): `RetriesExhausted` or the unhandled exception
+    """
+    __slots__ = ("index", "item", "status", "result", "error")
+
+    def __init__(self, index, item, status, result=None, error=None):
+        self.index = index
+        self.item = item
+        self.status = status
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+    def __repr__(self):
+        return f"Outcome(index={self.index!r}, status={self.status!r}, result={self.result!r}, error={self.error!r})"
+
+def _ensure_decorated(func: Callable) -> Callable:
+    return func if hasattr(func, "retry_policy") else with_retry()(func)
+
+# Undecorated functions decorated in a process pool worker
+_decorated: Dict[Callable, Callable] = {}
+
+def _call_decorated(func: Callable, item: Any, **kwargs) -> Any:
+    """Decorates `func` in the worker process and calls it, a wrapper made by the parent can't be pickled"""
+    decorated = _decorated.get(func)
+    if decorated is None:
+        decorated = _decorated[func] = with_retry()(func)
+    return decorated(item, **kwargs)
+
+def _outcome(index, item, future) -> Outcome:
+    error = future.exception()
+    if error is None:
+        return Outcome(index, item, OK, result=future.result())
+    return Outcome(index, item, EXHAUSTED if isinstance(error, RetriesExhausted) else ERROR, error=error)
+
+async def _acall_item(func, index, item, kwargs) -> Outcome:
+    try:
+        return Outcome(index, item, OK, result=await func(item, raise_exhausted=True, **kwargs))
+    except RetriesExhausted as e:
+        return Outcome(index, item, EXHAUSTED, error=e)
+    except Exception as e:
+        return Outcome(index, item, ERROR, error=e)
+
+def _in_order(outcomes: Iterable[Outcome]) -> Iterator[Outcome]:
+    """Reorders completed outcomes by their input index"""
+    pending, expected = {}, 0
+    for outcome in outcomes:
+        pending[outcome.index] = outcome
+        while expected in pending:
+            yield pending.pop(expected)
+            expected += 1
+
+def _run_futures(submit, func, iterable, concurrency, kwargs) -> Iterator[Outcome]:
+    items, running = enumerate(iterable), {}
+    kwargs = dict(kwargs, raise_exhausted=True)
+    for index, item in items:
+        running[submit(func, item, **kwargs)] = index, item
+        if len(running) >= concurrency:
+            break
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield _outcome(*running.pop(future), future)
+            # Keep at most `concurrency` calls in flight
+            for index, item in items:
+                running[submit(func, item, **kwargs)] = index, item
+                break
+
+def _run_executor(executor, func, iterable, concurrency, kwargs) -> Iterator[Outcome]:
+    with executor:
+        yield from _run_futures(executor.submit, func, iterable, concurrency, kwargs)
+
+def _run_loop(func, iterable, concurrency, kwargs) -> Iterator[Outcome]:
+    # Run the async map on one loop in a background thread and stream outcomes
+    # back, then None once done or the exception that stopped it
+    outcomes, started, runner = queue.Queue(), threading.Event(), []
+
+    async def produce():
+        runner[:] = asyncio.get_running_loop(), asyncio.current_task()
+        started.set()
+        try:
+            async for outcome in async_resilient_map(func, iterable, concurrency, ordered=False, **kwargs):
+                outcomes.put(outcome)
+        except asyncio.CancelledError:
+            # The consumer stopped iterating
+            return
+        except BaseException as e:
+            outcomes.put(e)
+            return
+        outcomes.put(None)
+
+    thread = threading.Thread(target=asyncio.run, args=(produce(),), daemon=True)
+    thread.start()
+    try:
+        while 1:
+            outcome = outcomes.get()
+            if isinstance(outcome, Outcome):
+                yield outcome
+            elif outcome is None:
+                return
+            else:
+                raise outcome
+    finally:
+        if thread.is_alive():
+            # Closed early: stop submitting calls and cancel the running ones
+            started.wait()
+            loop, task = runner
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # The loop finished in the meantime
+                pass
+            thread.join()
+
+def resilient_map(func: Callable, iterable: Iterable, concurrency: int = 10, ordered: bool = True,
+                  backend: str = "thread", scheduler: Optional[RetryScheduler] = None,
+                  **retry_kwargs) -> Iterator[Outcome]:
+    """Calls `func` on every item with the same retry options, `concurrency` at a time.
+
+    A failing item never aborts the batch, its `Outcome` reports what happened.
+    Async functions all run on one event loop, sync ones on a thread or process pool.
+
+    Args:
+        func (Callable): function taking one item, decorated with `resilient_call()` or not
+        iterable (Iterable): items to process, consumed lazily
+        concurrency (int): maximum number of calls in flight
+        ordered (bool): yield outcomes in input order instead of as they complete
+        backend (str): "thread" or "process" for sync functions
+        scheduler (RetryScheduler): run sync functions on the scheduler workers, so
+            calls waiting to retry don't hold a thread and `concurrency` can exceed
+            the number of workers
+        **retry_kwargs: retry options passed to every call (`retries`, `exceptions`...)
+
+    Yields:
+        Outcome: the outcome of every item
+
+    Example:
+        >>> from resilient_caller import resilient_map, RETRY_EVENT
+        >>>
+        >>> for outcome in resilient_map(fetch, urls, concurrency=50, retries=3, exceptions={"all": RETRY_EVENT}):
+        ...     if outcome.ok:
+        ...         print(outcome.result)
+    """
+    plain, func = func, _ensure_decorated(func)
+    if asyncio.iscoroutinefunction(func):
+        outcomes = _run_loop(func, iterable, concurrency, retry_kwargs)
+    elif scheduler is not None:
+        outcomes = _run_futures(scheduler.submit, func, iterable, concurrency, retry_kwargs)
+    elif backend == "thread":
+        outcomes = _run_executor(ThreadPoolExecutor(concurrency), func, iterable, concurrency, retry_kwargs)
+    elif backend == "process":
+        # `func` and the retry options must be picklable
+        if func is not plain:
+            func = functools.partial(_call_decorated, plain)
+        outcomes = _run_executor(ProcessPoolExecutor(concurrency), func, iterable, concurrency, retry_kwargs)
+    else:
+        raise ValueError(f"Unknown backend {backend!r}, expected 'thread' or 'process'")
+    return _in_order(outcomes) if ordered else outcomes
+
+async def async_resilient_map(func: Callable, iterable: Iterable, concurrency: int = 100,
+                              ordered: bool = True, **retry_kwargs) -> AsyncIterator[Outcome]:
+    """Async version of `resilient_map`, every call runs on the running event loop.
+
+    Sync functions are run with `asyncio.to_thread`.
+
+    Yields:
+        Outcome: the outcome of every item
+    """
+    func = _ensure_decorated(func)
+    if not asyncio.iscoroutinefunction(func):
+        sync_func = func
+
+        async def func(item, **kwargs):
+            return await asyncio.to_thread(sync_func, item, **kwargs)
+
+    items, running = enumerate(iterable), set()
+    pending, expected = {}, 0
+
+    def submit():
+        for index, item in items:
+            running.add(asyncio.ensure_future(_acall_item(func, index, item, retry_kwargs)))
+            return
+
+    try:
+        for _ in range(concurrency):
+            submit()
+        while running:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                submit()
+                outcome = task.result()
+                if not ordered:
+                    yield outcome
+                    continue
+                pending[outcome.index] = outcome
+                while expected in pending:
+                    yield pending.pop(expected)
+                    expected += 1
+    finally:
+        for task in running:
+            task.cancel()
+
+async def gather_with_retry(func: Callable, iterable: Iterable, concurrency: int = 100,
+                            **retry_kwargs) -> List[Outcome]:
+    """Runs `async_resilient_map` to completion, returns the outcomes in input order
+
+    Example:
+        >>> outcomes = await gather_with_retry(fetch, urls, concurrency=500, retries=3)
+    """
+    return [outcome async for outcome in async_resilient_map(func, iterable, concurrency, **retry_kwargs)]
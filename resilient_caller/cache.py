@@ -0,0 +1,248 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .exceptions import RetriesExhausted
+
+class _Flight:
+    """A call in progress that identical calls wait for"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = self.error = None
+
+class ResultCache:
+    """A TTL + LRU cache for decorated functions, with request coalescing.
+
+    Concurrent calls with the same key share one retry loop (single-flight),
+    and its result is cached for `ttl` seconds. With `negative_ttl`, calls
+    that exhausted their retries are remembered too, so the upstream isn't
+    hammered again right away.
+
+    Args:
+        maxsize (int): maximum number of cached entries
+        ttl (float): seconds a result stays cached
+        key (Callable): returns the cache key from the call arguments, None to bypass
+            the cache (default: the arguments themselves)
+        negative_ttl (float): seconds exhausted calls stay cached (disabled by default)
+        ttl_for (Callable): returns the ttl of a given result, None for the default
+            and 0 to not cache it
+
+    Example:
+        >>> from resilient_caller import ResultCache, resilient_call
+        >>>
+        >>> cache = ResultCache(maxsize=10000, ttl=30, negative_ttl=5)
+        >>> fetch(key, retries=3, exceptions={"all": RETRY_EVENT}, cache=cache)
+        >>> cache.stats()
+        {'hits': 12, 'misses': 3, 'coalesced': 7, 'evictions': 0, 'size': 3}
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, key: Optional[Callable] = None,
+                 negative_ttl: Optional[float] = None, ttl_for: Optional[Callable] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key = key
+        self.negative_ttl = negative_ttl
+        self.ttl_for = ttl_for
+        self.hits = self.misses = self.coalesced = self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+
+    def key_for(self, f: Callable, args: tuple, kwargs: dict) -> Optional[Hashable]:
+        """Returns the cache key of a call, None if it can't be cached"""
+        if self.key is not None:
+            key = self.key(*args, **kwargs)
+            return None if key is None else (f, key)
+        key = (f, args, tuple(sorted(kwargs.items()))) if kwargs else (f, args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _lookup(self, key: Hashable):
+        """Returns the live entry of a key, refreshing its LRU position"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float], error: bool = False) -> None:
+        if not ttl or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, value, error)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _result_ttl(self, result: Any) -> Optional[float]:
+        if self.ttl_for is not None:
+            ttl = self.ttl_for(result)
+            if ttl is not None:
+                return ttl
+        return self.ttl
+
+    @staticmethod
+    def _unpack(entry: tuple) -> Any:
+        if entry[2]:
+            raise entry[1]
+        return entry[1]
+
+    def call(self, key: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+        """Returns the cached result of `key`, or computes it once for every concurrent caller"""
+        if key is None:
+            return compute()
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._unpack(entry)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = compute()
+            self._store(key, flight.result, self._result_ttl(flight.result))
+            return flight.result
+        except RetriesExhausted as e:
+            flight.error = e
+            self._store(key, e, self.negative_ttl, error=True)
+            raise
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+    async def async_call(self, key: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+        """Async version of `call`, `compute` returns an awaitable"""
+        import asyncio
+        if key is None:
+            return await compute()
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._unpack(entry)
+        key = (id(asyncio.get_running_loop()), key)
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight)
+        self.misses += 1
+        flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+            self._store(key[1], result, self._result_ttl(result))
+            flight.set_result(result)
+            return result
+        except RetriesExhausted as e:
+            self._store(key[1], e, self.negative_ttl, error=True)
+            flight.set_exception(e)
+            raise
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            del self._async_flights[key]
+            # Waiters retrieve the exception, don't warn about it
+            if flight.done() and not flight.cancelled():
+                flight.exception()
+
+    def clear(self) -> None:
+        """Drops every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit, miss, coalesced and eviction counters"""
+        return {
+            "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+            "evictions": self.evictions, "size": len(self._entries),
+        }
+
+# `send_request` arguments that don't change the response
+_UNKEYED_REQUEST_ARGS = frozenset(("session", "pool", "proxies", "timeout"))
+
+def request_cache_key(url: str, *args, method: str = "GET", params: Any = None, **kwargs) -> Optional[Hashable]:
+    """`ResultCache` key function for `send_request`: only idempotent GETs are cached.
+
+    Requests with a body, streamed responses, or arguments that can't be hashed
+    bypass the cache. `session`, `pool`, `proxies` and `timeout` aren't part
+    of the key, they don't change the response.
+
+    Example:
+        >>> from resilient_caller import ResultCache, send_request, request_cache_key, http_cache_ttl
+        >>>
+        >>> cache = ResultCache(key=request_cache_key, ttl_for=http_cache_ttl)
+        >>> send_request("https://example.com", cache=cache)
+    """
+    if method.upper() != "GET" or args or kwargs.get("data") is not None or kwargs.get("json") is not None:
+        return None
+    if kwargs.get("stream"):
+        return None
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    extra = []
+    for name, value in sorted(kwargs.items()):
+        if name in _UNKEYED_REQUEST_ARGS:
+            continue
+        if isinstance(value, dict):
+            value = tuple(sorted(value.items()))
+        extra.append((name, value))
+    key = (url, params, tuple(extra))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def http_cache_ttl(response: Any) -> Optional[float]:
+    """`ResultCache` ttl function honouring the `Cache-Control` header of a response.
+
+    Returns:
+        Optional[float]: 0 for non 200 responses and `no-store`, `no-cache` or
+            `private` ones, the `max-age` if any, None for the cache default
+    """
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    if status is None:
+        return None
+    if status != 200:
+        return 0
+    headers = getattr(response, "headers", None) or {}
+    control = headers.get("Cache-Control")
+    if not control:
+        return None
+    ttl = None
+    for directive in control.lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name in ("no-store", "no-cache", "private"):
+            return 0
+        if name in ("max-age", "s-maxage"):
+            try:
+                ttl = max(0.0, float(value.strip('"')))
+            except ValueError:
+                return 0
+    return ttl
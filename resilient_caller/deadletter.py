@@ -0,0 +1,342 @@
+import contextvars
+import importlib
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import monotonic, time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import backoff
+from .bulk import Outcome, OK, EXHAUSTED, ERROR
+from .exceptions import RetriesExhausted
+from .observers import Observer, AttemptEvent, CallEvent, EXHAUSTED as CALL_EXHAUSTED
+
+logger = logging.getLogger(__name__)
+
+# Set while replaying, so calls failing again aren't dead-lettered twice
+_replaying: contextvars.ContextVar = contextvars.ContextVar("resilient_caller_replaying", default=False)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    function TEXT NOT NULL,
+    payload BLOB,
+    error TEXT,
+    history TEXT NOT NULL,
+    created REAL NOT NULL,
+    replays INTEGER NOT NULL DEFAULT 0,
+    next_replay REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS dead_letters_due ON dead_letters (next_replay);
+"""
+
+class DeadLetter:
+    """A call that exhausted its retries.
+
+    Attributes:
+        id (int): row id in the queue
+        function (str): "module:qualname" of the decorated function
+        args (tuple): positional arguments, None if they couldn't be serialized
+        kwargs (dict): keyword arguments, None if they couldn't be serialized
+        error (str): repr of the last error or response that triggered a retry
+        history (List[dict]): attempts of the call (and of failed replays)
+        created (float): epoch time the call was dead-lettered
+        replays (int): number of failed replays
+    """
+    __slots__ = ("id", "function", "args", "kwargs", "error", "history", "created", "replays")
+
+    def __init__(self, id, function, args, kwargs, error, history, created, replays):
+        self.id = id
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.error = error
+        self.history = history
+        self.created = created
+        self.replays = replays
+
+    @property
+    def replayable(self) -> bool:
+        return self.args is not None
+
+    def __repr__(self):
+        return f"DeadLetter(id={self.id!r}, function={self.function!r}, replays={self.replays!r})"
+
+def function_name(func: Callable) -> str:
+    """Returns the "module:qualname" a dead letter is recorded under"""
+    func = getattr(func, "__wrapped__", func)
+    return f"{func.__module__}:{func.__qualname__}"
+
+def _resolve(name: str) -> Callable:
+    module, _, qualname = name.partition(":")
+    target = importlib.import_module(module)
+    for attribute in qualname.split("."):
+        target = getattr(target, attribute)
+    return target
+
+def _attempt(event: AttemptEvent) -> dict:
+    handler = event.handler
+    return {
+        "attempt": event.attempt, "outcome": event.outcome, "start": event.start,
+        "duration": event.duration, "wait": event.wait,
+        "handler": None if handler is None else getattr(handler, "__name__", repr(handler)),
+        "error": None if event.error is None else repr(event.error),
+    }
+
+def _last_error(error: Any) -> Any:
+    # What made the call retry is more useful than "Max retries reached"
+    if isinstance(error, RetriesExhausted) and error.last is not None:
+        return error.last
+    return error
+
+class DeadLetterQueue(Observer):
+    """A durable SQLite queue of the calls that exhausted their retries.
+
+    Attach it as an `observer`: exhausted calls are appended with their
+    arguments (pickled, or with `dumps`), last error and attempt history.
+    Appends are buffered and committed in batches, of `batch_size` entries or
+    every `flush_interval` seconds. `drain` replays them later, marking
+    them done one batch per transaction, so a crash only replays the batch in
+    progress again.
+
+    Args:
+        path (str): SQLite database file
+        batch_size (int): entries per commit
+        flush_interval (float): longest seconds an entry waits to be committed
+        replay_backoff (Callable): seconds to wait before replaying an entry again,
+            from its number of failed replays
+        dumps (Callable): serializes `(args, kwargs)` to bytes
+        loads (Callable): deserializes them
+
+    Example:
+        >>> from resilient_caller import DeadLetterQueue, RETRY_EVENT
+        >>>
+        >>> dead_letters = DeadLetterQueue("failed.db")
+        >>> for key in keys:
+        ...     fetch(key, retries=3, exceptions={"all": RETRY_EVENT}, observer=dead_letters)
+        >>>
+        >>> # Later, or in the next run
+        >>> for outcome in dead_letters.drain(retries=5, exceptions={"all": RETRY_EVENT}):
+        ...     print(outcome)
+    """
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 replay_backoff: Optional[Callable[[int], float]] = None,
+                 dumps: Callable[[Any], bytes] = pickle.dumps, loads: Callable[[bytes], Any] = pickle.loads):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replay_backoff = replay_backoff or backoff.exponential(base=60, cap=3600)
+        self.dumps = dumps
+        self.loads = loads
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._histories: Dict[CallEvent, List[dict]] = {}
+        self._pending: List[tuple] = []
+        self._flushed = monotonic()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    # Observer hooks
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        with self._lock:
+            self._histories.setdefault(event.call, []).append(_attempt(event))
+
+    def call_ended(self, event: CallEvent) -> None:
+        with self._lock:
+            history = self._histories.pop(event, [])
+        if event.outcome == CALL_EXHAUSTED and not _replaying.get():
+            self.put(function_name(event.func), event.args, event.kwargs, event.error, history)
+
+    # Queue
+
+    def put(self, function: str, args: tuple, kwargs: dict, error: Any = None,
+            history: Optional[List[dict]] = None) -> None:
+        """Appends a dead letter, committed with the next batch"""
+        error = _last_error(error)
+        try:
+            payload = self.dumps((args, kwargs))
+        except Exception as e:
+            logger.warning("Arguments of %s can't be serialized (%s), it won't be replayable", function, e)
+            payload = None
+        row = (function, payload, None if error is None else repr(error), json.dumps(history or []), time())
+        with self._lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full or monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+        else:
+            self._start_flusher()
+
+    def flush(self) -> None:
+        """Commits the buffered entries"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._flushed = monotonic()
+            if not rows:
+                return
+            with self._transaction():
+                self._connection.executemany(
+                    "INSERT INTO dead_letters (function, payload, error, history, created) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    @contextmanager
+    def _transaction(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="DeadLetterQueue", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            if self._pending:
+                self.flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            pending = len(self._pending)
+            stored = self._connection.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return stored + pending
+
+    def _letter(self, row: tuple) -> DeadLetter:
+        id, function, payload, error, history, created, replays = row
+        args = kwargs = None
+        if payload is not None:
+            args, kwargs = self.loads(payload)
+        return DeadLetter(id, function, args, kwargs, error, json.loads(history), created, replays)
+
+    def entries(self, function: Optional[str] = None, due: bool = False, batch_size: int = 500) -> Iterator[DeadLetter]:
+        """Iterates over the stored dead letters, oldest first, reading `batch_size` rows at once"""
+        self.flush()
+        query = "SELECT id, function, payload, error, history, created, replays FROM dead_letters WHERE id > ?"
+        params: list = []
+        if function is not None:
+            query += " AND function = ?"
+            params.append(function)
+        if due:
+            query += " AND next_replay <= ?"
+            params.append(time())
+        query += " ORDER BY id LIMIT ?"
+        last = 0
+        while 1:
+            with self._lock:
+                rows = self._connection.execute(query, [last, *params, batch_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._letter(row)
+            last = rows[-1][0]
+
+    def drain(self, func: Optional[Callable] = None, batch_size: int = 100, limit: Optional[int] = None,
+              **retry_kwargs) -> Iterator[Outcome]:
+        """Replays the due dead letters, yielding an `Outcome` for each.
+
+        Succeeding entries are removed from the queue; failing ones stay, with
+        their new attempts appended to the history, and wait for
+        `replay_backoff(replays)` seconds before being due again. Changes are
+        committed once per batch.
+
+        Args:
+            func (Callable): only replay the entries of this decorated function,
+                with it (by default, every entry with its function imported by name)
+            batch_size (int): entries replayed per transaction
+            limit (int): maximum number of entries to replay
+            **retry_kwargs: retry options of the replays
+        """
+        function = function_name(func) if func is not None else None
+        functions: Dict[str, Callable] = {function: func} if func is not None else {}
+        retry_kwargs["raise_exhausted"] = True
+        replayed, batch = 0, []
+        try:
+            for letter in self.entries(function, due=True, batch_size=batch_size):
+                if limit is not None and replayed >= limit:
+                    break
+                if not letter.replayable:
+                    continue
+                replayed += 1
+                outcome = self._replay(letter, functions, retry_kwargs)
+                batch.append((letter, outcome))
+                if len(batch) >= batch_size:
+                    self._settle(batch)
+                    batch = []
+                yield outcome
+        finally:
+            self._settle(batch)
+
+    def _replay(self, letter: DeadLetter, functions: Dict[str, Callable], retry_kwargs: dict) -> Outcome:
+        history: List[dict] = []
+        recorder = _HistoryRecorder(history)
+        kwargs = dict(letter.kwargs, **retry_kwargs)
+        kwargs["observer"] = [recorder, kwargs["observer"]] if kwargs.get("observer") else recorder
+        try:
+            target = functions.get(letter.function)
+            if target is None:
+                target = functions[letter.function] = _resolve(letter.function)
+            # Only the replay itself, calls exhausting in the caller's loop body are still stored
+            token = _replaying.set(True)
+            try:
+                result = target(*letter.args, **kwargs)
+            finally:
+                _replaying.reset(token)
+        except RetriesExhausted as e:
+            letter.history.extend(history)
+            return Outcome(letter.id, letter, EXHAUSTED, error=e)
+        except Exception as e:
+            letter.history.extend(history)
+            return Outcome(letter.id, letter, ERROR, error=e)
+        return Outcome(letter.id, letter, OK, result=result)
+
+    def _settle(self, batch: List[tuple]) -> None:
+        # Remove the replayed entries, reschedule the failed ones, in one transaction
+        if not batch:
+            return
+        now = time()
+        done = [(outcome.index,) for _, outcome in batch if outcome.ok]
+        failed = [
+            (letter.replays + 1, now + self.replay_backoff(letter.replays + 1), json.dumps(letter.history),
+             repr(_last_error(outcome.error)), letter.id)
+            for letter, outcome in batch if not outcome.ok
+        ]
+        with self._lock, self._transaction():
+            self._connection.executemany("DELETE FROM dead_letters WHERE id = ?", done)
+            self._connection.executemany(
+                "UPDATE dead_letters SET replays = ?, next_replay = ?, history = ?, error = ? WHERE id = ?", failed,
+            )
+
+    def close(self) -> None:
+        """Commits the buffered entries and closes the database"""
+        self._closed.set()
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "DeadLetterQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class _HistoryRecorder(Observer):
+    """Collects the attempts of a replay"""
+    def __init__(self, history: List[dict]):
+        self.history = history
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        self.history.append(_attempt(event))
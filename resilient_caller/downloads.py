@@ -0,0 +1,218 @@
+import mmap
+import os
+import re
+from typing import Any, Optional, Union
+
+from .wrapper import resilient_call
+from .policy import CONFIG_KEYS, RetryPolicy
+from .backoff import retry_after_delay
+from .exceptions import IncompleteDownload
+from .send_requests import send_request
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+class Download:
+    """A completed download.
+
+    Attributes:
+        url (str): downloaded url
+        target (Any): path or buffer the body was written to
+        size (int): number of bytes downloaded
+        etag (str): `ETag` of the downloaded resource, if any
+        last_modified (str): `Last-Modified` of the downloaded resource, if any
+        resumes (int): number of attempts that resumed a partial download
+    """
+    __slots__ = ("url", "target", "size", "etag", "last_modified", "resumes")
+
+    def __init__(self, url, target, size, etag, last_modified, resumes):
+        self.url = url
+        self.target = target
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.resumes = resumes
+
+    def __repr__(self):
+        return f"Download({self.url!r}, size={self.size!r}, resumes={self.resumes!r})"
+
+class _FileSink:
+    """Writes chunks at their offset into a preallocated file, or its memory map"""
+    def __init__(self, path: Union[str, os.PathLike], use_mmap: bool):
+        self.target = path
+        self.use_mmap = use_mmap
+        self.file = open(path, "w+b")
+        self.map = None
+
+    def allocate(self, size: Optional[int]) -> None:
+        self._unmap()
+        self.file.truncate(size or 0)
+        if not size:
+            return
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.file.fileno(), 0, size)
+            except OSError:
+                # Not supported by every file system, truncate already sized it
+                pass
+        if self.use_mmap:
+            self.map = mmap.mmap(self.file.fileno(), size)
+
+    def write(self, offset: int, chunk: bytes) -> None:
+        if self.map is not None:
+            self.map[offset:offset + len(chunk)] = chunk
+        elif hasattr(os, "pwrite"):
+            os.pwrite(self.file.fileno(), chunk, offset)
+        else:
+            self.file.seek(offset)
+            self.file.write(chunk)
+
+    def result(self, size: int) -> Any:
+        return self.target
+
+    def _unmap(self) -> None:
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+
+    def close(self) -> None:
+        self._unmap()
+        self.file.close()
+
+class _BufferSink:
+    """Writes chunks at their offset into a writable buffer (bytearray, mmap...)"""
+    def __init__(self, buffer: Any = None):
+        self.buffer = bytearray() if buffer is None else buffer
+        self.growable = isinstance(self.buffer, bytearray)
+
+    def allocate(self, size: Optional[int]) -> None:
+        if size is None:
+            return
+        if self.growable and len(self.buffer) < size:
+            self.buffer.extend(bytes(size - len(self.buffer)))
+        elif len(self.buffer) < size:
+            raise ValueError(f"Buffer of {len(self.buffer)} bytes can't hold {size} bytes")
+
+    def write(self, offset: int, chunk: bytes) -> None:
+        end = offset + len(chunk)
+        if self.growable and end > len(self.buffer):
+            # Unknown size, grow as the body arrives
+            self.buffer.extend(bytes(end - len(self.buffer)))
+        with memoryview(self.buffer) as view:
+            view[offset:end] = chunk
+
+    def result(self, size: int) -> Any:
+        if self.growable and len(self.buffer) > size:
+            del self.buffer[size:]
+        return self.buffer
+
+    def close(self) -> None:
+        pass
+
+class _Progress:
+    __slots__ = ("offset", "size", "etag", "last_modified", "attempts", "resumes")
+
+    def __init__(self):
+        self.offset, self.size, self.etag, self.last_modified = 0, None, None, None
+        self.attempts = self.resumes = 0
+
+    def validator(self) -> Optional[str]:
+        # Weak ETags can't be used in `If-Range`
+        if self.etag and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+    def restart(self, response, sink, size) -> None:
+        self.offset, self.size = 0, size
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        sink.allocate(size)
+
+@resilient_call(policy=RetryPolicy(retry_after=retry_after_delay))
+def _download_attempt(url, sink, progress, chunk_size, session, proxies, pool, kwargs):
+    """Downloads the rest of the body, from `progress.offset`"""
+    kwargs = dict(kwargs)
+    # Ranges apply to the encoded body, ask for the plain one
+    headers = {"Accept-Encoding": "identity", **(kwargs.pop("headers", None) or {})}
+    resuming = progress.attempts > 0 and progress.offset > 0
+    progress.attempts += 1
+    if resuming:
+        progress.resumes += 1
+        headers["Range"] = f"bytes={progress.offset}-"
+        validator = progress.validator()
+        if validator:
+            headers["If-Range"] = validator
+
+    response = send_request.__wrapped__(
+        url, session=session, proxies=proxies, pool=pool, headers=headers, stream=True, **kwargs
+    )
+    with response:
+        if resuming and response.status_code == 416 and progress.offset == progress.size:
+            return
+        response.raise_for_status()
+        if resuming and response.status_code == 206:
+            match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+            etag = response.headers.get("ETag")
+            if match is None or int(match.group(1)) != progress.offset or (etag and progress.etag and etag != progress.etag):
+                # Not the range we asked for, or another version of the resource
+                progress.offset, progress.etag, progress.last_modified = 0, None, None
+                raise IncompleteDownload(f"Resource at {url} changed, restarting its download")
+        else:
+            # A full body: first attempt, or the resource changed (`If-Range` failed)
+            length = response.headers.get("Content-Length")
+            progress.restart(response, sink, int(length) if length is not None else None)
+
+        for chunk in response.iter_content(chunk_size):
+            sink.write(progress.offset, chunk)
+            progress.offset += len(chunk)
+
+    if progress.size is not None and progress.offset < progress.size:
+        raise IncompleteDownload(f"Download of {url} stopped at {progress.offset} of {progress.size} bytes")
+    if progress.size is None:
+        progress.size = progress.offset
+
+def download(url: str, target: Any = None, chunk_size: int = 1 << 16, session=None, proxies=None, pool=None,
+             use_mmap: bool = False, **kwargs) -> Optional[Download]:
+    """Downloads a large body, resuming from the last received byte when an attempt fails.
+
+    Attempts are made with `send_request` and retried by the same retry
+    options (`retries`, `exceptions`...). A failed attempt is resumed with a
+    `Range` request guarded by `If-Range`, the `ETag` or `Last-Modified` of the
+    first response: if the resource changed, it's downloaded again from the
+    start. Chunks are written at their offset, into a file preallocated to
+    the `Content-Length` or a buffer, the body is never accumulated in memory.
+
+    Args:
+        url (str): url to download
+        target (Any): file path, or writable buffer (`bytearray`, `mmap`...);
+            a new `bytearray` if not given
+        chunk_size (int): bytes read at once
+        session, proxies, pool: as for `send_request`
+        use_mmap (bool): write into a memory map of the file instead of `pwrite`
+        **kwargs: retry options, then `requests` arguments
+
+    Returns:
+        Optional[Download]: the completed download, None if retries ran out
+
+    Example:
+        >>> from requests import RequestException
+        >>> from resilient_caller import download, RETRY_EVENT
+        >>>
+        >>> download("https://example.com/big.iso", "big.iso", retries=10,
+        ...          exceptions={RequestException: RETRY_EVENT, ConnectionError: RETRY_EVENT})
+    """
+    retry_kwargs = {key: kwargs.pop(key) for key in CONFIG_KEYS if key in kwargs}
+    if target is None or not isinstance(target, (str, os.PathLike)):
+        sink = _BufferSink(target)
+    else:
+        sink = _FileSink(target, use_mmap)
+    progress = _Progress()
+    try:
+        _download_attempt(url, sink, progress, chunk_size, session, proxies, pool, kwargs, **retry_kwargs)
+        if progress.size is None or progress.offset < progress.size:
+            return None
+        return Download(
+            url, sink.result(progress.size), progress.size, progress.etag, progress.last_modified, progress.resumes,
+        )
+    finally:
+        sink.close()
@@ -5,4 +5,27 @@ class UnhandledException(ResilentException):
     pass
 
 class UnsupportedProxyType(ResilentException):
-    pass
\ No newline at end of file
+    pass
+
+class RetriesExhausted(ResilentException):
+    """Raised instead of returning None when retries or elapsed time run out
+    and the call was made with `raise_exhausted=True`"""
+    def __init__(self, message, tries=0, last=None):
+        super().__init__(message)
+        self.tries = tries
+        # Last response or exception that triggered a retry
+        self.last = last
+
+class CircuitOpenError(ResilentException):
+    """Raised without calling the function while its circuit breaker is open"""
+    pass
+
+class AttemptTimeout(ResilentException, TimeoutError):
+    """Raised when an attempt runs longer than `attempt_timeout` or the remaining
+    `max_elapsed_time`, handled like any other exception of the attempt"""
+    pass
+
+class IncompleteDownload(ResilentException, ConnectionError):
+    """Raised when a download attempt ends before the whole body was received,
+    or when the resource changed; the next attempt resumes or restarts it"""
+    pass
@@ -0,0 +1,242 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import monotonic, sleep
+from typing import Optional
+
+from .timeouts import _deadline
+from .wrapper import _RetryState, _run_coroutine
+
+logger = logging.getLogger(__name__)
+
+class Hedge:
+    """Hedging settings: start another attempt when the running ones are slow.
+
+    The latency threshold is either a fixed `delay`, or the `percentile` of
+    the latencies of the last `window` attempts once `min_samples` were seen.
+
+    Args:
+        delay (float): fixed threshold in seconds (also used until enough samples are seen)
+        percentile (float): learned threshold, e.g. 0.95 for the p95 latency
+        window (int): number of recent latencies the percentile is computed on
+        min_samples (int): samples needed before the learned threshold is used
+        max_parallel (int): maximum attempts running at once
+
+    Example:
+        >>> from resilient_caller import Hedge, send_request
+        >>>
+        >>> send_request(url, proxies=["1.2.3.4:80", "5.6.7.8:80"], retries=3, hedge=Hedge(delay=0.5, percentile=0.95))
+    """
+    def __init__(self, delay: Optional[float] = None, percentile: Optional[float] = None, window: int = 100,
+                 min_samples: int = 20, max_parallel: int = 2):
+        if delay is None and percentile is None:
+            raise ValueError("Hedge needs a delay, a percentile or both")
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_parallel = max_parallel
+        self._latencies = deque(maxlen=window)
+        self._threshold = None
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Records the latency of a completed attempt"""
+        if self.percentile is None:
+            return
+        with self._lock:
+            self._latencies.append(latency)
+            # Recompute lazily on the next threshold() call
+            self._threshold = None
+
+    def threshold(self) -> Optional[float]:
+        """Returns the seconds to wait before starting a hedged attempt"""
+        if self.percentile is None or len(self._latencies) < self.min_samples:
+            return self.delay
+        threshold = self._threshold
+        if threshold is None:
+            with self._lock:
+                latencies = sorted(self._latencies)
+            threshold = self._threshold = latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+        return threshold
+
+async def _timed_attempt(state, args, kwargs, timeout):
+    try:
+        return await asyncio.wait_for(state.f(*args, **kwargs), timeout)
+    except asyncio.TimeoutError:
+        raise state.timed_out(timeout) from None
+
+async def hedged_call(f, config, args, kwargs, call=None):
+    """Async retry loop starting hedged attempts, the first accepted result wins.
+
+    Hedged attempts are retries: they go through the same budget, rate
+    limiter and circuit breaker checks as the regular ones, and each is
+    cancelled with `AttemptTimeout` at its `attempt_timeout` or the deadline.
+    """
+    hedge, loop = config.hedge, asyncio.get_running_loop()
+    state = _RetryState(f, config, args, kwargs, call)
+    # Attempt tasks: loop time they started at, attempt number, observer event.
+    # Latencies are measured with the loop clock, virtual in simulations
+    running = {}
+
+    async def launch(slept=0):
+        delay = state.throttle() if state.limiter is not None else 0
+        if delay:
+            await asyncio.sleep(delay)
+        attempt, event = state.tries, state.start(slept + delay)
+        if state.timed:
+            # The task copies the context, `remaining_time()` sees the deadline
+            timeout = state.timeout()
+            token = _deadline.set(state.clock() + timeout)
+            try:
+                task = asyncio.ensure_future(_timed_attempt(state, args, kwargs, timeout))
+            finally:
+                _deadline.reset(token)
+        else:
+            task = asyncio.ensure_future(f(*args, **kwargs))
+        running[task] = (loop.time(), attempt, event)
+
+    state.backoff()
+    await launch()
+    budgeted = True
+    try:
+        while 1:
+            can_hedge = budgeted and len(running) < hedge.max_parallel and state.limit_reached() is None
+            done, _ = await asyncio.wait(
+                running, timeout=hedge.threshold() if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if state.withdraw():
+                    logger.debug("Starting hedged attempt for function %s", f.__name__)
+                    await launch()
+                else:
+                    budgeted = False
+                continue
+            for task in done:
+                started, attempt, event = running.pop(task)
+                hedge.record(loop.time() - started)
+                error = task.exception()
+                if error is None:
+                    outcome = task.result()
+                    handler = state.condition_handler(outcome, event)
+                    if handler is None:
+                        return outcome
+                else:
+                    outcome, handler = error, state.exception_handler(error, event)
+                result = handler(outcome, attempt)
+                if handler.is_async:
+                    result = await result
+                if not state.retry(handler, result, outcome, event, error is not None):
+                    return result
+            if not running:
+                # Every attempt failed: back off, then retry
+                delay = state.backoff()
+                if config.scheduler:
+                    await config.scheduler.async_sleep(delay)
+                else:
+                    await asyncio.sleep(delay)
+                await launch(delay)
+    finally:
+        for task in running:
+            task.cancel()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(thread_name_prefix="Hedge")
+    return _executor
+
+def hedged_call_sync(f, config, args, kwargs, call=None):
+    """Sync version of `hedged_call`, attempts run on a shared thread pool.
+
+    Threads can't be interrupted: losing attempts, and attempts failed with
+    `AttemptTimeout`, still run to completion in the background, their
+    result is discarded.
+    """
+    hedge, executor = config.hedge, _get_executor()
+    state = _RetryState(f, config, args, kwargs, call)
+    # Attempt futures: time they started at, attempt number, observer event,
+    # timeout and the clock time it expires at
+    running = {}
+
+    def launch(slept=0):
+        delay = state.throttle() if state.limiter is not None else 0
+        if delay:
+            sleep(delay)
+        attempt, event = state.tries, state.start(slept + delay)
+        if state.timed:
+            timeout = state.timeout()
+            expires = state.clock() + timeout
+            # The attempt runs in a copy of the context, `remaining_time()` sees the deadline
+            token = _deadline.set(expires)
+            try:
+                context = contextvars.copy_context()
+            finally:
+                _deadline.reset(token)
+            future = executor.submit(context.run, f, *args, **kwargs)
+        else:
+            timeout = expires = None
+            future = executor.submit(f, *args, **kwargs)
+        running[future] = (monotonic(), attempt, event, timeout, expires)
+
+    state.backoff()
+    launch()
+    budgeted = True
+    try:
+        while 1:
+            can_hedge = budgeted and len(running) < hedge.max_parallel and state.limit_reached() is None
+            timeout = hedge.threshold() if can_hedge else None
+            # Wake up for the first attempt to time out as well
+            expires = min((entry[4] for entry in running.values() if entry[4] is not None), default=None)
+            if expires is not None:
+                remaining = max(0.0, expires - state.clock())
+                if timeout is None or remaining < timeout:
+                    timeout, can_hedge = remaining, False
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                now = state.clock()
+                done = [future for future, entry in running.items() if entry[4] is not None and entry[4] <= now]
+            if not done:
+                if not can_hedge:
+                    continue
+                if state.withdraw():
+                    logger.debug("Starting hedged attempt for function %s", f.__name__)
+                    launch()
+                else:
+                    budgeted = False
+                continue
+            for future in done:
+                started, attempt, event, timeout, _ = running.pop(future)
+                hedge.record(monotonic() - started)
+                if future.done():
+                    error = future.exception()
+                else:
+                    future.cancel()
+                    error = state.timed_out(timeout)
+                if error is None:
+                    outcome = future.result()
+                    handler = state.condition_handler(outcome, event)
+                    if handler is None:
+                        return outcome
+                else:
+                    outcome, handler = error, state.exception_handler(error, event)
+                result = handler(outcome, attempt)
+                if handler.is_async:
+                    result = _run_coroutine(result)
+                if not state.retry(handler, result, outcome, event, error is not None):
+                    return result
+            if not running:
+                # Every attempt failed: back off, then retry
+                delay = state.backoff()
+                sleep(delay)
+                launch(delay)
+    finally:
+        for future in running:
+            future.cancel()
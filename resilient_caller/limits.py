@@ -0,0 +1,144 @@
+import threading
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, List, Optional
+
+from .shared import StateBackend, shared_key, take_token
+from .timeouts import _clock
+
+class RetryBudget:
+    """A retry budget shared by every call using it.
+
+    Every first attempt deposits `ratio` tokens and every retry withdraws one,
+    so retries stay under `ratio` of the total requests. `min_per_second`
+    tokens are also refilled per second, so low traffic can still retry. When
+    the budget is empty, calls stop retrying as if their retries ran out.
+
+    Args:
+        ratio (float): allowed retries per first attempt
+        min_per_second (float): retries always allowed per second
+        max_tokens (float): cap on the saved up tokens
+        backend (StateBackend): shares the budget between processes, e.g. `MmapBackend`
+        key (str): name of the budget in the backend, budgets with the same key are one
+
+    Example:
+        >>> from resilient_caller import RetryBudget
+        >>>
+        >>> budget = RetryBudget(ratio=0.1, min_per_second=5)
+        >>> fetch(key, retries=5, exceptions={"all": RETRY_EVENT}, retry_budget=budget)
+    """
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 10, max_tokens: Optional[float] = None,
+                 backend: Optional[StateBackend] = None, key: str = "default"):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens if max_tokens is not None else max(min_per_second * 10, 10)
+        self.backend = backend
+        self.key = "budget:" + key
+        # [tokens, last refill, initialized], the layout of a backend key
+        self._values = [0.0, 0.0, 0.0]
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """Tokens left, without the refill since the last retry"""
+        values = self.backend.get(self.key) if self.backend is not None else self._values
+        return values[0] if values[2] else self.max_tokens
+
+    def _update(self, func: Callable[[List[float], float], Any]) -> Any:
+        if self.backend is not None:
+            return self.backend.update(self.key, func)
+        now = (_clock.get() or monotonic)()
+        with self._lock:
+            return func(self._values, now)
+
+    def _init(self, values: List[float]) -> None:
+        # A new budget is full, refills are counted from its first retry
+        if not values[2]:
+            values[0], values[1], values[2] = self.max_tokens, 0.0, 1.0
+
+    def _deposit(self, values: List[float], now: float) -> None:
+        self._init(values)
+        values[0] = min(self.max_tokens, values[0] + self.ratio)
+
+    def _withdraw(self, values: List[float], now: float) -> bool:
+        self._init(values)
+        tokens = values[0]
+        if values[1]:
+            tokens = min(self.max_tokens, tokens + (now - values[1]) * self.min_per_second)
+        values[1] = now
+        if tokens < 1:
+            values[0] = tokens
+            return False
+        values[0] = tokens - 1
+        return True
+
+    def deposit(self) -> None:
+        """Records a first attempt"""
+        self._update(self._deposit)
+
+    def withdraw(self) -> bool:
+        """Takes a token for a retry, returns False if the budget is exhausted"""
+        return self._update(self._withdraw)
+
+class RateLimiter:
+    """A token bucket rate limiter for first attempts and retries.
+
+    Each key (the decorated function, or the result of `key(*args, **kwargs)`)
+    gets its own bucket of `burst` tokens refilled at `rate` per second.
+    Attempts wait for a token, sync callers with `time.sleep` and async ones
+    with `asyncio.sleep`.
+
+    Args:
+        rate (float): attempts per second
+        burst (int): attempts allowed at once
+        key (Callable): returns the bucket key from the call arguments
+        backend (StateBackend): shares the buckets between processes, e.g. `MmapBackend`
+
+    Example:
+        >>> from resilient_caller import RateLimiter, send_request, host_key
+        >>>
+        >>> limiter = RateLimiter(rate=20, burst=5, key=host_key)
+        >>> send_request("https://example.com", rate_limiter=limiter)
+    """
+    def __init__(self, rate: float, burst: int = 1, key: Optional[Callable] = None,
+                 backend: Optional[StateBackend] = None):
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self.backend = backend
+        self._take = take_token(rate, burst)
+        # key -> [tokens, last update]
+        self._buckets: Dict[Any, list] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: Any = None) -> float:
+        """Takes a token, returns the seconds to wait before using it"""
+        if self.backend is not None:
+            return self.backend.update("rate:" + shared_key(key), self._take)
+        now = (_clock.get() or monotonic)()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate) - 1
+            bucket[0], bucket[1] = tokens, now
+        # A negative balance is a reservation on future tokens
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def key_for(self, f: Callable, args: tuple, kwargs: dict) -> Any:
+        """Returns the bucket key of a call"""
+        return self.key(*args, **kwargs) if self.key else f
+
+    def acquire(self, key: Any = None) -> float:
+        """Waits for a token, returns the seconds waited"""
+        wait = self.reserve(key)
+        if wait:
+            sleep(wait)
+        return wait
+
+    async def async_acquire(self, key: Any = None) -> float:
+        """Waits for a token without blocking the event loop, returns the seconds waited"""
+        wait = self.reserve(key)
+        if wait:
+            import asyncio
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,325 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter, time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Attempt outcomes
+OK = "ok"                # returned as is
+RESULT = "result"        # a handler returned a result
+RETRY = "retry"          # a handler asked for a retry
+RAISE = "raise"          # raised because of `{"raise": True}`
+UNHANDLED = "unhandled"  # raised as `UnhandledException`
+
+# Call outcomes, besides OK
+EXHAUSTED = "exhausted"
+ERROR = "error"
+
+# Latency histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class CallEvent:
+    """A decorated function call, from its first attempt to its result.
+
+    Attributes:
+        function (str): name of the decorated function
+        func (Callable): the function itself, undecorated
+        args (tuple): positional arguments of the call
+        kwargs (dict): keyword arguments of the call, without the retry options
+        start (float): epoch time the call started
+        duration (float): seconds the call took, set when it ends
+        attempts (int): number of attempts made
+        outcome (str): "ok", "exhausted" or "error", set when the call ends
+        error (BaseException): the exception raised by the call, if any
+        span (Any): free slot for observers, e.g. the tracing span of the call
+    """
+    __slots__ = (
+        "function", "func", "args", "kwargs", "start", "duration", "attempts", "outcome", "error", "span", "_started",
+    )
+
+    def __init__(self, func: Callable, args: tuple = (), kwargs: Optional[dict] = None):
+        self.function = func.__name__
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.start = time()
+        self.attempts = 0
+        self.duration = self.outcome = self.error = self.span = None
+        self._started = perf_counter()
+
+    def end(self, outcome: str, error: Optional[BaseException] = None) -> "CallEvent":
+        self.duration = perf_counter() - self._started
+        self.outcome = outcome
+        self.error = error
+        return self
+
+    def __repr__(self):
+        return f"CallEvent({self.function!r}, attempts={self.attempts}, outcome={self.outcome!r})"
+
+class AttemptEvent:
+    """A single attempt of a call.
+
+    Attributes:
+        call (CallEvent): the call the attempt belongs to
+        attempt (int): number of tries before this attempt (0 for the first one)
+        wait (float): seconds slept before this attempt (backoff and rate limiting)
+        start (float): epoch time the attempt started
+        duration (float): seconds the attempt took, set when it ends
+        outcome (str): "ok", "result", "retry", "raise" or "unhandled"
+        handler (Any): key of the `conditions`/`exceptions` handler that fired, if any
+        error (BaseException): the exception raised by the attempt, if any
+        span (Any): free slot for observers, e.g. the tracing span of the attempt
+    """
+    __slots__ = ("call", "attempt", "wait", "start", "duration", "outcome", "handler", "error", "span", "_started")
+
+    def __init__(self, call: CallEvent, attempt: int, wait: float):
+        call.attempts += 1
+        self.call = call
+        self.attempt = attempt
+        self.wait = wait
+        self.start = time()
+        self.duration = self.outcome = self.handler = self.error = self.span = None
+        self._started = perf_counter()
+
+    def end(self, outcome: str, handler: Any = None, error: Optional[BaseException] = None) -> "AttemptEvent":
+        self.duration = perf_counter() - self._started
+        self.outcome = outcome
+        self.handler = handler
+        self.error = error
+        return self
+
+    def __repr__(self):
+        return f"AttemptEvent({self.call.function!r}, attempt={self.attempt}, outcome={self.outcome!r})"
+
+class Observer:
+    """Base class of the `observer` option, every hook does nothing by default.
+
+    Hooks run inline in the retry loop: keep them fast and don't raise. The
+    attempts of hedged calls overlap, their events can interleave.
+
+    Example:
+        >>> from resilient_caller import Observer, RetryPolicy, resilient_call
+        >>>
+        >>> class SlowAttempts(Observer):
+        ...     def attempt_ended(self, event):
+        ...         if event.duration > 1:
+        ...             print(f"{event.call.function} attempt {event.attempt} took {event.duration:.1f}s")
+        >>>
+        >>> @resilient_call(policy=RetryPolicy(observer=SlowAttempts()))
+        ... def fetch():
+        ...     ...
+    """
+    def call_started(self, event: CallEvent) -> None:
+        pass
+
+    def call_ended(self, event: CallEvent) -> None:
+        pass
+
+    def attempt_started(self, event: AttemptEvent) -> None:
+        pass
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        pass
+
+class ObserverGroup(Observer):
+    """Forwards every event to several observers, in order"""
+    def __init__(self, observers: Iterable[Observer]):
+        self.observers = tuple(observers)
+
+    def call_started(self, event):
+        for observer in self.observers:
+            observer.call_started(event)
+
+    def call_ended(self, event):
+        for observer in self.observers:
+            observer.call_ended(event)
+
+    def attempt_started(self, event):
+        for observer in self.observers:
+            observer.attempt_started(event)
+
+    def attempt_ended(self, event):
+        for observer in self.observers:
+            observer.attempt_ended(event)
+
+def as_observer(observer: Any) -> Optional[Observer]:
+    """Returns the observer to use for the `observer` option, grouping lists"""
+    if isinstance(observer, (list, tuple)):
+        return ObserverGroup(observer) if observer else None
+    return observer
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class MetricsRegistry(Observer):
+    """An in-process metrics registry fed by the retry loop.
+
+    Counts calls and attempts by function and outcome, the time slept between
+    attempts, and keeps call and attempt latency histograms. Updates are a
+    dictionary lookup and a few additions under a lock.
+
+    Args:
+        buckets (Iterable[float]): upper bounds of the latency histograms in seconds
+        prefix (str): prefix of the exported metric names
+
+    Example:
+        >>> from resilient_caller import MetricsRegistry, send_request
+        >>>
+        >>> metrics = MetricsRegistry()
+        >>> send_request("https://example.com", retries=3, observer=metrics)
+        >>> print(metrics.to_prometheus())
+    """
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS, prefix: str = "resilient_caller"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, labels: tuple, value: float = 1) -> None:
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: tuple, value: float) -> None:
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(len(self.buckets) + 1)
+        histogram.counts[bisect_left(self.buckets, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    def call_ended(self, event: CallEvent) -> None:
+        function = (("function", event.function),)
+        with self._lock:
+            self._count("calls_total", function + (("outcome", event.outcome),))
+            self._observe("call_duration_seconds", function, event.duration)
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        function = (("function", event.call.function),)
+        with self._lock:
+            self._count("attempts_total", function + (("outcome", event.outcome),))
+            self._observe("attempt_duration_seconds", function, event.duration)
+            if event.wait:
+                self._count("retry_wait_seconds_total", function, event.wait)
+
+    def counter(self, name: str, **labels) -> float:
+        """Returns the value of a counter, e.g. `counter("attempts_total", function="fetch", outcome="retry")`"""
+        return self._counters.get((name, tuple(labels.items())), 0)
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        """Returns a copy of every counter and histogram"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {
+                    "name": name, "labels": dict(labels), "buckets": self.buckets,
+                    "counts": list(histogram.counts), "sum": histogram.sum, "count": histogram.count,
+                }
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                name = f"{self.prefix}_{name}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                name = f"{self.prefix}_{name}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Resets every metric"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+class SpanObserver(Observer):
+    """Reports calls and attempts as tracing spans, attempts being children of their call.
+
+    `start_span(name, attributes, parent)` returns a span (`parent` is the span
+    of the call for attempts, None for calls) and `end_span(span, attributes,
+    error)` ends it. Use `SpanObserver.from_tracer` for OpenTelemetry.
+
+    Args:
+        start_span (Callable): starts a span
+        end_span (Callable): ends a span
+    """
+    def __init__(self, start_span: Callable[[str, dict, Any], Any], end_span: Callable[[Any, dict, Any], None]):
+        self.start_span = start_span
+        self.end_span = end_span
+
+    @classmethod
+    def from_tracer(cls, tracer: Any) -> "SpanObserver":
+        """Builds a span observer from an OpenTelemetry tracer
+
+        Example:
+            >>> from opentelemetry import trace
+            >>> from resilient_caller import SpanObserver, RetryPolicy
+            >>>
+            >>> policy = RetryPolicy(observer=SpanObserver.from_tracer(trace.get_tracer(__name__)))
+        """
+        from opentelemetry import trace
+
+        def start_span(name, attributes, parent):
+            context = trace.set_span_in_context(parent) if parent is not None else None
+            return tracer.start_span(name, context=context, attributes=attributes)
+
+        def end_span(span, attributes, error):
+            span.set_attributes(attributes)
+            if error is not None:
+                span.record_exception(error)
+                span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+            span.end()
+
+        return cls(start_span, end_span)
+
+    def call_started(self, event: CallEvent) -> None:
+        event.span = self.start_span(event.function, {"code.function": event.function}, None)
+
+    def call_ended(self, event: CallEvent) -> None:
+        self.end_span(event.span, {"retry.attempts": event.attempts, "retry.outcome": event.outcome}, event.error)
+
+    def attempt_started(self, event: AttemptEvent) -> None:
+        event.span = self.start_span(
+            f"{event.call.function} attempt",
+            {"retry.attempt": event.attempt, "retry.wait": event.wait},
+            event.call.span,
+        )
+
+    def attempt_ended(self, event: AttemptEvent) -> None:
+        attributes = {"retry.outcome": event.outcome}
+        if event.handler is not None:
+            attributes["retry.handler"] = getattr(event.handler, "__name__", str(event.handler))
+        self.end_span(event.span, attributes, event.error)
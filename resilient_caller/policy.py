@@ -0,0 +1,216 @@
+import functools
+import sys
+from typing import Any, Callable, Dict, Optional
+
+from .observers import as_observer
+
+# Keyword arguments consumed by the wrapper instead of the wrapped function
+CONFIG_KEYS = frozenset((
+    "policy", "conditions", "conditions_criteria", "exceptions", "retries", "delay", "on_retry",
+    "raise_exhausted", "scheduler", "circuit_breaker", "retry_budget", "rate_limiter", "retry_after",
+    "hedge", "attempt_timeout", "cache", "observer",
+))
+# Options a policy is built from
+OPTIONS = (
+    "conditions", "conditions_criteria", "exceptions", "retries", "delay", "on_retry",
+    "max_elapsed_time", "backoff_strategy", "raise_exhausted", "scheduler", "circuit_breaker",
+    "retry_budget", "rate_limiter", "retry_after", "hedge", "attempt_timeout",
+    "cache", "observer",
+)
+
+# `inspect.CO_COROUTINE`, without importing `inspect`
+CO_COROUTINE = 0x80
+
+def iscoroutinefunction(func: Any) -> bool:
+    """`asyncio.iscoroutinefunction` that doesn't import `asyncio` for plain functions"""
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        return asyncio.iscoroutinefunction(func)
+    # Nothing could have been marked as a coroutine function without asyncio
+    while isinstance(func, functools.partial):
+        func = func.func
+    code = getattr(getattr(func, "__func__", func), "__code__", None)
+    return code is not None and bool(code.co_flags & CO_COROUTINE)
+
+def _arity(action: Callable) -> int:
+    """Returns the number of positional arguments an action expects (1 or 2)"""
+    code = getattr(action, "__code__", None)
+    if code is None:
+        return 1
+    count = code.co_argcount
+    if getattr(action, "__self__", None) is not None:
+        # Bound methods get `self` for free
+        count -= 1
+    return 2 if count == 2 else 1
+
+class Handler:
+    """A compiled `conditions`/`exceptions` action.
+
+    Callability, sync/async flavour and arity are resolved once, so running the
+    action in the retry loop is a single call.
+    """
+    __slots__ = ("key", "action", "is_callable", "is_async", "pass_tries")
+
+    def __init__(self, action: Any, key: Any = None):
+        self.key = key
+        self.action = action
+        self.is_callable = callable(action)
+        self.is_async = self.is_callable and iscoroutinefunction(action)
+        self.pass_tries = self.is_callable and _arity(action) == 2
+
+    def __call__(self, value: Any, tries: int) -> Any:
+        """Runs the action, returns a coroutine for async actions"""
+        if not self.is_callable:
+            return self.action
+        if self.pass_tries:
+            return self.action(value, tries)
+        return self.action(value)
+
+    def __repr__(self):
+        return f"Handler({self.action!r})"
+
+def _compile_table(table: Optional[Dict[Any, Any]], reserved=("all",)):
+    """Compiles a handlers dictionary into a lookup table and an "all" fallback"""
+    if not table:
+        return {}, None
+    compiled = {key: Handler(action, key) for key, action in table.items() if action and key not in reserved}
+    fallback = Handler(table["all"], "all") if table.get("all") else None
+    return compiled, fallback
+
+def _split_predicates(handlers: Dict[Any, Handler]):
+    """Splits compiled exception handlers into exception types and predicates"""
+    types, predicates = {}, []
+    for key, handler in handlers.items():
+        if callable(key) and not isinstance(key, type):
+            predicates.append((key, handler))
+        else:
+            types[key] = handler
+    return types, tuple(predicates)
+
+# Memoized "no handler" marker, None is a valid memoized value
+_MISSING = object()
+
+class RetryPolicy:
+    """A reusable, precompiled retry configuration.
+
+    Build it once and pass it to the decorator or per call, so the handler
+    tables are not rebuilt on every invocation.
+
+    Args:
+        conditions (dict): actions to take for a given outcome
+        conditions_criteria (callable): criteria to use when checking the `conditions`
+        exceptions (dict): actions to take for a given exception, 'all' as fallback
+            or {"raise": True} to raise instead of handling. Exception classes match
+            their subclasses too (the closest one wins), and callable keys are
+            predicates taking the exception, checked first and in order
+        retries (int): maximum number of tries (disabled by default)
+        delay (float): seconds to sleep between retries
+        on_retry (callable): callback executed on every retry with the number of tries
+        max_elapsed_time (float): maximum seconds to keep retrying, also bounding
+            the attempts and the sleeps between them (sync functions then run on a
+            daemon thread)
+        backoff_strategy (callable): returns the delay before each retry from the number
+            of tries (and the previous delay, if it takes two arguments), `delay` only
+            seeds the previous delay of the first retry
+        raise_exhausted (bool): raise `RetriesExhausted` instead of returning None
+            when retries or elapsed time run out
+        scheduler (RetryScheduler): park async calls waiting to retry on a shared
+            scheduler instead of one `asyncio.sleep` timer each
+        circuit_breaker (CircuitBreaker): fail fast with `CircuitOpenError` while
+            the circuit of the call is open
+        retry_budget (RetryBudget): stop retrying once the shared budget is exhausted
+        rate_limiter (RateLimiter): wait for a token before every attempt
+        retry_after (callable): returns the delay asked by the last response or
+            exception (e.g. `Retry-After`), None to use the regular delay
+        hedge (Hedge): start concurrent attempts when the running ones are slower
+            than its threshold, the first accepted result wins
+        attempt_timeout (float): seconds after which an attempt fails with
+            `AttemptTimeout` (sync functions then run on a daemon thread)
+        cache (ResultCache): cache results and coalesce concurrent identical calls
+        observer (Observer): receives call and attempt events, e.g. a `MetricsRegistry`
+            (or a list of observers)
+
+    Example:
+        >>> from resilient_caller import resilient_call, RetryPolicy, RETRY_EVENT
+        >>>
+        >>> policy = RetryPolicy(retries=3, delay=1, exceptions={"all": RETRY_EVENT})
+        >>>
+        >>> @resilient_call(policy=policy)
+        ... def fetch():
+        ...     ...
+    """
+    __slots__ = OPTIONS + (
+        "condition_handlers", "condition_fallback", "exception_handlers", "exception_fallback",
+        "exception_predicates", "exception_memo", "raise_exceptions", "backoff_pass_delay",
+    )
+
+    def __init__(self, conditions=None, conditions_criteria=None, exceptions=None, retries=False,
+                 delay=0, on_retry=None, max_elapsed_time=None, backoff_strategy=None,
+                 raise_exhausted=False, scheduler=None, circuit_breaker=None, retry_budget=None,
+                 rate_limiter=None, retry_after=None, hedge=None, attempt_timeout=None,
+                 cache=None, observer=None):
+        self.conditions = conditions
+        self.conditions_criteria = conditions_criteria
+        self.exceptions = exceptions
+        self.retries = retries
+        self.delay = delay
+        self.on_retry = on_retry
+        self.max_elapsed_time = max_elapsed_time
+        self.backoff_strategy = backoff_strategy
+        self.raise_exhausted = raise_exhausted
+        self.scheduler = scheduler
+        self.circuit_breaker = circuit_breaker
+        self.retry_budget = retry_budget
+        self.rate_limiter = rate_limiter
+        self.retry_after = retry_after
+        self.hedge = hedge
+        self.attempt_timeout = attempt_timeout
+        self.cache = cache
+        self.observer = as_observer(observer)
+
+        self.condition_handlers, self.condition_fallback = _compile_table(conditions)
+        self.exception_handlers, self.exception_fallback = _compile_table(exceptions, ("all", "raise"))
+        self.exception_handlers, self.exception_predicates = _split_predicates(self.exception_handlers)
+        # Handler resolved for each concrete exception type seen so far
+        self.exception_memo = {}
+        self.raise_exceptions = bool(exceptions and exceptions.get("raise", False))
+        self.backoff_pass_delay = bool(backoff_strategy) and _arity(backoff_strategy) == 2
+
+    def replace(self, **changes) -> "RetryPolicy":
+        """Returns a copy of the policy with some options changed"""
+        options = {name: getattr(self, name) for name in OPTIONS}
+        options.update(changes)
+        return RetryPolicy(**options)
+
+    def condition_handler(self, response: Any) -> Optional[Handler]:
+        """Returns the handler for a response, None if it should be returned as is"""
+        if self.conditions_criteria:
+            response = self.conditions_criteria(response)
+        return self.condition_handlers.get(response, self.condition_fallback)
+
+    def exception_handler(self, exception: BaseException) -> Optional[Handler]:
+        """Returns the handler for an exception, None if it's unhandled"""
+        for predicate, handler in self.exception_predicates:
+            if predicate(exception):
+                return handler
+        kind = type(exception)
+        handler = self.exception_memo.get(kind, _MISSING)
+        if handler is _MISSING:
+            handler = self.exception_memo[kind] = self._resolve_exception_handler(kind)
+        return handler
+
+    def _resolve_exception_handler(self, kind: type) -> Optional[Handler]:
+        # The closest registered base class along the MRO, like `except` clauses
+        handlers = self.exception_handlers
+        if handlers:
+            for base in kind.__mro__:
+                handler = handlers.get(base)
+                if handler is not None:
+                    return handler
+        return self.exception_fallback
+
+    def __repr__(self):
+        return (
+            f"RetryPolicy(retries={self.retries!r}, delay={self.delay!r}, "
+            f"max_elapsed_time={self.max_elapsed_time!r})"
+        )
@@ -0,0 +1,182 @@
+import heapq
+import random
+import threading
+from itertools import count
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from .utils import proxy_to_url
+
+# Answers blamed on the proxy: its own errors (407, gateway errors) and the
+# target blocking or throttling its address
+PROXY_FAILURE_STATUSES = frozenset((403, 407, 429, 502, 503, 504))
+
+def proxy_healthy(response: Any) -> bool:
+    """Returns whether a response (`requests` or `aiohttp`) counts as a success of its proxy"""
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return status not in PROXY_FAILURE_STATUSES
+
+class Proxy:
+    """A parsed proxy with its health statistics.
+
+    Attributes:
+        url (str): proxy url, e.g. "http://login:password@ip:port/"
+        proxies (Dict[str, str]): `requests` proxies dictionary, shared: don't mutate it
+        successes (float): decayed count of successful attempts
+        failures (float): decayed count of failed attempts
+        latency (float): moving average of the attempt latency in seconds
+        quarantined_until (float): monotonic time before which the proxy isn't used
+    """
+    __slots__ = ("url", "proxies", "successes", "failures", "latency", "strikes", "quarantined_until")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.proxies = {"http": url, "https": url}
+        self.successes = self.failures = 0.0
+        self.latency = None
+        self.strikes = 0
+        self.quarantined_until = 0.0
+
+    @property
+    def score(self) -> float:
+        """Higher is better: smoothed success rate divided by latency"""
+        rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        return rate / (self.latency or 1.0)
+
+    def __repr__(self):
+        return f"Proxy({self.url!r}, score={self.score:.3f})"
+
+class ProxyPool:
+    """A pool of proxies rotated per attempt, with health scoring and quarantine.
+
+    Proxies are parsed once. Each attempt gets its own proxy and passes it per
+    request, so shared sessions are never modified. A proxy failing an attempt
+    is quarantined for `cooldown * 2 ** (strikes - 1)` seconds (up to
+    `max_cooldown`), a success resets its strikes.
+
+    Args:
+        proxies (Iterable[str]): proxies as ip:port, ip:port:login:password or urls
+        strategy (str): "round_robin", or "weighted" to prefer proxies with a better
+            success rate and latency (the best of two random proxies, O(1) per pick)
+        cooldown (float): first quarantine duration in seconds
+        max_cooldown (float): longest quarantine duration in seconds
+        decay (float): weight kept by past statistics on every report
+        healthy (Callable): tells from a response whether the proxy did its job,
+            `proxy_healthy` by default
+
+    Example:
+        >>> from resilient_caller import ProxyPool, send_request, RETRY_EVENT
+        >>>
+        >>> pool = ProxyPool.from_file("proxies.txt", strategy="weighted")
+        >>> send_request("https://example.com", proxies=pool, retries=5, exceptions={"all": RETRY_EVENT})
+    """
+    def __init__(self, proxies: Iterable[Union[str, Proxy]], strategy: str = "round_robin",
+                 cooldown: float = 1, max_cooldown: float = 300, decay: float = 0.9,
+                 healthy: Optional[Callable[[Any], bool]] = None):
+        if strategy not in ("round_robin", "weighted"):
+            raise ValueError(f"Unknown strategy {strategy!r}, expected 'round_robin' or 'weighted'")
+        self.proxies: List[Proxy] = [
+            proxy if isinstance(proxy, Proxy) else Proxy(proxy_to_url(proxy)) for proxy in proxies if proxy
+        ]
+        if not self.proxies:
+            raise ValueError("ProxyPool needs at least one proxy")
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.decay = decay
+        self.healthy = healthy or proxy_healthy
+        self._counter = count()
+        self._lock = threading.Lock()
+        # (quarantined_until, n, proxy) of quarantined proxies, soonest released first.
+        # Entries whose time no longer matches their proxy are stale and skipped
+        now = monotonic()
+        self._quarantine = [
+            (proxy.quarantined_until, n, proxy) for n, proxy in enumerate(self.proxies)
+            if proxy.quarantined_until > now
+        ]
+        heapq.heapify(self._quarantine)
+        self._quarantined = len(self._quarantine)
+        self._entries = count(len(self.proxies))
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ProxyPool":
+        """Loads one proxy per line from a file, blank lines are skipped"""
+        with open(path, "r", encoding="utf-8") as file:
+            lines = file.read().split()
+        return cls(lines, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def _release(self, now: float) -> None:
+        # Pops the released and stale entries off the heap top, under the lock
+        quarantine = self._quarantine
+        while quarantine:
+            until, _, proxy = quarantine[0]
+            if until > now and proxy.quarantined_until == until:
+                return
+            heapq.heappop(quarantine)
+            if proxy.quarantined_until == until:
+                self._quarantined -= 1
+
+    def available(self) -> int:
+        """Number of proxies not in quarantine"""
+        with self._lock:
+            self._release(monotonic())
+            return len(self.proxies) - self._quarantined
+
+    def acquire(self) -> Proxy:
+        """Returns the proxy to use for the next attempt"""
+        proxies, now = self.proxies, monotonic()
+        if self.strategy == "weighted":
+            for _ in range(8):
+                first, second = random.choice(proxies), random.choice(proxies)
+                if first.quarantined_until > now:
+                    first = second
+                elif second.quarantined_until <= now and second.score > first.score:
+                    first = second
+                if first.quarantined_until <= now:
+                    return first
+        else:
+            size = len(proxies)
+            start = next(self._counter)
+            for offset in range(min(size, 64)):
+                proxy = proxies[(start + offset) % size]
+                if proxy.quarantined_until <= now:
+                    return proxy
+        # Everything we looked at is quarantined, fall back on the first one back
+        with self._lock:
+            self._release(now)
+            if self._quarantine:
+                return self._quarantine[0][2]
+        return random.choice(proxies)
+
+    def report(self, proxy: Proxy, success: bool, latency: Optional[float] = None) -> None:
+        """Records the outcome of an attempt made through `proxy`"""
+        decay, now = self.decay, monotonic()
+        with self._lock:
+            self._release(now)
+            quarantined = proxy.quarantined_until > now
+            if success:
+                proxy.successes = proxy.successes * decay + 1
+                proxy.failures *= decay
+                proxy.strikes = 0
+                proxy.quarantined_until = 0.0
+                if quarantined:
+                    self._quarantined -= 1
+            else:
+                proxy.failures = proxy.failures * decay + 1
+                proxy.successes *= decay
+                proxy.strikes += 1
+                quarantine = min(self.max_cooldown, self.cooldown * 2 ** min(proxy.strikes - 1, 32))
+                proxy.quarantined_until = now + quarantine
+                heapq.heappush(self._quarantine, (proxy.quarantined_until, next(self._entries), proxy))
+                if not quarantined:
+                    self._quarantined += 1
+            if latency is not None:
+                proxy.latency = latency if proxy.latency is None else proxy.latency * decay + latency * (1 - decay)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of proxies, available and quarantined"""
+        available = self.available()
+        return {"total": len(self.proxies), "available": available, "quarantined": len(self.proxies) - available}
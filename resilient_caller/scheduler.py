@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class RetryScheduler:
+    """A central timer heap for calls waiting before their next attempt.
+
+    A single timer thread sleeps until the earliest due entry, so wakeups scale
+    with due work instead of with the number of calls in backoff.
+
+    Sync functions decorated with `resilient_call()` can be submitted with
+    `submit`: each attempt runs on the worker pool and, while the call backs
+    off, it is parked in the heap without holding a worker thread. Async calls
+    park on it with the `scheduler=` retry option.
+
+    Args:
+        workers (int): size of the worker pool used by `submit`
+
+    Example:
+        >>> from resilient_caller import RetryScheduler, RETRY_EVENT
+        >>>
+        >>> scheduler = RetryScheduler(workers=8)
+        >>> futures = [scheduler.submit(fetch, key, retries=5, delay=2, exceptions={"all": RETRY_EVENT}) for key in keys]
+        >>> scheduler.depth, scheduler.next_due()
+        (120, 1.37)
+    """
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    @property
+    def depth(self) -> int:
+        """Number of parked entries"""
+        return len(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next parked entry is due, None if nothing is parked"""
+        heap = self._heap
+        return max(0.0, heap[0][0] - monotonic()) if heap else None
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> None:
+        """Runs `callback(*args)` on the timer thread once `delay` seconds passed"""
+        entry = (monotonic() + delay, next(self._counter), callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="RetryScheduler", daemon=True)
+                self._thread.start()
+            elif self._heap[0] is entry:
+                # New earliest entry, the timer thread must wake up sooner
+                self._condition.notify()
+
+    def _run(self) -> None:
+        heap, condition = self._heap, self._condition
+        while 1:
+            with condition:
+                while not heap:
+                    condition.wait()
+                timeout = heap[0][0] - monotonic()
+                if timeout > 0:
+                    condition.wait(timeout)
+                    continue
+                due, now = [], monotonic()
+                while heap and heap[0][0] <= now:
+                    due.append(heapq.heappop(heap))
+            for _, _, callback, args in due:
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception("Scheduled callback failed")
+
+    async def async_sleep(self, delay: float) -> None:
+        """Parks the current task until `delay` seconds passed"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.call_later(delay, loop.call_soon_threadsafe, _wake, future)
+        await future
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Runs a sync function decorated with `resilient_call()` on the worker pool
+
+        Returns:
+            Future: resolved with the result of the call
+        """
+        if self._executor is None:
+            with self._condition:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="RetryScheduler")
+        future = Future()
+        self._executor.submit(self._step, func.retry_steps(*args, **kwargs), future)
+        return future
+
+    def _step(self, steps, future: Future) -> None:
+        # Run until the next backoff, then park the call instead of sleeping
+        try:
+            delay = next(steps)
+        except StopIteration as stop:
+            future.set_result(stop.value)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            self.call_later(delay, self._executor.submit, self._step, steps, future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the worker pool, parked calls are dropped"""
+        with self._condition:
+            self._heap.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -1,16 +1,63 @@
 from .wrapper import RETRY_EVENT, resilient_call
-from .utils import update_session_proxy
+from .policy import RetryPolicy
+from .backoff import retry_after_delay
+from .utils import update_session_proxy, proxy_to_dict
+from .sessions import default_pool, default_async_pool
+from .timeouts import remaining_time
+from .proxies import ProxyPool
 from requests import Session, Response
+from itertools import count
+from time import monotonic
 
-@resilient_call()
-def send_request(url, *args, method="GET", session=None, proxies=None, **kwargs) -> Response:
+# Rotates proxy lists, every attempt (hedged ones included) gets the next proxy
+_proxy_counter = count()
+
+def _pick_proxy(proxies):
+    if isinstance(proxies, (list, tuple)):
+        return proxies[next(_proxy_counter) % len(proxies)]
+    return proxies
+
+@resilient_call(policy=RetryPolicy(retry_after=retry_after_delay))
+def send_request(url, *args, method="GET", session=None, proxies=None, pool=None, **kwargs) -> Response:
     """Sends an HTTP request to the specified URL and retries on failure.
-    
+
+    Without a `session`, a pooled one is checked out from `pool` (the shared
+    default pool if not given), so connections are kept alive across calls.
+    Retries of 429 and 503 responses wait as long as their `Retry-After` header asks.
+    With a list of `proxies`, every attempt uses the next one; with a
+    `ProxyPool`, every attempt gets a proxy from the pool and reports back
+    how it went (errors and responses failing `pool.healthy` count against
+    it). Without a `timeout`, the time left before the attempt deadline is
+    used.
+
     Returns:
         Response: The response object returned by the `requests` function.
     """
+    if "timeout" not in kwargs:
+        kwargs["timeout"] = remaining_time()
+    if not isinstance(proxies, ProxyPool):
+        return _send(url, args, method, session, _pick_proxy(proxies), pool, kwargs)
+
+    proxy, start = proxies.acquire(), monotonic()
+    try:
+        response = _send(url, args, method, session, proxy.proxies, pool, kwargs, per_request=True)
+    except Exception:
+        proxies.report(proxy, False)
+        raise
+    proxies.report(proxy, proxies.healthy(response), monotonic() - start)
+    return response
+
+def _send(url, args, method, session, proxies, pool, kwargs, per_request=False) -> Response:
     if session is None:
-        session = Session()
+        if proxies and isinstance(proxies, str):
+            proxies = proxy_to_dict(proxies)
+        with (pool or default_pool).session(proxies) as session:
+            # Pooled sessions are shared, pass the proxy per request instead of
+            # updating the session
+            return session.request(method, url, *args, proxies=proxies or None, **kwargs)
+
+    if per_request:
+        return session.request(method, url, *args, proxies=proxies, **kwargs)
 
     if proxies:
         # Automatically format the proxies in the correct format for the session
@@ -18,3 +65,45 @@ def send_request(url, *args, method="GET", session=None, proxies=None, **kwargs)
         update_session_proxy(session, proxies)
 
     return session.request(method, url, *args, **kwargs)
+
+@resilient_call(policy=RetryPolicy(retry_after=retry_after_delay))
+async def async_send_request(url, *args, method="GET", session=None, proxies=None, pool=None, **kwargs):
+    """Sends an HTTP request with `aiohttp` and retries on failure.
+
+    Without a `session`, the client session of `pool` (the shared default pool
+    if not given) is used, so every request of the event loop shares the same
+    connection pool. Requires `aiohttp` (`pip install resilient_caller[async]`).
+
+    Returns:
+        ClientResponse: The `aiohttp` response, with its body already read.
+    """
+    if session is None:
+        session = (pool or default_async_pool).session()
+    remaining = remaining_time()
+    if remaining is not None and "timeout" not in kwargs:
+        import aiohttp
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=remaining)
+
+    if not isinstance(proxies, ProxyPool):
+        proxies = _pick_proxy(proxies)
+        if proxies:
+            # aiohttp takes a single proxy url per request
+            if isinstance(proxies, str):
+                proxies = proxy_to_dict(proxies)
+            kwargs.setdefault("proxy", proxies.get("https" if url.startswith("https") else "http"))
+        return await _async_send(session, method, url, args, kwargs)
+
+    proxy, start = proxies.acquire(), monotonic()
+    kwargs.setdefault("proxy", proxy.url)
+    try:
+        response = await _async_send(session, method, url, args, kwargs)
+    except Exception:
+        proxies.report(proxy, False)
+        raise
+    proxies.report(proxy, proxies.healthy(response), monotonic() - start)
+    return response
+
+async def _async_send(session, method, url, args, kwargs):
+    async with session.request(method, url, *args, **kwargs) as response:
+        await response.read()
+    return response
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Union
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+class SessionPool:
+    """A thread-safe pool of reusable `requests` sessions.
+
+    Sessions sharing a pool key share one `HTTPAdapter`, so connections (and
+    TLS handshakes) are reused across calls and retries. Each checkout hands
+    out a session that no other thread is using, and its cookies are cleared
+    when it is given back, like a fresh `Session()` would be.
+
+    Args:
+        pool_connections (int): number of per-host connection pools to cache
+        pool_maxsize (int): maximum number of connections kept per host
+        pool_block (bool): block when a host pool has no free connections
+        per_proxy (bool): use a dedicated adapter (and connection pools) per proxy
+
+    Example:
+        >>> from resilient_caller import SessionPool, send_request
+        >>>
+        >>> pool = SessionPool(pool_maxsize=50, per_proxy=True)
+        >>> send_request("https://example.com", pool=pool, proxies="123:123")
+    """
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 pool_block: bool = False, per_proxy: bool = False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.per_proxy = per_proxy
+        self._lock = threading.Lock()
+        self._adapters: Dict[object, HTTPAdapter] = {}
+        self._idle: Dict[object, list] = {}
+
+    def _key(self, proxies: Optional[Union[str, Dict[str, str]]]) -> object:
+        if not self.per_proxy or not proxies:
+            return None
+        if isinstance(proxies, dict):
+            return tuple(sorted(proxies.items()))
+        return proxies
+
+    def _new_session(self, key: object) -> Session:
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = self._adapters[key] = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
+                )
+        session = Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @contextmanager
+    def session(self, proxies: Optional[Union[str, Dict[str, str]]] = None) -> Iterator[Session]:
+        """Checks out a session for the given proxy, giving it back on exit
+
+        Args:
+            proxies (Union[str, Dict[str, str]]): proxy the session will be used with
+
+        Yields:
+            Session: a session no other thread is using
+        """
+        key = self._key(proxies)
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+        if session is None:
+            session = self._new_session(key)
+        try:
+            yield session
+        finally:
+            session.cookies.clear()
+            with self._lock:
+                self._idle.setdefault(key, []).append(session)
+
+    def close(self) -> None:
+        """Closes every pooled connection"""
+        with self._lock:
+            adapters, self._adapters, self._idle = self._adapters, {}, {}
+        for adapter in adapters.values():
+            adapter.close()
+
+default_pool = SessionPool()
+
+class AsyncSessionPool:
+    """A shared `aiohttp` connection pool, one client session per event loop.
+
+    Args:
+        limit (int): maximum number of simultaneous connections
+        limit_per_host (int): maximum number of simultaneous connections per host (0 for no limit)
+
+    Example:
+        >>> from resilient_caller import AsyncSessionPool, async_send_request
+        >>>
+        >>> pool = AsyncSessionPool(limit=1000)
+        >>> await async_send_request("https://example.com", pool=pool)
+        >>> await pool.close()
+    """
+    def __init__(self, limit: int = 100, limit_per_host: int = 0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def session(self):
+        """Returns the client session of the running event loop, creating it if needed"""
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("aiohttp is required for async requests, install resilient_caller[async]") from None
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector)
+        return session
+
+    async def close(self) -> None:
+        """Closes the client session of the running event loop"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+default_async_pool = AsyncSessionPool()
@@ -0,0 +1,189 @@
+import abc
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from time import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Every key holds this many floats, their meaning is up to the caller
+FIELDS = 4
+_RECORD = struct.Struct(f"<Q{FIELDS}d")
+
+def shared_key(key: Any) -> str:
+    """Returns a key that's the same in every process, functions by their qualified name"""
+    if isinstance(key, str):
+        return key
+    if callable(key):
+        key = getattr(key, "__wrapped__", key)
+        return f"{key.__module__}:{key.__qualname__}"
+    return repr(key)
+
+class StateBackend(abc.ABC):
+    """Storage of the state shared by rate limiters and circuit breakers.
+
+    Each key holds `FIELDS` floats (0 for a new key). `update` runs a function
+    on them atomically: `func(values, now)` mutates the `values` list in place
+    and returns the result of the operation. Backends shared between processes
+    make every process see, and update, the same values.
+    """
+    @abc.abstractmethod
+    def update(self, key: str, func: Callable[[List[float], float], T]) -> T:
+        """Runs `func(values, now)` atomically on the values of a key, returns its result"""
+
+    def get(self, key: str) -> List[float]:
+        """Returns a copy of the values of a key"""
+        return self.update(key, lambda values, now: list(values))
+
+class LocalBackend(StateBackend):
+    """State kept in this process only, the default behaviour"""
+    def __init__(self):
+        self._values: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, func):
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * FIELDS
+            return func(values, time())
+
+class MmapBackend(StateBackend):
+    """State kept in a memory-mapped file, shared by every process of the node that opens it.
+
+    The file is a fixed table of `slots` records found by hashing the key.
+    Updates lock their record with `fcntl.lockf` (and one of `stripes`
+    thread locks, record locks don't exclude threads of the same process),
+    so they are atomic across processes while updates of other keys run in
+    parallel. POSIX only.
+
+    Args:
+        path (str): file of the table, created if needed
+        slots (int): number of keys the table can hold
+        stripes (int): thread locks shared by the slots of this process
+
+    Example:
+        >>> from resilient_caller import MmapBackend, RateLimiter, CircuitBreaker, host_key
+        >>>
+        >>> backend = MmapBackend("/dev/shm/resilient_caller")
+        >>> limiter = RateLimiter(rate=20, burst=5, key=host_key, backend=backend)
+        >>> breaker = CircuitBreaker(key=host_key, backend=backend)
+    """
+    def __init__(self, path: str, slots: int = 4096, stripes: int = 64):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        size = slots * _RECORD.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        # key -> slot, slots are never freed so it can be cached
+        self._slots: Dict[str, int] = {}
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def _locked(self, slot: int, func: Callable[[], T]) -> T:
+        fcntl, offset = self._fcntl, slot * _RECORD.size
+        with self._locks[slot % len(self._locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _RECORD.size, offset)
+            try:
+                return func()
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _RECORD.size, offset)
+
+    def _find(self, key: str) -> int:
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+        hashed, start = self._hash(key), self._hash(key) % self.slots
+        for probe in range(self.slots):
+            slot = (start + probe) % self.slots
+            offset = slot * _RECORD.size
+
+            def claim():
+                owner = _RECORD.unpack_from(self._map, offset)[0]
+                if owner == 0:
+                    _RECORD.pack_into(self._map, offset, hashed, *([0.0] * FIELDS))
+                    return True
+                return owner == hashed
+
+            if self._locked(slot, claim):
+                self._slots[key] = slot
+                return slot
+        raise RuntimeError(f"Shared state table {self.path} is full, open it with more slots")
+
+    def update(self, key, func):
+        slot = self._find(key)
+        offset = slot * _RECORD.size
+
+        def apply():
+            record = _RECORD.unpack_from(self._map, offset)
+            values = list(record[1:])
+            result = func(values, time())
+            _RECORD.pack_into(self._map, offset, record[0], *values)
+            return result
+
+        return self._locked(slot, apply)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+class RedisBackend(StateBackend):
+    """State kept in Redis, or any server speaking its protocol, shared by every process using it.
+
+    Updates are optimistic transactions (`WATCH`/`MULTI`), retried on conflicts.
+
+    Args:
+        client: a `redis.Redis` compatible client
+        prefix (str): prefix of the keys
+        ttl (int): seconds an unused key is kept
+
+    Example:
+        >>> import redis
+        >>> from resilient_caller import RedisBackend, RateLimiter
+        >>>
+        >>> limiter = RateLimiter(rate=20, backend=RedisBackend(redis.Redis()))
+    """
+    def __init__(self, client: Any, prefix: str = "resilient_caller:", ttl: int = 3600):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._values = struct.Struct(f"<{FIELDS}d")
+
+    def update(self, key, func):
+        name = self.prefix + key
+
+        def transaction(pipe):
+            raw = pipe.get(name)
+            values = list(self._values.unpack(raw)) if raw else [0.0] * FIELDS
+            result = func(values, time())
+            pipe.multi()
+            pipe.set(name, self._values.pack(*values), ex=self.ttl)
+            return result
+
+        return self.client.transaction(transaction, name, value_from_callable=True)
+
+def take_token(rate: float, burst: float) -> Callable[[List[float], float], float]:
+    """Token bucket update of `(tokens, updated)`, returns the seconds to wait for the token"""
+    def update(values, now):
+        tokens, updated = values[0], values[1]
+        # A new key starts with a full bucket
+        tokens = min(burst, tokens + (now - updated) * rate) if updated else burst
+        tokens -= 1
+        values[0], values[1] = tokens, now
+        return -tokens / rate if tokens < 0 else 0.0
+    return update
@@ -0,0 +1,472 @@
+import asyncio
+import logging
+import math
+import random
+import selectors
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from .exceptions import RetriesExhausted
+from .policy import RetryPolicy
+from .timeouts import _clock
+from .wrapper import with_retry
+
+# Call outcomes of a simulation
+OK = "ok"                # returned a successful response
+FAILED = "failed"        # returned an error response, e.g. a 429 nobody retried
+EXHAUSTED = "exhausted"  # retries, elapsed time or budget ran out
+ERROR = "error"          # unhandled exception or open circuit
+
+Latency = Union[float, Callable[[random.Random], float]]
+
+class VirtualClock:
+    """Simulated time in seconds, only moving when the simulation waits"""
+    __slots__ = ("now",)
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Polls without blocking and moves the clock to the next timer instead of waiting for it"""
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError(
+                "The simulation is waiting on a thread or real I/O, which never happens in virtual time "
+                "(schedulers and sync functions can't be simulated)"
+            )
+        self.clock.advance(timeout)
+        return events
+
+class _VirtualLoop(asyncio.SelectorEventLoop):
+    """An event loop whose timers run on a `VirtualClock`"""
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        super().__init__(_VirtualSelector(clock))
+
+    def time(self) -> float:
+        return self.clock.now
+
+# Latency distributions, called with the random generator of the simulation
+
+def constant(seconds: float) -> Callable[[random.Random], float]:
+    return lambda rng: seconds
+
+def uniform(low: float, high: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.uniform(low, high)
+
+def exponential(mean: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.expovariate(1 / mean)
+
+def lognormal(median: float, sigma: float = 0.5) -> Callable[[random.Random], float]:
+    """Long-tailed latencies, the usual shape of service response times"""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+def _distribution(latency: Latency) -> Callable[[random.Random], float]:
+    return latency if callable(latency) else constant(latency)
+
+def _make_error(error: Callable[..., BaseException], message: str) -> BaseException:
+    # A fresh exception per attempt, raising the same one grows its traceback
+    return error(message) if isinstance(error, type) else error()
+
+class SimulatedResponse:
+    """A response of the simulated upstream, shaped like `requests` responses for
+    `conditions_criteria` and `backoff.retry_after_delay`"""
+    __slots__ = ("status_code", "headers")
+
+    def __init__(self, status_code: int = 200, headers: Optional[dict] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def __repr__(self):
+        return f"<SimulatedResponse [{self.status_code}]>"
+
+class Fault:
+    """Base class of the faults an `Upstream` injects.
+
+    `outcome(now, rng)` returns the exception or response of an attempt
+    started at virtual time `now`, or None to let the next fault (or the
+    normal response) decide. A faulty attempt takes `latency`, by default the
+    latency of the upstream.
+    """
+    latency: Optional[Latency] = None
+
+    def outcome(self, now: float, rng: random.Random) -> Any:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forgets the state of the previous simulation"""
+
+class ErrorRate(Fault):
+    """Fails a fraction of the attempts at random.
+
+    Args:
+        rate (float): probability of failing an attempt
+        error (Callable): exception class (or factory) raised
+        latency: latency of the failed attempts, by default the upstream's
+    """
+    def __init__(self, rate: float, error: Callable[..., BaseException] = ConnectionError,
+                 latency: Optional[Latency] = None):
+        self.rate = rate
+        self.error = error
+        self.latency = latency
+
+    def outcome(self, now, rng):
+        if rng.random() < self.rate:
+            return _make_error(self.error, "Simulated error")
+        return None
+
+def _in_window(now: float, start: float, duration: float, every: Optional[float]) -> bool:
+    if every:
+        now = start + (now - start) % every if now >= start else now
+    return start <= now < start + duration
+
+class Outage(Fault):
+    """Fails every attempt during a window of time, e.g. a host going down.
+
+    Args:
+        start (float): virtual second the outage starts
+        duration (float): seconds it lasts
+        every (float): repeat it every so many seconds
+        error (Callable): exception class (or factory) raised
+        latency: latency of the failed attempts, connection errors are fast
+    """
+    def __init__(self, start: float, duration: float, every: Optional[float] = None,
+                 error: Callable[..., BaseException] = ConnectionError, latency: Optional[Latency] = 0.001):
+        self.start = start
+        self.duration = duration
+        self.every = every
+        self.error = error
+        self.latency = latency
+
+    def outcome(self, now, rng):
+        if _in_window(now, self.start, self.duration, self.every):
+            return _make_error(self.error, "Simulated outage")
+        return None
+
+class Throttle(Fault):
+    """Answers 429 during bursts, optionally with a `Retry-After` header.
+
+    Args:
+        start (float): virtual second the first burst starts
+        duration (float): seconds a burst lasts
+        every (float): seconds between the starts of bursts
+        probability (float): share of the attempts throttled during a burst
+        retry_after (float): seconds sent in `Retry-After`, none if None
+        status (int): status code of the throttled responses
+        latency: latency of the throttled responses
+    """
+    def __init__(self, start: float = 0, duration: float = 5, every: Optional[float] = 60,
+                 probability: float = 1.0, retry_after: Optional[float] = None, status: int = 429,
+                 latency: Optional[Latency] = 0.001):
+        self.start = start
+        self.duration = duration
+        self.every = every
+        self.probability = probability
+        self.retry_after = retry_after
+        self.status = status
+        self.latency = latency
+
+    def outcome(self, now, rng):
+        if _in_window(now, self.start, self.duration, self.every) and rng.random() < self.probability:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return SimulatedResponse(self.status, headers)
+        return None
+
+class Overload(Fault):
+    """Rejects the attempts over a capacity, so retry storms feed themselves.
+
+    Every attempt received counts against the capacity, rejected ones
+    included.
+
+    Args:
+        capacity (float): attempts per second served
+        window (float): seconds the capacity is measured over
+        status (int): status code of the rejected responses
+        retry_after (float): seconds sent in `Retry-After`, none if None
+        latency: latency of the rejected responses
+    """
+    def __init__(self, capacity: float, window: float = 1.0, status: int = 503,
+                 retry_after: Optional[float] = None, latency: Optional[Latency] = 0.001):
+        self.capacity = capacity
+        self.window = window
+        self.status = status
+        self.retry_after = retry_after
+        self.latency = latency
+        self._received = deque()
+
+    def reset(self):
+        self._received.clear()
+
+    def outcome(self, now, rng):
+        received = self._received
+        while received and received[0] <= now - self.window:
+            received.popleft()
+        received.append(now)
+        if len(received) > self.capacity * self.window:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return SimulatedResponse(self.status, headers)
+        return None
+
+class Upstream:
+    """The simulated service: the latency of its responses and the faults it injects.
+
+    Faults are checked in order, the first one returning an outcome decides
+    the attempt; otherwise it succeeds with `response`.
+
+    Args:
+        latency: seconds an attempt takes, a number or a distribution like `lognormal(0.05)`
+        faults (Iterable[Fault]): faults to inject
+        response (Callable): returns the successful response, `SimulatedResponse(200)` by default
+
+    Example:
+        >>> from resilient_caller.simulate import Upstream, ErrorRate, Outage, Throttle, lognormal
+        >>>
+        >>> upstream = Upstream(
+        ...     latency=lognormal(median=0.08, sigma=0.6),
+        ...     faults=[Outage(start=120, duration=20), Throttle(every=60, duration=5, retry_after=2), ErrorRate(0.02)],
+        ... )
+    """
+    def __init__(self, latency: Latency = lognormal(0.05), faults: Iterable[Fault] = (),
+                 response: Optional[Callable[[], Any]] = None):
+        self.latency = _distribution(latency)
+        self.faults = tuple(faults)
+        self.response = response or SimulatedResponse
+
+    def reset(self) -> None:
+        for fault in self.faults:
+            fault.reset()
+
+    def attempt(self, now: float, rng: random.Random) -> tuple:
+        """Returns the latency and the outcome (response or exception) of an attempt"""
+        for fault in self.faults:
+            outcome = fault.outcome(now, rng)
+            if outcome is not None:
+                latency = self.latency if fault.latency is None else _distribution(fault.latency)
+                return latency(rng), outcome
+        return self.latency(rng), self.response()
+
+class SimulationReport:
+    """What a retry policy did against a simulated upstream.
+
+    Attributes:
+        name (str): name of the policy
+        calls (int): calls made
+        outcomes (Dict[str, int]): calls by outcome, "ok", "failed", "exhausted" or "error"
+        success_rate (float): share of the calls that succeeded
+        attempts (int): attempts received by the upstream
+        attempts_per_call (float): mean attempts per call, the load amplification
+        max_attempts (int): most attempts made by a call
+        peak_amplification (float): highest attempt rate over a window, relative to the call rate
+        latency_p50 (float): median seconds from the call to its outcome, failures included
+        latency_p99 (float): 99th percentile of the same
+        latency_max (float): slowest call
+        duration (float): virtual seconds simulated
+    """
+    __slots__ = (
+        "name", "calls", "outcomes", "success_rate", "attempts", "attempts_per_call", "max_attempts",
+        "peak_amplification", "latency_p50", "latency_p99", "latency_max", "duration",
+    )
+
+    def __init__(self, name: str, calls: int, outcomes: Dict[str, int], attempts: List[int],
+                 latencies: List[float], peak_amplification: float, duration: float):
+        latencies = sorted(latencies)
+        self.name = name
+        self.calls = calls
+        self.outcomes = outcomes
+        self.success_rate = outcomes.get(OK, 0) / calls if calls else 0.0
+        self.attempts = sum(attempts)
+        self.attempts_per_call = self.attempts / calls if calls else 0.0
+        self.max_attempts = max(attempts, default=0)
+        self.peak_amplification = peak_amplification
+        self.latency_p50 = _percentile(latencies, 0.5)
+        self.latency_p99 = _percentile(latencies, 0.99)
+        self.latency_max = latencies[-1] if latencies else 0.0
+        self.duration = duration
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (
+            f"SimulationReport({self.name!r}, success_rate={self.success_rate:.4f}, "
+            f"attempts_per_call={self.attempts_per_call:.2f}, latency_p99={self.latency_p99:.3f})"
+        )
+
+def _percentile(ordered: Sequence[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class _Call:
+    __slots__ = ("attempts",)
+
+    def __init__(self):
+        self.attempts = 0
+
+async def _simulation(policy: RetryPolicy, upstream: Upstream, calls: int, rate: float, seed: int,
+                      arrivals: str, window: float, name: str) -> SimulationReport:
+    loop = asyncio.get_running_loop()
+    # Arrivals don't depend on the policy, so every policy sees the same traffic
+    arrival_rng, upstream_rng = random.Random(seed), random.Random(seed + 1)
+    started: List[float] = []
+
+    async def upstream_call(call):
+        now = loop.time()
+        started.append(now)
+        call.attempts += 1
+        latency, outcome = upstream.attempt(now, upstream_rng)
+        await asyncio.sleep(latency)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    func = with_retry(policy=policy)(upstream_call)
+    outcomes: Counter = Counter()
+    attempts: List[int] = []
+    latencies: List[float] = []
+
+    async def run_call():
+        call, start = _Call(), loop.time()
+        try:
+            response = await func(call)
+        except RetriesExhausted:
+            outcome = EXHAUSTED
+        except Exception:
+            outcome = ERROR
+        else:
+            outcome = OK if getattr(response, "ok", True) else FAILED
+        outcomes[outcome] += 1
+        attempts.append(call.attempts)
+        latencies.append(loop.time() - start)
+
+    tasks = []
+    for _ in range(calls):
+        tasks.append(loop.create_task(run_call()))
+        await asyncio.sleep(arrival_rng.expovariate(rate) if arrivals == "poisson" else 1 / rate)
+    await asyncio.gather(*tasks)
+
+    per_window = Counter(int(start // window) for start in started)
+    peak = max(per_window.values(), default=0) / (rate * window)
+    return SimulationReport(name, calls, dict(outcomes), attempts, latencies, peak, loop.time())
+
+def _run(policy, upstream, calls, rate, seed, arrivals, window, name, quiet) -> SimulationReport:
+    clock = VirtualClock()
+    loop = _VirtualLoop(clock)
+    # Thousands of exhausted calls would each log an error
+    loggers = [logging.getLogger(f"{__package__}.{module}") for module in ("wrapper", "hedging")] if quiet else []
+    disabled = [logger.disabled for logger in loggers]
+    for logger in loggers:
+        logger.disabled = True
+    token = _clock.set(clock)
+    # Jitter strategies draw from the global generator, seed it for the run only
+    state = random.getstate()
+    random.seed(seed + 2)
+    try:
+        upstream.reset()
+        return loop.run_until_complete(
+            _simulation(policy, upstream, calls, rate, seed, arrivals, window, name)
+        )
+    finally:
+        random.setstate(state)
+        _clock.reset(token)
+        for logger, was_disabled in zip(loggers, disabled):
+            logger.disabled = was_disabled
+        loop.close()
+
+def simulate(policy: Optional[RetryPolicy] = None, upstream: Optional[Upstream] = None, calls: int = 1000,
+             rate: float = 100.0, seed: int = 0, arrivals: str = "poisson", window: float = 1.0,
+             name: Optional[str] = None, quiet: bool = True, **retry_kwargs) -> SimulationReport:
+    """Runs a retry policy against a simulated upstream, in virtual time.
+
+    Calls arrive at `rate` per second and run through the real async retry
+    loop, but sleeps, attempt timeouts, hedging delays, retry budgets, rate
+    limiters and circuit breakers all follow a virtual clock: a simulated hour
+    takes as long as the work it contains, and the same seed always gives the
+    same report: the global `random` generator used by the jitter strategies
+    is seeded for the run, and restored afterwards. Calls always raise on
+    exhaustion, so they're told apart from successes.
+
+    Limiters, budgets and breakers keep their state between simulations:
+    give every run its own. Shared state backends, schedulers and
+    observers still use the real clock.
+
+    Args:
+        policy (RetryPolicy): the policy to evaluate
+        upstream (Upstream): latency and faults of the simulated service
+        calls (int): number of calls
+        rate (float): calls per virtual second
+        seed (int): seed of the random generators
+        arrivals (str): "poisson" or "uniform" spacing of the calls
+        window (float): seconds over which the peak attempt rate is measured
+        name (str): name of the report
+        quiet (bool): silence the errors logged by the retry loop meanwhile
+        **retry_kwargs: retry options overriding the policy
+
+    Returns:
+        SimulationReport: success rate, attempts and latencies of the calls
+
+    Example:
+        >>> from resilient_caller import RetryPolicy, RETRY_EVENT, backoff
+        >>> from resilient_caller.simulate import simulate, Upstream, Outage, ErrorRate
+        >>>
+        >>> upstream = Upstream(faults=[Outage(start=30, duration=10), ErrorRate(0.05)])
+        >>> simulate(RetryPolicy(retries=5, exceptions={"all": RETRY_EVENT}, backoff_strategy=backoff.full_jitter()),
+        ...          upstream, calls=10000, rate=200)
+        SimulationReport('policy', success_rate=0.8644, attempts_per_call=1.82, latency_p99=5.478)
+    """
+    if arrivals not in ("poisson", "uniform"):
+        raise ValueError(f"Unknown arrivals {arrivals!r}, expected 'poisson' or 'uniform'")
+    policy = (policy or RetryPolicy()).replace(raise_exhausted=True, **retry_kwargs)
+    upstream = upstream or Upstream()
+    args = (policy, upstream, calls, rate, seed, arrivals, window, name or "policy", quiet)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return _run(*args)
+    # Already inside an event loop (e.g. a notebook), run the simulation on its own thread
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(_run, *args).result()
+
+def compare(policies: Dict[str, RetryPolicy], upstream: Optional[Upstream] = None,
+            **options) -> List[SimulationReport]:
+    """Simulates several policies against the same upstream and traffic
+
+    Example:
+        >>> reports = compare({"fixed": fixed_policy, "jitter": jitter_policy}, upstream, calls=5000, rate=100)
+        >>> print(report_table(reports))
+    """
+    return [simulate(policy, upstream, name=name, **options) for name, policy in policies.items()]
+
+def report_table(reports: Iterable[SimulationReport]) -> str:
+    """Formats reports as a text table, one policy per row"""
+    header = ("policy", "success", "attempts/call", "max attempts", "peak load", "p50", "p99")
+    rows = [
+        (
+            report.name, f"{report.success_rate:.2%}", f"{report.attempts_per_call:.2f}", str(report.max_attempts),
+            f"{report.peak_amplification:.2f}x", f"{report.latency_p50 * 1000:.0f} ms",
+            f"{report.latency_p99 * 1000:.0f} ms",
+        )
+        for report in reports
+    ]
+    widths = [max(len(row[column]) for row in [header, *rows]) for column in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in [header, *rows]]
+    return "\n".join(lines)
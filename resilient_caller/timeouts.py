@@ -0,0 +1,64 @@
+import contextvars
+import threading
+from time import time
+from typing import Any, Callable, Optional
+
+from .exceptions import AttemptTimeout
+
+# Absolute deadline (epoch seconds) of the running attempt, if any
+_deadline: contextvars.ContextVar = contextvars.ContextVar("resilient_caller_deadline", default=None)
+# Clock of the retry loop and of the limits and breakers, None for the real
+# clocks; simulations replace it with a virtual clock
+_clock: contextvars.ContextVar = contextvars.ContextVar("resilient_caller_clock", default=None)
+
+def remaining_time() -> Optional[float]:
+    """Returns the seconds left before the deadline of the running attempt.
+
+    Functions called by the wrapper can use it to bound their own blocking
+    work, `send_request` uses it as its default `timeout`.
+
+    Returns:
+        Optional[float]: seconds left, None if the attempt has no deadline
+
+    Example:
+        >>> from resilient_caller import resilient_call, remaining_time
+        >>>
+        >>> @resilient_call()
+        ... def fetch(sock):
+        ...     sock.settimeout(remaining_time())
+        ...     return sock.recv(1024)
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - (_clock.get() or time)())
+
+def attempt_timeout(timeout: Optional[float], deadline: Optional[float]) -> float:
+    """Returns the timeout of the next attempt from `attempt_timeout` and the call deadline"""
+    if deadline is None:
+        return timeout
+    remaining = max(0.0, deadline - (_clock.get() or time)())
+    return remaining if timeout is None else min(timeout, remaining)
+
+def _run(future: "Future", context: contextvars.Context, f: Callable, args: tuple, kwargs: dict) -> None:
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(context.run(f, *args, **kwargs))
+    except BaseException as e:
+        future.set_exception(e)
+
+def call_with_timeout(f: Callable, args: tuple, kwargs: dict, timeout: float) -> Any:
+    """Runs a sync function on a daemon thread, raising `AttemptTimeout` after `timeout` seconds.
+
+    Threads can't be interrupted, so a timed out call keeps running in the
+    background and its result is discarded; it won't block interpreter exit.
+    """
+    from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+    future = Future()
+    threading.Thread(
+        target=_run, args=(future, contextvars.copy_context(), f, args, kwargs), daemon=True,
+    ).start()
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise AttemptTimeout(f"Attempt of function {f.__name__} timed out after {timeout:.3f} seconds") from None
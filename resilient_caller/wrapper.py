@@ -1,107 +1,401 @@
 import functools
 import logging
-import asyncio
-from time import time
-from .exceptions import UnhandledException
+from time import time, sleep
+from typing import Optional
+from .exceptions import UnhandledException, RetriesExhausted, CircuitOpenError, AttemptTimeout
+from .policy import CONFIG_KEYS, RetryPolicy, iscoroutinefunction
+from .timeouts import _clock, _deadline, attempt_timeout, call_with_timeout
+from .observers import CallEvent, AttemptEvent, OK, RESULT, RETRY, RAISE, UNHANDLED, EXHAUSTED, ERROR
 
 logger = logging.getLogger(__name__)
-RETRY_EVENT = object()
 
-def with_retry(max_elapsed_time=None, backoff_strategy=None):
-    def decorator(f):
-        @functools.wraps(f)
-        async def async_wrapper(*args, **kwargs):
-            config = {
-                "conditions": kwargs.pop("conditions", None),
-                "conditions_criteria": kwargs.pop("conditions_criteria", None),
-                "exceptions": kwargs.pop("exceptions", None),
-                "retries": kwargs.pop("retries", False),
-                "delay": kwargs.pop("delay", 0),
-                "on_retry": kwargs.pop("on_retry", None),
-            }
-
-            async def run_action(action, response):
-                if callable(action):
-                    num_args = action.__code__.co_argcount
-                    if asyncio.iscoroutinefunction(action):
-                        if num_args == 2:
-                            return await action(response, tries)
-                        else:
-                            return await action(response)
-                    else:
-                        if num_args == 2:
-                            return action(response, tries)
-                        else:
-                            return action(response)
-                return action
+class _RetryEvent:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "RETRY_EVENT"
+
+    def __reduce__(self):
+        # Unpickle to the same singleton, e.g. in process pool workers
+        return "RETRY_EVENT"
+
+RETRY_EVENT = _RetryEvent()
+
+def _run_coroutine(coroutine):
+    # Keep supporting async handlers on sync functions
+    import asyncio
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from inside an event loop, run the handler on its own thread
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def _exhausted(message, tries, last):
+    logger.error(message)
+    # Caches and observers need to tell exhausted calls apart, the
+    # outermost wrapper returns None unless `raise_exhausted`
+    raise RetriesExhausted(message, tries, last)
+
+class _RetryState:
+    """Bookkeeping of one call, shared by the sync and async retry loops.
+
+    It runs the checks before each attempt and records its outcome, the loops
+    only wait, call the function and await or run the handlers. `tries`
+    counts the attempts started so far.
+    """
+    __slots__ = ("f", "config", "call", "clock", "start_time", "deadline", "timed", "delay", "tries", "last",
+                 "circuit", "limiter", "limiter_key", "observer", "debug")
+
+    def __init__(self, f, config, args, kwargs, call=None):
+        self.f = f
+        self.config = config
+        self.call = call
+        # The real clock, or the virtual one of a simulation
+        self.clock = _clock.get() or time
+        self.start_time = self.clock()
+        self.deadline = self.start_time + config.max_elapsed_time if config.max_elapsed_time else None
+        self.timed = self.deadline is not None or config.attempt_timeout
+        self.delay = config.delay
+        self.tries = 0
+        self.last = None
+        self.circuit = config.circuit_breaker.circuit_for(f, args, kwargs) if config.circuit_breaker else None
+        self.limiter = config.rate_limiter
+        self.limiter_key = self.limiter.key_for(f, args, kwargs) if self.limiter else None
+        self.observer = config.observer if call is not None else None
+        self.debug = logger.isEnabledFor(logging.DEBUG)
+        if config.retry_budget:
+            config.retry_budget.deposit()
+
+    def limit_reached(self) -> Optional[str]:
+        """Returns why no other attempt may start, None if one may"""
+        config = self.config
+        if config.max_elapsed_time and (self.clock() - self.start_time) > config.max_elapsed_time:
+            return "Max elapsed time reached"
+        if config.retries and self.tries >= config.retries:
+            return "Max retries reached"
+        return None
+
+    def exhausted(self, reason: str):
+        return _exhausted(f"{reason} for function {self.f.__name__}", self.tries, self.last)
+
+    def withdraw(self) -> bool:
+        """Takes a retry from the budget, False if it is exhausted"""
+        return not self.config.retry_budget or self.config.retry_budget.withdraw()
+
+    def backoff(self) -> Optional[float]:
+        """Checks another attempt may start, returns the seconds to wait before it.
+
+        Returns None before the first attempt, raises `RetriesExhausted` when
+        the retries, the budget or the time are used up.
+        """
+        if not self.tries:
+            return None
+        reason = self.limit_reached()
+        if reason:
+            return self.exhausted(reason)
+        if not self.withdraw():
+            return self.exhausted("Retry budget exhausted")
+        config = self.config
+        if config.on_retry:
+            config.on_retry(self.tries)
+        if config.backoff_strategy:
+            # The strategy sets the first retry's wait too, `delay` only seeds it
+            if config.backoff_pass_delay:
+                self.delay = config.backoff_strategy(self.tries, self.delay)
+            else:
+                self.delay = config.backoff_strategy(self.tries)
+        wait = self.delay
+        if config.retry_after:
+            hint = config.retry_after(self.last)
+            if hint is not None:
+                wait = hint
+        if self.deadline is not None and self.clock() + wait >= self.deadline:
+            # No time would be left for the attempt after sleeping
+            return self.exhausted("Max elapsed time reached")
+        if self.debug:
+            logger.debug("Waiting %s seconds before retrying", wait)
+        return wait
+
+    def throttle(self) -> float:
+        """Reserves a token of the rate limiter, returns the seconds to wait for it"""
+        return self.limiter.reserve(self.limiter_key) or 0
+
+    def start(self, slept: float = 0) -> Optional[AttemptEvent]:
+        """Lets an attempt through the circuit breaker, returns its observer event"""
+        f = self.f
+        if self.circuit is not None and not self.circuit.allow():
+            logger.error("Circuit open for function %s", f.__name__)
+            raise CircuitOpenError(f"Circuit open for function {f.__name__}")
+        event = None
+        if self.observer is not None:
+            event = AttemptEvent(self.call, self.tries, slept)
+            self.observer.attempt_started(event)
+        self.tries += 1
+        if self.debug:
+            logger.debug("Executing function %s", f.__name__)
+        return event
+
+    def timeout(self) -> float:
+        """Returns the timeout of the next attempt, when `timed`"""
+        return attempt_timeout(self.config.attempt_timeout, self.deadline)
+
+    def timed_out(self, timeout: float) -> AttemptTimeout:
+        return AttemptTimeout(f"Attempt of function {self.f.__name__} timed out after {timeout:.3f} seconds")
+
+    def condition_handler(self, response, event):
+        """Returns the condition handler of a response, None if it is accepted as is"""
+        if self.debug:
+            # Don't format whole responses, they can be huge
+            logger.debug("Got %s response from function %s", type(response).__name__, self.f.__name__)
+        if self.config.conditions:
+            handler = self.config.condition_handler(response)
+            if handler:
+                return handler
+        if self.circuit is not None:
+            self.circuit.record(True)
+        if event is not None:
+            self.observer.attempt_ended(event.end(OK))
+        return None
+
+    def exception_handler(self, error, event):
+        """Returns the exception handler of an error, raises the error if there is none"""
+        config = self.config
+        if self.circuit is not None:
+            self.circuit.record(False)
+        if config.exceptions:
+            if config.raise_exceptions:
+                if event is not None:
+                    self.observer.attempt_ended(event.end(RAISE, None, error))
+                if self.debug:
+                    logger.debug("Got raise event from exception %s because of config", type(error).__name__)
+                raise error
+            handler = config.exception_handler(error)
+            if handler:
+                return handler
+        if event is not None:
+            self.observer.attempt_ended(event.end(UNHANDLED, None, error))
+        logger.error("Unhandled exception %s (%s)", type(error).__name__, error)
+        raise UnhandledException(error)
 
-            tries, start_time = 0, time()
+    def retry(self, handler, result, outcome, event, error: bool = False) -> bool:
+        """Records what a handler returned for an attempt, True to retry"""
+        if result is RETRY_EVENT:
+            if self.circuit is not None and not error:
+                self.circuit.record(False)
+            if event is not None:
+                self.observer.attempt_ended(event.end(RETRY, handler.key, outcome if error else None))
+            if self.debug:
+                if error:
+                    logger.debug("Got retry event from exception %s", type(outcome).__name__)
+                else:
+                    logger.debug("Got retry event from condition %r", handler.key)
+            self.last = outcome
+            return True
+        if self.circuit is not None and not error:
+            self.circuit.record(True)
+        if event is not None:
+            self.observer.attempt_ended(event.end(RESULT, handler.key, outcome if error else None))
+        if self.debug:
+            if error:
+                logger.debug("Got result from exception %s", type(outcome).__name__)
+            else:
+                logger.debug("Got result from condition %r", handler.key)
+        return False
+
+def run_steps(steps):
+    """Runs a sync retry loop, sleeping whenever it asks to"""
+    try:
+        while 1:
+            delay = next(steps)
+            # `sleep(0)` still costs a system call
+            if delay:
+                sleep(delay)
+    except StopIteration as stop:
+        return stop.value
+
+def with_retry(max_elapsed_time=None, backoff_strategy=None, policy=None):
+    base_policy = policy or RetryPolicy()
+    if max_elapsed_time is not None or backoff_strategy is not None:
+        base_policy = base_policy.replace(
+            max_elapsed_time=base_policy.max_elapsed_time or max_elapsed_time,
+            backoff_strategy=base_policy.backoff_strategy or backoff_strategy,
+        )
+
+    def resolve_policy(kwargs):
+        # Only calls passing retry options pay for building a policy
+        if not kwargs or CONFIG_KEYS.isdisjoint(kwargs):
+            return base_policy
+        call_policy = kwargs.pop("policy", None) or base_policy
+        overrides = {key: kwargs.pop(key) for key in CONFIG_KEYS if key in kwargs}
+        return call_policy.replace(**overrides) if overrides else call_policy
+
+
+    def decorator(f):
+        async def run_async(config, args, kwargs, call=None):
+            # Only imported once an async function is called
+            import asyncio
+            if config.hedge:
+                from .hedging import hedged_call
+                return await hedged_call(f, config, args, kwargs, call)
+            state = _RetryState(f, config, args, kwargs, call)
             while 1:
-                if max_elapsed_time and (time() - start_time) > max_elapsed_time:
-                    logger.error(f"Max elapsed time reached for function {f.__name__}")
-                    return None
-                
-                if config["retries"] and tries >= config["retries"]:
-                    logger.error(f"Max retries reached for function {f.__name__}")
-                    return None
-
-                if tries > 0:
-                    if config["on_retry"]:
-                        config["on_retry"](tries)
-                    logger.debug(f"Waiting {config['delay']} seconds before retrying")
-                    await asyncio.sleep(config["delay"])
-                    if backoff_strategy:
-                        config["delay"] = backoff_strategy(tries)
+                slept = state.backoff()
+                if slept is not None:
+                    if config.scheduler:
+                        await config.scheduler.async_sleep(slept)
+                    else:
+                        await asyncio.sleep(slept)
+                wait = state.throttle() if state.limiter is not None else 0
+                if wait:
+                    await asyncio.sleep(wait)
+                event = state.start((slept or 0) + wait)
                 try:
-                    logger.debug(f"Executing function {f.__name__}")
-                    if asyncio.iscoroutinefunction(f):
+                    if not state.timed:
                         response = await f(*args, **kwargs)
                     else:
-                        response = await asyncio.to_thread(f, *args, **kwargs)
-                    logger.debug(f"Got response ({response})")
-
-                    if config["conditions"]:
-                        criteria = config["conditions_criteria"](response) if config["conditions_criteria"] else response
-                        action = config["conditions"].get(criteria, None) or config["conditions"].get("all", None)
-                        if action:
-                            result = await run_action(action, response)
-                            if result == RETRY_EVENT:
-                                logger.debug(f"Got retry event ({result})")
-                                tries += 1
-                                continue
-                            else:
-                                logger.debug(f"Got result ({result})")
-                                return result
-                    return response
+                        timeout = state.timeout()
+                        token = _deadline.set(state.clock() + timeout)
+                        try:
+                            response = await asyncio.wait_for(f(*args, **kwargs), timeout)
+                        except asyncio.TimeoutError:
+                            raise state.timed_out(timeout) from None
+                        finally:
+                            _deadline.reset(token)
+                    handler = state.condition_handler(response, event)
+                    if handler is None:
+                        return response
+                    result = handler(response, state.tries - 1)
+                    if handler.is_async:
+                        result = await result
+                    if not state.retry(handler, result, response, event):
+                        return result
+                except Exception as e:
+                    handler = state.exception_handler(e, event)
+                    result = handler(e, state.tries - 1)
+                    if handler.is_async:
+                        result = await result
+                    if not state.retry(handler, result, e, event, error=True):
+                        return result
 
+        def attempts(config, args, kwargs, call=None):
+            # The sync retry loop, as a generator yielding the delay before each
+            # retry so a scheduler can park the call instead of sleeping
+            if config.hedge:
+                from .hedging import hedged_call_sync
+                return hedged_call_sync(f, config, args, kwargs, call)
+            state = _RetryState(f, config, args, kwargs, call)
+            while 1:
+                slept = state.backoff()
+                if slept is not None:
+                    yield slept
+                wait = state.throttle() if state.limiter is not None else 0
+                if wait:
+                    yield wait
+                event = state.start((slept or 0) + wait)
+                try:
+                    if not state.timed:
+                        response = f(*args, **kwargs)
+                    else:
+                        timeout = state.timeout()
+                        token = _deadline.set(state.clock() + timeout)
+                        try:
+                            response = call_with_timeout(f, args, kwargs, timeout)
+                        finally:
+                            _deadline.reset(token)
+                    handler = state.condition_handler(response, event)
+                    if handler is None:
+                        return response
+                    result = handler(response, state.tries - 1)
+                    if handler.is_async:
+                        # Keep supporting async handlers on sync functions
+                        result = _run_coroutine(result)
+                    if not state.retry(handler, result, response, event):
+                        return result
                 except Exception as e:
-                    if config["exceptions"]:
-                        if config["exceptions"].get("raise", False):
-                            logger.debug(f"Got raise event from exception {type(e).__name__} because of config")
-                            raise e
-                        action = config["exceptions"].get(type(e), None) or config["exceptions"].get("all", None)
-                        if action:
-                            result = await run_action(action, e)
-                            if result == RETRY_EVENT:
-                                logger.debug(f"Got retry event ({result}) from exception {type(e).__name__}")
-                                tries += 1
-                                continue
-                            else:
-                                logger.debug(f"Got result ({result}) from exception {type(e).__name__}")
-                                return result
-
-                    logger.error(f"Unhandled exception {type(e).__name__} ({e})")
-                    raise UnhandledException(e)
-
-        if asyncio.iscoroutinefunction(f):
-            return async_wrapper
-        else:
-            @functools.wraps(f)
-            def wrapper(*args, **kwargs):
-                return asyncio.run(async_wrapper(*args, **kwargs))
+                    handler = state.exception_handler(e, event)
+                    result = handler(e, state.tries - 1)
+                    if handler.is_async:
+                        result = _run_coroutine(result)
+                    if not state.retry(handler, result, e, event, error=True):
+                        return result
+
+        async def observed_async(config, args, kwargs):
+            observer, call = config.observer, CallEvent(f, args, kwargs)
+            observer.call_started(call)
+            try:
+                result = await run_async(config, args, kwargs, call)
+            except BaseException as e:
+                observer.call_ended(call.end(EXHAUSTED if isinstance(e, RetriesExhausted) else ERROR, e))
+                raise
+            observer.call_ended(call.end(OK))
+            return result
+
+        def observed_steps(config, args, kwargs):
+            observer, call = config.observer, CallEvent(f, args, kwargs)
+            observer.call_started(call)
+            try:
+                result = yield from attempts(config, args, kwargs, call)
+            except BaseException as e:
+                observer.call_ended(call.end(EXHAUSTED if isinstance(e, RetriesExhausted) else ERROR, e))
+                raise
+            observer.call_ended(call.end(OK))
+            return result
 
-            return wrapper
+        def steps(config, args, kwargs):
+            if config.observer is None:
+                return attempts(config, args, kwargs)
+            return observed_steps(config, args, kwargs)
+
+        @functools.wraps(f)
+        async def async_wrapper(*args, **kwargs):
+            config = resolve_policy(kwargs)
+            run = run_async if config.observer is None else observed_async
+            try:
+                if config.cache is None:
+                    return await run(config, args, kwargs)
+                return await config.cache.async_call(
+                    config.cache.key_for(f, args, kwargs), lambda: run(config, args, kwargs)
+                )
+            except RetriesExhausted:
+                if config.raise_exhausted:
+                    raise
+                return None
+
+        def retry_steps(*args, **kwargs):
+            """Runs the sync retry loop as a generator yielding the delay before each retry"""
+            config = resolve_policy(kwargs)
+            try:
+                return (yield from steps(config, args, kwargs))
+            except RetriesExhausted:
+                if config.raise_exhausted:
+                    raise
+                return None
+
+        @functools.wraps(f)
+        def sync_wrapper(*args, **kwargs):
+            config = resolve_policy(kwargs)
+            try:
+                if config.cache is None:
+                    return run_steps(steps(config, args, kwargs))
+                return config.cache.call(
+                    config.cache.key_for(f, args, kwargs), lambda: run_steps(steps(config, args, kwargs))
+                )
+            except RetriesExhausted:
+                if config.raise_exhausted:
+                    raise
+                return None
+
+        if iscoroutinefunction(f):
+            wrapper = async_wrapper
+        else:
+            wrapper = sync_wrapper
+            wrapper.retry_steps = retry_steps
+        wrapper.retry_policy = base_policy
+        return wrapper
 
     return decorator
 
-resilient_call = with_retry
\ No newline at end of file
+resilient_call = with_retry
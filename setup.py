@@ -29,4 +29,8 @@ setup(
         "requests",
         "asyncio"
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "test": ["pytest", "aiohttp"],
+    },
 )
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+class StandInServer:
+    """A local HTTP/1.1 server on the running event loop, standing in for an upstream.
+
+    `respond(method, target, headers)` returns the `(status, headers, body)`
+    of every request. Requests are recorded in `requests` and connections
+    counted, so tests can check keep-alive reuse. It also works as a plain
+    HTTP proxy: proxied requests have an absolute url as their target.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.connections = 0
+        self.port = None
+        self._server = None
+        self._writers = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def __aenter__(self) -> "StandInServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        try:
+            while 1:
+                line = await reader.readline()
+                if not line:
+                    return
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while 1:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+                self.requests.append((method, target, headers))
+                status, response_headers, body = self.respond(method, target, headers)
+                head = [f"HTTP/1.1 {status} Stand-in", f"Content-Length: {len(body)}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.stand_in.lock:
+            self.server.stand_in.connections += 1
+
+    def _respond(self):
+        stand_in = self.server.stand_in
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        if "content-length" in headers:
+            self.rfile.read(int(headers["content-length"]))
+        with stand_in.lock:
+            stand_in.requests.append((self.command, self.path, headers))
+        status, response_headers, body = stand_in.respond(self.command, self.path, headers)
+        self.send_response(status)
+        if "Content-Length" not in response_headers:
+            self.send_header("Content-Length", str(len(body)))
+        elif int(response_headers["Content-Length"]) > len(body):
+            # A body cut short, as if the connection dropped
+            self.close_connection = True
+        for name, value in response_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = _respond
+
+    def log_message(self, *args):
+        pass
+
+class ThreadedStandInServer:
+    """`StandInServer` for sync clients, serving every connection on its own thread.
+
+    A `Content-Length` larger than the body returned by `respond` sends the
+    truncated body and closes the connection.
+
+    Use it as `with threaded_stand_in(respond) as server`.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.port = self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ThreadedStandInServer":
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+@pytest.fixture
+def threaded_stand_in():
+    """Returns the `ThreadedStandInServer` class"""
+    return ThreadedStandInServer
+
+@pytest.fixture
+def stand_in():
+    """Returns the `StandInServer` class, use it as `async with stand_in(respond) as server`"""
+    return StandInServer
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+from resilient_caller import AdaptiveLimiter, RETRY_EVENT, RetryScheduler, resilient_call
+
+def test_async_waiters_get_the_released_slot():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+        await limiter.async_acquire()
+        waiter = asyncio.create_task(limiter.async_acquire())
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["waiting"] == 1
+        limiter.release()
+        await asyncio.wait_for(waiter, 1)
+        return limiter.inflight
+
+    assert asyncio.run(main()) == 1
+
+def test_cancelled_waiter_passes_its_wakeup_on():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+        await limiter.async_acquire()
+        first = asyncio.create_task(limiter.async_acquire())
+        second = asyncio.create_task(limiter.async_acquire())
+        await asyncio.sleep(0.01)
+        # Wakes the first waiter, which is cancelled before taking the slot
+        limiter.release()
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    assert stats["inflight"] == 1 and stats["waiting"] == 0
+
+def test_scheduled_calls_are_limited_and_observed():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+    attempts, running, lock = {}, [], threading.Lock()
+
+    @limiter
+    @resilient_call()
+    def fetch(key):
+        with lock:
+            running.append(limiter.inflight)
+            attempts[key] = attempts.get(key, 0) + 1
+        time.sleep(0.01)
+        return 503 if attempts[key] == 1 else key
+
+    scheduler = RetryScheduler(workers=2)
+    try:
+        futures = [scheduler.submit(fetch, key, retries=3, delay=0.2, conditions={503: RETRY_EVENT}) for key in range(2)]
+        time.sleep(0.1)
+        # Both calls are parked in backoff, neither holds the slot
+        assert scheduler.depth == 2 and limiter.inflight == 0
+        assert [future.result(2) for future in futures] == [0, 1]
+    finally:
+        scheduler.shutdown()
+    assert running == [1] * 4
+    assert limiter.inflight == 0 and limiter.baseline is not None
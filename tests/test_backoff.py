@@ -0,0 +1,69 @@
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from resilient_caller import RETRY_EVENT, backoff, resilient_call
+
+class Response:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+class Error(Exception):
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+def test_exponential_is_capped():
+    strategy = backoff.exponential(base=0.5, factor=2, cap=3)
+    assert [strategy(tries) for tries in range(1, 6)] == [0.5, 1, 2, 3, 3]
+    assert strategy(10 ** 6) == 3
+
+def test_fibonacci_is_capped():
+    strategy = backoff.fibonacci(base=1, cap=10)
+    assert [strategy(tries) for tries in range(1, 9)] == [1, 1, 2, 3, 5, 8, 10, 10]
+
+def test_jitter_stays_in_bounds():
+    random.seed(7)
+    full, equal, decorrelated = backoff.full_jitter(cap=8), backoff.equal_jitter(cap=8), backoff.decorrelated_jitter(cap=8)
+    for tries in range(1, 8):
+        ceiling = min(8, 2 ** (tries - 1))
+        assert 0 <= full(tries) <= ceiling
+        assert ceiling / 2 <= equal(tries) <= ceiling
+        assert 1 <= decorrelated(tries, ceiling) <= min(8, ceiling * 3)
+
+@pytest.mark.parametrize("strategy, expected", [
+    (backoff.exponential(base=1), [1, 2, 4, 8]),
+    (lambda tries, delay: delay + 1, [1, 2, 3, 4]),
+])
+def test_strategy_sets_the_first_retry(monkeypatch, strategy, expected):
+    waits = []
+    monkeypatch.setattr("resilient_caller.wrapper.sleep", waits.append)
+
+    @resilient_call(backoff_strategy=strategy)
+    def fetch():
+        return 503
+
+    assert fetch(retries=5, delay=0, conditions={503: RETRY_EVENT}) is None
+    assert waits == expected
+
+@pytest.mark.parametrize("outcome, expected", [
+    (Response(429, {"Retry-After": "2.5"}), 2.5),
+    (Response(503, {"Retry-After": "-3"}), 0),
+    (Error(Response(503, {"Retry-After": "1"})), 1),
+    (Response(500, {"Retry-After": "1"}), None),
+    (Response(429), None),
+    (Response(429, {"Retry-After": "soon"}), None),
+    (ValueError("no response"), None),
+])
+def test_retry_after_delay(outcome, expected):
+    assert backoff.retry_after_delay(outcome) == expected
+
+def test_retry_after_delay_parses_http_dates():
+    date = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = backoff.retry_after_delay(Response(503, {"Retry-After": format_datetime(date, usegmt=True)}))
+    assert 28 <= delay <= 30
+    past = format_datetime(date - timedelta(hours=1), usegmt=True)
+    assert backoff.retry_after_delay(Response(503, {"Retry-After": past})) == 0
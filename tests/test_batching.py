@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resilient_caller import BatchLoader, CircuitBreaker, MetricsRegistry, RETRY_EVENT, RetriesExhausted, RetryPolicy
+
+class Flaky:
+    """Batch function failing the items of `failures` the first `times` times they are asked for"""
+    def __init__(self, failures, times=1):
+        self.failures = dict.fromkeys(failures, times)
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(sorted(items))
+        results = []
+        for item in items:
+            if self.failures.get(item):
+                self.failures[item] -= 1
+                results.append(ValueError(item))
+            else:
+                results.append(item * 10)
+        return results
+
+def test_only_failed_items_are_retried():
+    flaky = Flaky([2])
+    with BatchLoader(flaky, max_wait=0.05, retries=3, exceptions={ValueError: RETRY_EVENT}) as loader:
+        with ThreadPoolExecutor(3) as pool:
+            results = list(pool.map(loader.load, [1, 2, 3]))
+    assert results == [10, 20, 30]
+    assert flaky.batches == [[1, 2, 3], [2]]
+
+def test_items_keep_their_own_tries():
+    flaky = Flaky([2], times=5)
+    with BatchLoader(flaky, max_wait=0.05, retries=2, exceptions={ValueError: RETRY_EVENT},
+                     raise_exhausted=True) as loader:
+        futures = [loader.submit(item) for item in (1, 2)]
+        assert futures[0].result() == 10
+        with pytest.raises(RetriesExhausted):
+            futures[1].result()
+    assert flaky.batches == [[1, 2], [2]]
+
+def test_mapping_results_and_missing_items():
+    batches = []
+
+    def lookup(items):
+        batches.append(sorted(items))
+        # Item 3 only shows up on its retry
+        return {item: item * 10 for item in items if item != 3 or len(batches) > 1}
+
+    with BatchLoader(lookup, max_wait=0.05, retries=3, exceptions={KeyError: RETRY_EVENT}) as loader:
+        assert loader.load_many([1, 3]) == [10, 30]
+    assert batches == [[1, 3], [3]]
+
+def test_async_batch_function_retries_items():
+    flaky = Flaky([1])
+
+    async def batch(items):
+        await asyncio.sleep(0)
+        return flaky(items)
+
+    async def main():
+        loader = BatchLoader(batch, max_wait=0.01, retries=3, exceptions={ValueError: RETRY_EVENT})
+        return await loader.async_load_many([1, 2, 3])
+
+    assert asyncio.run(main()) == [10, 20, 30]
+    assert flaky.batches == [[1, 2, 3], [1]]
+
+def test_unsupported_options_are_rejected():
+    with pytest.raises(TypeError):
+        BatchLoader(lambda items: items, hedge=object())
+    # Not silently ignored when they come from the policy either
+    for policy in (RetryPolicy(circuit_breaker=CircuitBreaker()), RetryPolicy(observer=MetricsRegistry())):
+        with pytest.raises(TypeError, match="Unsupported batch retry options"):
+            BatchLoader(lambda items: items, policy=policy)
+    BatchLoader(lambda items: items, policy=RetryPolicy(retries=3, delay=1), max_wait=0.1)
+
+def test_async_batches_are_referenced_while_running():
+    started = []
+
+    async def batch(items):
+        started.append(len(loader._tasks))
+        await asyncio.sleep(0.01)
+        return [item * 10 for item in items]
+
+    async def main():
+        results = await loader.async_load_many(range(5))
+        return results, len(loader._tasks)
+
+    loader = BatchLoader(batch, max_batch_size=2, max_wait=0.01)
+    assert asyncio.run(main()) == ([0, 10, 20, 30, 40], 0)
+    assert started and all(started)
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from resilient_caller import CircuitBreaker, CircuitOpenError, LocalBackend, MmapBackend, RETRY_EVENT, resilient_call
+
+RESET = 0.05
+
+@pytest.fixture(params=["local", "shared", "mmap"])
+def breaker(request, tmp_path):
+    # The same state machine, in process or on a `StateBackend`
+    backend = {"local": None, "shared": LocalBackend(), "mmap": MmapBackend(str(tmp_path / "state"), slots=16)}
+    return CircuitBreaker(failure_rate=0.5, window=4, min_calls=2, reset_timeout=RESET, backend=backend[request.param])
+
+def test_opens_once_the_failure_rate_is_reached(breaker):
+    circuit = breaker.circuit("key")
+    circuit.record(True)
+    circuit.record(False)
+    assert breaker.state("key") == "open"
+    assert not circuit.allow()
+
+def test_successful_trial_closes(breaker):
+    circuit = breaker.circuit("key")
+    circuit.record(False)
+    circuit.record(False)
+    time.sleep(RESET * 1.5)
+    assert circuit.allow()
+    assert breaker.state("key") == "half_open"
+    # Only one trial at a time
+    assert not circuit.allow()
+    circuit.record(True)
+    assert breaker.state("key") == "closed"
+    assert circuit.allow()
+
+def test_failed_trial_reopens(breaker):
+    circuit = breaker.circuit("key")
+    circuit.record(False)
+    circuit.record(False)
+    time.sleep(RESET * 1.5)
+    assert circuit.allow()
+    circuit.record(False)
+    assert breaker.state("key") == "open"
+    assert not circuit.allow()
+
+def test_stragglers_dont_change_an_open_circuit(breaker):
+    circuit = breaker.circuit("key")
+    circuit.record(False)
+    circuit.record(False)
+    # Outcomes of attempts started before the circuit opened
+    circuit.record(True)
+    assert breaker.state("key") == "open"
+    time.sleep(RESET * 0.6)
+    circuit.record(False)
+    time.sleep(RESET * 0.9)
+    # Still half-open on time, the late failure didn't extend the cool-down
+    assert circuit.allow()
+
+def test_open_circuit_fails_calls_fast(breaker):
+    calls = []
+
+    @resilient_call()
+    def flaky():
+        calls.append(1)
+        return 500
+
+    # The circuit opens after two failures, the third attempt doesn't go through
+    with pytest.raises(CircuitOpenError):
+        flaky(conditions={500: RETRY_EVENT}, retries=5, circuit_breaker=breaker)
+    assert len(calls) == 2
+    with pytest.raises(CircuitOpenError):
+        flaky(conditions={500: RETRY_EVENT}, retries=5, circuit_breaker=breaker)
+    assert len(calls) == 2
+
+def test_circuits_are_keyed():
+    breaker = CircuitBreaker(failure_rate=0.5, window=2, min_calls=2, key=lambda host, path: host)
+    circuit = breaker.circuit_for(None, ("a.test", "/x"), {})
+    assert circuit is breaker.circuit_for(None, ("a.test", "/y"), {})
+    circuit.record(False)
+    circuit.record(False)
+    assert breaker.states() == {"a.test": "open"}
+    assert breaker.state("b.test") == "closed"
+
+def test_failures_below_min_calls_dont_open():
+    breaker = CircuitBreaker(failure_rate=0.5, window=10, min_calls=5)
+    circuit = breaker.circuit("key")
+    for _ in range(4):
+        circuit.record(False)
+    assert breaker.state("key") == "closed"
+    circuit.record(False)
+    assert breaker.state("key") == "open"
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from resilient_caller import RETRY_EVENT, resilient_call, resilient_map
+
+def double(item):
+    if item == 3:
+        raise ValueError(item)
+    return item * 2
+
+@resilient_call()
+def negate(item):
+    return -item
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_outcomes_of_undecorated_functions(backend):
+    outcomes = list(resilient_map(double, range(5), concurrency=2, backend=backend, retries=2,
+                                  exceptions={ValueError: RETRY_EVENT}))
+    assert [(outcome.index, outcome.status, outcome.result) for outcome in outcomes] == [
+        (0, "ok", 0), (1, "ok", 2), (2, "ok", 4), (3, "exhausted", None), (4, "ok", 8),
+    ]
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_decorated_functions(backend):
+    outcomes = list(resilient_map(negate, range(3), concurrency=2, backend=backend))
+    assert [outcome.result for outcome in outcomes] == [0, -1, -2]
+
+def test_failing_items_dont_abort_the_batch():
+    outcomes = list(resilient_map(double, [3, 1], exceptions={KeyError: RETRY_EVENT}))
+    assert [outcome.status for outcome in outcomes] == ["error", "ok"]
+
+def test_closing_early_stops_the_async_map():
+    started = []
+
+    @resilient_call()
+    async def slow(item):
+        started.append(item)
+        await asyncio.sleep(0.05)
+        return item
+
+    outcomes = resilient_map(slow, range(100), concurrency=2)
+    assert next(outcomes).result == 0
+    outcomes.close()
+    count = len(started)
+    time.sleep(0.2)
+    assert len(started) == count < 100
+
+def test_iterable_errors_reach_the_consumer():
+    def items():
+        yield 1
+        raise LookupError("broken iterable")
+
+    @resilient_call()
+    async def echo(item):
+        return item
+
+    with pytest.raises(LookupError):
+        list(resilient_map(echo, items()))
+    with pytest.raises(LookupError):
+        list(resilient_map(double, items()))
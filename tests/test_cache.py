@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from resilient_caller import RETRY_EVENT, ResultCache, resilient_call
+
+def test_concurrent_sync_calls_are_coalesced():
+    cache, calls, barrier = ResultCache(), [], threading.Barrier(5)
+
+    @resilient_call()
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.1)
+        return key * 2
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(fetch(21, cache=cache))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 5
+    assert calls == [21]
+    assert cache.stats()["coalesced"] == 4
+    # Then served from the cache
+    assert fetch(21, cache=cache) == 42
+    assert calls == [21]
+    assert cache.stats()["hits"] == 1
+
+def test_concurrent_async_calls_are_coalesced():
+    cache, calls = ResultCache(), []
+
+    @resilient_call()
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return key * 2
+
+    async def main():
+        return await asyncio.gather(*[fetch(21, cache=cache) for _ in range(5)], fetch(1, cache=cache))
+
+    assert asyncio.run(main()) == [42] * 5 + [2]
+    assert sorted(calls) == [1, 21]
+    assert cache.stats()["coalesced"] == 4
+
+def test_coalesced_calls_share_one_retry_loop():
+    cache, calls = ResultCache(), []
+
+    @resilient_call()
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 503 if len(calls) < 3 else 200
+
+    async def main():
+        return await asyncio.gather(*[fetch(cache=cache, retries=5, conditions={503: RETRY_EVENT}) for _ in range(4)])
+
+    assert asyncio.run(main()) == [200] * 4
+    assert len(calls) == 3
+
+def test_exhausted_calls_are_only_cached_with_negative_ttl():
+    calls = []
+
+    @resilient_call()
+    def fetch():
+        calls.append(1)
+        return 503
+
+    for cache, expected in ((ResultCache(), 4), (ResultCache(negative_ttl=60), 2)):
+        calls.clear()
+        for _ in range(2):
+            assert fetch(cache=cache, retries=2, conditions={503: RETRY_EVENT}) is None
+        assert len(calls) == expected
@@ -0,0 +1,68 @@
+import pytest
+
+from resilient_caller import DeadLetterQueue, RETRY_EVENT, resilient_call
+
+down = set()
+
+@resilient_call()
+def fetch(key, scale=1):
+    if key in down:
+        raise ConnectionError(key)
+    return key * scale
+
+RETRY = {"retries": 2, "exceptions": {ConnectionError: RETRY_EVENT}}
+
+@pytest.fixture
+def queue(tmp_path):
+    down.clear()
+    with DeadLetterQueue(str(tmp_path / "dead.db"), replay_backoff=lambda replays: 0) as queue:
+        yield queue
+
+def test_exhausted_calls_are_stored(queue):
+    down.update((1, 2))
+    for key in (1, 2, 3):
+        fetch(key, scale=10, observer=queue, **RETRY)
+    letters = list(queue.entries())
+    assert [(letter.args, letter.kwargs) for letter in letters] == [((1,), {"scale": 10}), ((2,), {"scale": 10})]
+    assert "ConnectionError" in letters[0].error
+    assert [attempt["outcome"] for attempt in letters[0].history] == ["retry", "retry"]
+
+def test_drain_removes_replayed_entries(queue):
+    down.update((1, 2))
+    for key in (1, 2):
+        fetch(key, scale=10, observer=queue, **RETRY)
+    down.discard(1)
+    outcomes = list(queue.drain(fetch, **RETRY))
+    assert [(outcome.status, outcome.result) for outcome in outcomes] == [("ok", 10), ("exhausted", None)]
+    # The failed replay stays, with its new attempts in its history
+    letters = list(queue.entries())
+    assert len(queue) == 1
+    assert letters[0].args == (2,) and letters[0].replays == 1
+    assert len(letters[0].history) == 4
+
+def test_drain_skips_entries_not_due(tmp_path):
+    down.clear()
+    down.add(1)
+    with DeadLetterQueue(str(tmp_path / "dead.db"), replay_backoff=lambda replays: 3600) as queue:
+        fetch(1, observer=queue, **RETRY)
+        assert [outcome.status for outcome in queue.drain(fetch, **RETRY)] == ["exhausted"]
+        down.clear()
+        # Waiting for its replay backoff
+        assert list(queue.drain(fetch, **RETRY)) == []
+        assert len(queue) == 1
+
+def test_replays_that_fail_again_are_not_queued_twice(queue):
+    down.add(1)
+    fetch(1, observer=queue, **RETRY)
+    list(queue.drain(fetch, observer=queue, **RETRY))
+    assert len(queue) == 1
+
+def test_calls_made_while_draining_are_stored(queue):
+    down.add(1)
+    fetch(1, observer=queue, **RETRY)
+    down.clear()
+    down.add(2)
+    for outcome in queue.drain(fetch, **RETRY):
+        # Not a replay: exhausting here is dead-lettered as usual
+        fetch(2, observer=queue, **RETRY)
+    assert [letter.args for letter in queue.entries()] == [(2,)]
@@ -0,0 +1,63 @@
+import re
+
+from requests import RequestException
+
+from resilient_caller import RETRY_EVENT, download
+
+BODY = bytes(range(256)) * 64
+RETRY = {"retries": 5, "exceptions": {RequestException: RETRY_EVENT}}
+
+def ranged(body, etag='"v1"', cut=None):
+    """Serves `body` with `Range`/`If-Range` support, the first response cut at `cut` bytes"""
+    cuts = [cut] if cut else []
+
+    def respond(method, target, headers):
+        start, status = 0, 200
+        match = re.match(r"bytes=(\d+)-", headers.get("range", ""))
+        if match and headers.get("if-range") == etag:
+            start, status = int(match.group(1)), 206
+        response_headers = {"ETag": etag, "Content-Length": str(len(body) - start)}
+        if status == 206:
+            response_headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        end = start + cuts.pop() if cuts else len(body)
+        return status, response_headers, body[start:end]
+    return respond
+
+def test_download_resumes_from_the_last_byte(threaded_stand_in):
+    with threaded_stand_in(ranged(BODY, cut=5000)) as server:
+        result = download(server.url, chunk_size=1000, **RETRY)
+    assert bytes(result.target) == BODY
+    assert (result.size, result.etag, result.resumes) == (len(BODY), '"v1"', 1)
+    (_, _, first), (_, _, second) = server.requests
+    assert "range" not in first
+    assert second["range"] == "bytes=5000-" and second["if-range"] == '"v1"'
+    assert second["accept-encoding"] == "identity"
+
+def test_download_to_a_file(threaded_stand_in, tmp_path):
+    for use_mmap in (False, True):
+        path = tmp_path / f"body-{use_mmap}"
+        with threaded_stand_in(ranged(BODY, cut=3000)) as server:
+            result = download(server.url, str(path), chunk_size=1000, use_mmap=use_mmap, **RETRY)
+        assert result.target == str(path) and result.resumes == 1
+        assert path.read_bytes() == BODY
+
+def test_changed_resource_restarts(threaded_stand_in):
+    versions = [ranged(BODY, etag='"v1"', cut=4000), ranged(BODY[::-1], etag='"v2"')]
+
+    def respond(*request):
+        # The resource changes after the first response
+        return versions[0 if not server.requests[1:] else 1](*request)
+
+    with threaded_stand_in(respond) as server:
+        result = download(server.url, chunk_size=1000, **RETRY)
+    # `If-Range` didn't match, the whole new version was sent
+    assert bytes(result.target) == BODY[::-1] and result.etag == '"v2"'
+    assert server.requests[1][2]["range"] == "bytes=4000-"
+
+def test_gives_up_when_retries_run_out(threaded_stand_in):
+    def respond(method, target, headers):
+        return 200, {"Content-Length": str(len(BODY))}, BODY[:100]
+
+    with threaded_stand_in(respond) as server:
+        assert download(server.url, **RETRY) is None
+    assert len(server.requests) == 5
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from resilient_caller import (
+    AttemptTimeout, Hedge, Observer, RETRY_EVENT, RateLimiter, RetryBudget, remaining_time, resilient_call,
+)
+
+TIMEOUTS = {"exceptions": {AttemptTimeout: RETRY_EVENT}}
+
+def test_hedge_starts_when_the_attempt_is_slow():
+    calls = []
+
+    @resilient_call()
+    def fetch():
+        calls.append(1)
+        time.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.monotonic()
+    assert fetch(hedge=Hedge(delay=0.05), retries=3) == 2
+    assert time.monotonic() - start < 0.3
+
+def test_hanging_async_attempts_stop_at_the_deadline():
+    @resilient_call(max_elapsed_time=0.3)
+    async def hang():
+        await asyncio.sleep(3)
+        return "late"
+
+    for options in ({}, {"attempt_timeout": 0.1}):
+        start = time.monotonic()
+        assert asyncio.run(hang(hedge=Hedge(delay=0.05), **TIMEOUTS, **options)) is None
+        assert time.monotonic() - start < 0.6
+
+def test_hanging_sync_attempts_stop_at_the_deadline():
+    @resilient_call(max_elapsed_time=0.3)
+    def hang():
+        time.sleep(1)
+        return "late"
+
+    start = time.monotonic()
+    assert hang(hedge=Hedge(delay=0.05), **TIMEOUTS) is None
+    assert time.monotonic() - start < 0.6
+
+def test_hedged_attempts_see_their_deadline():
+    @resilient_call(max_elapsed_time=5)
+    def fetch():
+        return remaining_time()
+
+    @resilient_call(max_elapsed_time=5)
+    async def async_fetch():
+        return remaining_time()
+
+    assert 4 < fetch(hedge=Hedge(delay=1)) <= 5
+    assert 4 < asyncio.run(async_fetch(hedge=Hedge(delay=1))) <= 5
+
+def test_hedged_retries_use_the_shared_checks():
+    calls, hints = [], []
+
+    @resilient_call()
+    def fetch():
+        calls.append(time.monotonic())
+        return 503 if len(calls) < 3 else 200
+
+    options = {"hedge": Hedge(delay=5), "retries": 5, "conditions": {503: RETRY_EVENT}}
+    start = time.monotonic()
+    assert fetch(rate_limiter=RateLimiter(rate=10, burst=1), **options) == 200
+    assert time.monotonic() - start >= 0.2
+
+    calls.clear()
+    assert fetch(delay=5, retry_after=lambda last: hints.append(last) or 0.01, **options) == 200
+    assert hints == [503, 503]
+
+    calls.clear()
+    budget = RetryBudget(ratio=0, min_per_second=0, max_tokens=1)
+    assert fetch(retry_budget=budget, **options) is None
+    assert len(calls) == 2
+
+def test_hedged_attempts_are_observed():
+    events = []
+
+    class Recorder(Observer):
+        def attempt_started(self, event):
+            events.append(("started", event.attempt))
+
+        def attempt_ended(self, event):
+            events.append(("ended", event.outcome))
+
+    @resilient_call()
+    async def fetch():
+        return 200
+
+    assert asyncio.run(fetch(hedge=Hedge(delay=1), observer=Recorder())) == 200
+    assert events == [("started", 0), ("ended", "ok")]
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import resilient_caller
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("requests", "asyncio", "sqlite3", "concurrent.futures")
+
+def loaded_after(code):
+    """Returns which of the `HEAVY` modules are imported after running `code` in a fresh interpreter"""
+    script = f"import sys, json\n{code}\nprint(json.dumps([name for name in {HEAVY!r} if name in sys.modules]))"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+def test_decorator_alone_stays_light():
+    assert loaded_after(
+        "from resilient_caller import resilient_call, RETRY_EVENT\n"
+        "@resilient_call()\n"
+        "def f():\n"
+        "    return 1\n"
+        "f(retries=2, exceptions={'all': RETRY_EVENT})"
+    ) == []
+
+def test_extras_are_loaded_on_access():
+    assert loaded_after("import resilient_caller; resilient_caller.backoff") == []
+    assert "requests" in loaded_after("import resilient_caller; resilient_caller.send_request")
+    code = (
+        "from resilient_caller import resilient_call\n"
+        "@resilient_call()\n"
+        "async def f():\n"
+        "    return 1\n"
+    )
+    assert loaded_after(code) == []
+    # Only once it's called
+    assert "asyncio" in loaded_after(code + "try:\n    f().send(None)\nexcept StopIteration:\n    pass")
+
+@pytest.mark.parametrize("name", sorted(resilient_caller._LAZY))
+def test_every_lazy_name_resolves(name):
+    value = getattr(resilient_caller, name)
+    assert value is not None and resilient_caller.__dict__[name] is value
+
+def test_unknown_names_raise_attribute_error():
+    with pytest.raises(AttributeError):
+        resilient_caller.missing
+    assert "send_request" in dir(resilient_caller)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from resilient_caller import RETRY_EVENT, RateLimiter, RetryBudget, resilient_call
+from resilient_caller.timeouts import _clock
+
+@pytest.fixture
+def clock():
+    """A fake clock for the token buckets, advanced with `clock.append(seconds)`"""
+    now = [1000.0]
+    token = _clock.set(lambda: now[-1])
+    yield now
+    _clock.reset(token)
+
+def test_budget_allows_retries_up_to_its_tokens(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+    # Two first attempts pay for one retry
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw() and not budget.withdraw()
+
+def test_budget_refills_per_second(clock):
+    budget = RetryBudget(ratio=0, min_per_second=10, max_tokens=1)
+    assert budget.withdraw() and not budget.withdraw()
+    clock.append(clock[-1] + 0.1)
+    assert budget.withdraw() and not budget.withdraw()
+
+def test_exhausted_budget_stops_retrying():
+    calls = []
+
+    @resilient_call()
+    def fetch():
+        calls.append(1)
+        return 503
+
+    budget = RetryBudget(ratio=0, min_per_second=0, max_tokens=3)
+    for _ in range(3):
+        assert fetch(retries=5, conditions={503: RETRY_EVENT}, retry_budget=budget) is None
+    # 3 first attempts, then the 3 retries the budget had
+    assert len(calls) == 6
+
+def test_limiter_reserves_future_tokens(clock):
+    limiter = RateLimiter(rate=10, burst=2)
+    assert [round(limiter.reserve(), 3) for _ in range(4)] == [0, 0, 0.1, 0.2]
+    clock.append(clock[-1] + 1)
+    assert limiter.reserve() == 0
+
+def test_limiter_buckets_are_keyed(clock):
+    limiter = RateLimiter(rate=1, burst=1, key=lambda host: host)
+    assert limiter.reserve(limiter.key_for(None, ("a.test",), {})) == 0
+    assert limiter.reserve(limiter.key_for(None, ("b.test",), {})) == 0
+    assert limiter.reserve(limiter.key_for(None, ("a.test",), {})) == 1
+
+def test_limiter_spaces_attempts():
+    limiter = RateLimiter(rate=20, burst=1)
+
+    @resilient_call()
+    def fetch():
+        return 200
+
+    @resilient_call()
+    async def async_fetch():
+        return 200
+
+    start = time.monotonic()
+    for _ in range(3):
+        fetch(rate_limiter=limiter)
+    assert time.monotonic() - start >= 0.09
+
+    async def main():
+        limiter = RateLimiter(rate=20, burst=1)
+        return await asyncio.gather(*[async_fetch(rate_limiter=limiter) for _ in range(3)])
+
+    start = time.monotonic()
+    assert asyncio.run(main()) == [200] * 3
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,64 @@
+import pytest
+
+from resilient_caller import MetricsRegistry, RETRY_EVENT, RetriesExhausted, SpanObserver, resilient_call
+
+def flaky(outcomes):
+    @resilient_call()
+    def fetch():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return fetch
+
+OPTIONS = {"retries": 3, "delay": 0.01, "conditions": {503: RETRY_EVENT}, "exceptions": {ValueError: RETRY_EVENT}}
+
+def test_registry_counts_calls_and_attempts():
+    metrics = MetricsRegistry(buckets=(0.5, 1))
+    fetch = flaky([503, ValueError(), 200, 503, 503, 503])
+    assert fetch(observer=metrics, **OPTIONS) == 200
+    with pytest.raises(RetriesExhausted):
+        fetch(observer=metrics, raise_exhausted=True, **OPTIONS)
+
+    assert metrics.counter("calls_total", function="fetch", outcome="ok") == 1
+    assert metrics.counter("calls_total", function="fetch", outcome="exhausted") == 1
+    assert metrics.counter("attempts_total", function="fetch", outcome="retry") == 5
+    assert metrics.counter("attempts_total", function="fetch", outcome="ok") == 1
+    assert metrics.counter("retry_wait_seconds_total", function="fetch") == pytest.approx(0.04)
+
+    histograms = {histogram["name"]: histogram for histogram in metrics.snapshot()["histograms"]}
+    attempts = histograms["attempt_duration_seconds"]
+    assert attempts["labels"] == {"function": "fetch"}
+    assert attempts["count"] == 6 and attempts["counts"] == [6, 0, 0]
+
+    metrics.clear()
+    assert metrics.snapshot() == {"counters": [], "histograms": []}
+
+def test_prometheus_export():
+    metrics = MetricsRegistry(buckets=(1,), prefix="app")
+    assert flaky([503, 200])(observer=metrics, **OPTIONS) == 200
+    lines = metrics.to_prometheus().splitlines()
+    assert lines.count("# TYPE app_attempts_total counter") == 1
+    assert 'app_attempts_total{function="fetch",outcome="retry"} 1' in lines
+    assert 'app_calls_total{function="fetch",outcome="ok"} 1' in lines
+    assert "# TYPE app_attempt_duration_seconds histogram" in lines
+    assert 'app_attempt_duration_seconds_bucket{function="fetch",le="1"} 2' in lines
+    assert 'app_attempt_duration_seconds_bucket{function="fetch",le="+Inf"} 2' in lines
+    assert 'app_attempt_duration_seconds_count{function="fetch"} 2' in lines
+
+def test_spans_nest_attempts_under_their_call():
+    spans = []
+
+    def start_span(name, attributes, parent):
+        span = {"name": name, "parent": parent and parent["name"], **attributes}
+        spans.append(span)
+        return span
+
+    def end_span(span, attributes, error):
+        span.update(attributes, error=type(error).__name__ if error else None)
+
+    assert flaky([ValueError(), 200])(observer=[SpanObserver(start_span, end_span)], **OPTIONS) == 200
+    assert [(span["name"], span["parent"], span["retry.outcome"]) for span in spans] == [
+        ("fetch", None, "ok"), ("fetch attempt", "fetch", "retry"), ("fetch attempt", "fetch", "ok"),
+    ]
+    assert spans[1]["error"] == "ValueError" and spans[0]["retry.attempts"] == 2
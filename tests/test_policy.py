@@ -0,0 +1,37 @@
+import errno
+
+from resilient_caller import RETRY_EVENT, RetryPolicy, resilient_call
+
+def test_closest_base_class_wins():
+    policy = RetryPolicy(exceptions={OSError: "os", ConnectionError: "connection", "all": "other"})
+    assert policy.exception_handler(ConnectionResetError()).key is ConnectionError
+    assert policy.exception_handler(FileNotFoundError()).key is OSError
+    assert policy.exception_handler(KeyError())(KeyError(), 0) == "other"
+
+def test_resolution_is_memoized_per_type():
+    policy = RetryPolicy(exceptions={LookupError: "lookup"})
+    assert policy.exception_handler(KeyError("a")) is policy.exception_handler(KeyError("b"))
+    assert policy.exception_handler(ValueError()) is None
+    assert policy.exception_memo == {KeyError: policy.exception_handlers[LookupError], ValueError: None}
+
+def test_predicates_are_checked_first_and_in_order():
+    refused = lambda error: getattr(error, "errno", None) == errno.ECONNREFUSED
+    policy = RetryPolicy(exceptions={
+        refused: "refused", lambda error: isinstance(error, OSError): "any os", OSError: "class",
+    })
+    assert policy.exception_handler(ConnectionRefusedError(errno.ECONNREFUSED, "refused")).action == "refused"
+    assert policy.exception_handler(OSError(errno.ENOENT, "missing")).action == "any os"
+    # Predicates don't go through the memo
+    assert not policy.exception_memo
+    assert policy.exception_handlers == {OSError: policy.exception_handlers[OSError]}
+
+def test_retry_on_predicate():
+    errors = [ConnectionRefusedError(errno.ECONNREFUSED, "refused"), OSError(errno.EACCES, "denied")]
+
+    @resilient_call()
+    def connect():
+        raise errors.pop(0)
+
+    exceptions = {lambda error: error.errno == errno.ECONNREFUSED: RETRY_EVENT, OSError: "gave up"}
+    assert connect(retries=5, exceptions=exceptions) == "gave up"
+    assert not errors
@@ -0,0 +1,68 @@
+import random
+from time import monotonic, sleep
+
+from resilient_caller import Proxy, ProxyPool, RETRY_EVENT, SessionPool, send_request
+
+def ok(method, target, headers):
+    return 200, {}, b"ok"
+
+def test_round_robin_skips_quarantined_proxies():
+    pool = ProxyPool(["127.0.0.1:1", "127.0.0.1:2", "127.0.0.1:3"], cooldown=60)
+    first, second, third = pool.proxies
+    assert [pool.acquire() for _ in range(3)] == [first, second, third]
+    pool.report(second, False)
+    assert [pool.acquire() for _ in range(3)] == [first, third, third]
+    assert pool.stats() == {"total": 3, "available": 2, "quarantined": 1}
+    pool.report(second, True)
+    assert pool.available() == 3
+
+def test_quarantine_grows_and_falls_back_on_the_first_one_back():
+    pool = ProxyPool(["127.0.0.1:1", "127.0.0.1:2"], cooldown=10, max_cooldown=30)
+    first, second = pool.proxies
+    pool.report(first, False)
+    pool.report(first, False)
+    pool.report(second, False)
+    # 20 seconds for the second strike of `first`, 10 for `second`
+    assert 19 < first.quarantined_until - monotonic() <= 20
+    assert pool.available() == 0
+    assert pool.acquire() is second
+    for _ in range(4):
+        pool.report(first, False)
+    assert first.quarantined_until - monotonic() <= 30
+
+def test_quarantined_proxies_are_released():
+    pool = ProxyPool(["127.0.0.1:1", "127.0.0.1:2"], cooldown=0.05)
+    pool.report(pool.proxies[0], False)
+    assert pool.available() == 1
+    sleep(0.06)
+    assert pool.available() == 2
+    pool.report(pool.proxies[0], False)
+    pool.report(pool.proxies[1], False)
+    assert pool.available() == 0
+
+def test_weighted_prefers_healthy_proxies():
+    random.seed(3)
+    pool = ProxyPool([Proxy(f"http://127.0.0.1:{port}/") for port in range(1, 5)], strategy="weighted", cooldown=0)
+    best = pool.proxies[0]
+    for proxy in pool.proxies:
+        for _ in range(5):
+            pool.report(proxy, proxy is best, latency=0.1 if proxy is best else 1)
+    picks = [pool.acquire() for _ in range(200)]
+    assert picks.count(best) > 70
+    assert max(proxy.score for proxy in pool.proxies) == best.score
+
+def test_send_request_reports_to_proxy_pool(threaded_stand_in):
+    pool = SessionPool()
+    with threaded_stand_in(lambda *request: (407, {}, b"")) as bad, threaded_stand_in(ok) as good:
+        proxies = ProxyPool([bad.url, good.url])
+        response = send_request(
+            "http://upstream.test/", proxies=proxies, pool=pool, retries=3,
+            conditions={407: RETRY_EVENT}, conditions_criteria=lambda response: response.status_code,
+        )
+    pool.close()
+    assert response.status_code == 200
+    assert len(bad.requests) == len(good.requests) == 1
+    by_url = {proxy.url.rstrip("/"): proxy for proxy in proxies.proxies}
+    assert by_url[bad.url].failures and by_url[bad.url].quarantined_until > monotonic()
+    assert by_url[good.url].successes and by_url[good.url].latency is not None
+    assert proxies.stats()["quarantined"] == 1
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from resilient_caller import RETRY_EVENT, RetryScheduler, UnhandledException, resilient_call
+
+@pytest.fixture
+def scheduler():
+    scheduler = RetryScheduler(workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+def test_callbacks_run_in_due_order(scheduler):
+    ran, finished = [], threading.Event()
+    scheduler.call_later(0.06, lambda: (ran.append("late"), finished.set()))
+    scheduler.call_later(0.02, ran.append, "early")
+    assert scheduler.depth == 2
+    assert 0 < scheduler.next_due() <= 0.02
+    assert finished.wait(1)
+    assert ran == ["early", "late"]
+    assert scheduler.depth == 0 and scheduler.next_due() is None
+
+def test_calls_in_backoff_dont_hold_a_worker(scheduler):
+    attempts = {}
+
+    @resilient_call()
+    def fetch(key):
+        attempts[key] = attempts.get(key, 0) + 1
+        return 503 if attempts[key] == 1 else key
+
+    start = time.monotonic()
+    futures = [scheduler.submit(fetch, key, retries=3, delay=0.2, conditions={503: RETRY_EVENT}) for key in range(5)]
+    time.sleep(0.1)
+    # Every call ran its first attempt on the single worker and is parked
+    assert scheduler.depth == 5
+    assert [future.result(2) for future in futures] == list(range(5))
+    # One backoff for all of them, not one after the other
+    assert time.monotonic() - start < 0.6
+
+def test_submitted_errors_reach_the_future(scheduler):
+    @resilient_call()
+    def broken():
+        raise KeyError("missing")
+
+    future = scheduler.submit(broken, exceptions={ValueError: RETRY_EVENT})
+    with pytest.raises(UnhandledException):
+        future.result(1)
+
+def test_async_calls_park_on_the_scheduler(scheduler):
+    attempts = []
+
+    @resilient_call()
+    async def fetch():
+        attempts.append(1)
+        return 503 if len(attempts) < 3 else 200
+
+    async def main():
+        task = asyncio.ensure_future(fetch(retries=5, delay=0.05, conditions={503: RETRY_EVENT}, scheduler=scheduler))
+        await asyncio.sleep(0.02)
+        depth = scheduler.depth
+        return depth, await task
+
+    assert asyncio.run(main()) == (1, 200)
+    assert len(attempts) == 3
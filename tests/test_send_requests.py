@@ -0,0 +1,86 @@
+import asyncio
+from time import monotonic
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from resilient_caller import AsyncSessionPool, ProxyPool, RETRY_EVENT, async_send_request
+
+def ok(method, target, headers):
+    return 200, {}, b"ok"
+
+def test_async_send_request_reuses_pooled_connections(stand_in):
+    async def main():
+        pool = AsyncSessionPool()
+        async with stand_in(ok) as server:
+            bodies = []
+            for i in range(3):
+                response = await async_send_request(f"{server.url}/items/{i}", pool=pool)
+                bodies.append((response.status, await response.text()))
+            await pool.close()
+        return server, bodies
+
+    server, bodies = asyncio.run(main())
+    assert bodies == [(200, "ok")] * 3
+    assert [target for _, target, _ in server.requests] == ["/items/0", "/items/1", "/items/2"]
+    assert server.connections == 1
+
+def test_async_send_request_waits_for_retry_after(stand_in):
+    statuses = iter([503, 200])
+
+    def respond(method, target, headers):
+        status = next(statuses)
+        return status, {"Retry-After": "0.2"} if status == 503 else {}, b""
+
+    async def main():
+        pool = AsyncSessionPool()
+        async with stand_in(respond) as server:
+            start = monotonic()
+            response = await async_send_request(
+                server.url, pool=pool, retries=3, delay=5, conditions={503: RETRY_EVENT},
+                conditions_criteria=lambda response: response.status,
+            )
+            elapsed = monotonic() - start
+            await pool.close()
+        return server, response, elapsed
+
+    server, response, elapsed = asyncio.run(main())
+    assert response.status == 200
+    assert len(server.requests) == 2
+    # The hint replaces the 5 seconds delay
+    assert 0.2 <= elapsed < 2
+
+def test_async_send_request_rotates_proxy_list(stand_in):
+    async def main():
+        pool = AsyncSessionPool()
+        async with stand_in(ok) as first, stand_in(ok) as second:
+            proxies = [f"127.0.0.1:{first.port}", f"127.0.0.1:{second.port}"]
+            for _ in range(2):
+                await async_send_request("http://upstream.test/path", proxies=proxies, pool=pool)
+            await pool.close()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert len(first.requests) == len(second.requests) == 1
+    assert first.requests[0][1] == second.requests[0][1] == "http://upstream.test/path"
+
+def test_async_send_request_reports_to_proxy_pool(stand_in):
+    async def main():
+        pool = AsyncSessionPool()
+        async with stand_in(lambda *request: (407, {}, b"")) as bad, stand_in(ok) as good:
+            proxies = ProxyPool([bad.url, good.url])
+            response = await async_send_request(
+                "http://upstream.test/", proxies=proxies, pool=pool, retries=3,
+                conditions={407: RETRY_EVENT}, conditions_criteria=lambda response: response.status,
+            )
+            await pool.close()
+        return proxies, response, bad, good
+
+    proxies, response, bad, good = asyncio.run(main())
+    assert response.status == 200
+    assert len(bad.requests) == len(good.requests) == 1
+    by_url = {proxy.url.rstrip("/"): proxy for proxy in proxies.proxies}
+    assert by_url[bad.url].failures and by_url[bad.url].quarantined_until > monotonic()
+    assert by_url[good.url].successes and not by_url[good.url].failures
+    assert proxies.stats()["quarantined"] == 1
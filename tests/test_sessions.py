@@ -0,0 +1,33 @@
+from resilient_caller import SessionPool, send_request
+
+def ok(method, target, headers):
+    return 200, {}, b"ok"
+
+def test_send_request_reuses_pooled_connections(threaded_stand_in):
+    pool = SessionPool()
+    with threaded_stand_in(ok) as server:
+        responses = [send_request(f"{server.url}/items/{i}", pool=pool) for i in range(3)]
+    pool.close()
+    assert [(response.status_code, response.text) for response in responses] == [(200, "ok")] * 3
+    assert server.connections == 1
+
+def test_pooled_sessions_are_not_shared():
+    pool = SessionPool()
+    with pool.session() as first:
+        first.cookies.set("token", "secret")
+        with pool.session() as second:
+            assert second is not first
+    # Given back without its cookies, then reused
+    with pool.session() as session:
+        assert session in (first, second)
+        assert not session.cookies
+
+def test_proxies_are_passed_per_request(threaded_stand_in):
+    pool = SessionPool()
+    with threaded_stand_in(ok) as proxy:
+        response = send_request("http://upstream.test/path", proxies=f"127.0.0.1:{proxy.port}", pool=pool)
+        with pool.session() as session:
+            # The shared session itself is left untouched
+            assert not session.proxies
+    assert response.status_code == 200
+    assert proxy.requests[0][1] == "http://upstream.test/path"
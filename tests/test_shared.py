@@ -0,0 +1,64 @@
+import multiprocessing
+
+import pytest
+
+from resilient_caller import MmapBackend, RateLimiter, RetryBudget, StateBackend
+
+def increment(values, now):
+    values[0] += 1
+    return values[0]
+
+def hammer(path, times):
+    backend = MmapBackend(path, slots=16)
+    for _ in range(times):
+        backend.update("counter", increment)
+    backend.close()
+
+def test_backends_must_implement_update():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+def test_mmap_state_survives_reopening(tmp_path):
+    path = str(tmp_path / "state")
+    backend = MmapBackend(path, slots=16)
+    assert backend.get("a") == [0.0] * 4
+    assert [backend.update("a", increment) for _ in range(3)] == [1, 2, 3]
+    backend.update("b", increment)
+    backend.close()
+    backend = MmapBackend(path, slots=16)
+    assert backend.get("a")[0] == 3 and backend.get("b")[0] == 1
+    backend.close()
+
+def test_mmap_table_full(tmp_path):
+    backend = MmapBackend(str(tmp_path / "state"), slots=2)
+    backend.update("a", increment)
+    backend.update("b", increment)
+    with pytest.raises(RuntimeError):
+        backend.update("c", increment)
+    backend.close()
+
+def test_mmap_updates_are_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=hammer, args=(path, 200)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    backend = MmapBackend(path, slots=16)
+    assert backend.get("counter")[0] == 800
+    backend.close()
+
+def test_budgets_and_limiters_share_their_backend(tmp_path):
+    backend = MmapBackend(str(tmp_path / "state"), slots=16)
+    # Two processes' budgets, seen as the same one
+    first, second = (RetryBudget(ratio=0, min_per_second=0, max_tokens=3, backend=backend) for _ in range(2))
+    assert [first.withdraw(), second.withdraw(), first.withdraw(), second.withdraw()] == [True, True, True, False]
+    other = RetryBudget(ratio=0, min_per_second=0, max_tokens=1, backend=backend, key="other")
+    assert other.withdraw()
+
+    first, second = (RateLimiter(rate=1, burst=1, backend=backend) for _ in range(2))
+    assert first.reserve() == 0
+    assert second.reserve() > 0.9
+    backend.close()
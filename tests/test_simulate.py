@@ -0,0 +1,51 @@
+import asyncio
+import random
+
+import pytest
+
+from resilient_caller import RETRY_EVENT, RetryPolicy, backoff
+from resilient_caller.simulate import ErrorRate, Outage, Upstream, compare, constant, report_table, simulate
+
+JITTER = RetryPolicy(retries=4, exceptions={"all": RETRY_EVENT}, backoff_strategy=backoff.full_jitter(base=0.1))
+
+def flaky():
+    return Upstream(latency=constant(0.01), faults=[Outage(start=1, duration=0.5), ErrorRate(0.1)])
+
+def test_same_seed_same_report_with_jitter():
+    first = simulate(JITTER, flaky(), calls=300, rate=100, seed=4)
+    random.random()
+    second = simulate(JITTER, flaky(), calls=300, rate=100, seed=4)
+    assert first.as_dict() == second.as_dict()
+    assert simulate(JITTER, flaky(), calls=300, rate=100, seed=5).as_dict() != first.as_dict()
+
+def test_global_random_state_is_restored():
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    simulate(JITTER, flaky(), calls=50, rate=100)
+    assert random.random() == expected
+
+def test_report_counts_outcomes_and_attempts():
+    upstream = Upstream(latency=constant(0.01), faults=[ErrorRate(1.0)])
+    report = simulate(RetryPolicy(retries=3, exceptions={"all": RETRY_EVENT}), upstream, calls=100, rate=50)
+    assert report.outcomes == {"exhausted": 100} and report.success_rate == 0
+    assert report.attempts == 300 and report.max_attempts == 3
+    assert report.latency_p50 == pytest.approx(0.03) and report.latency_max == pytest.approx(0.03)
+    # A run of 2 seconds of virtual time, whatever the real time it took
+    assert 1.9 < report.duration < 2.5
+
+def test_retries_trade_load_for_success():
+    reports = compare(
+        {"none": RetryPolicy(), "jitter": JITTER}, flaky(), calls=300, rate=100, seed=2,
+    )
+    none, jitter = reports
+    assert none.attempts_per_call == 1 and jitter.attempts_per_call > 1
+    assert jitter.success_rate > none.success_rate
+    table = report_table(reports).splitlines()
+    assert table[0].split()[0] == "policy" and [row.split()[0] for row in table[1:]] == ["none", "jitter"]
+
+def test_simulate_inside_a_running_loop():
+    async def main():
+        return simulate(JITTER, flaky(), calls=50, rate=100)
+
+    assert asyncio.run(main()).as_dict() == simulate(JITTER, flaky(), calls=50, rate=100).as_dict()
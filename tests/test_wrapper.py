@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+from resilient_caller import AttemptTimeout, Observer, RETRY_EVENT, RetriesExhausted, UnhandledException, resilient_call
+
+def sequence(*outcomes):
+    """Returns a sync and an async function going through `outcomes`, raising the exceptions"""
+    remaining = list(outcomes)
+
+    def call():
+        outcome = remaining.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    @resilient_call()
+    def sync_call():
+        return call()
+
+    @resilient_call()
+    async def async_call():
+        return call()
+
+    return sync_call, lambda **kwargs: asyncio.run(async_call(**kwargs))
+
+@pytest.fixture(params=["sync", "async"])
+def mode(request):
+    return request.param
+
+def run(mode, *outcomes, **kwargs):
+    sync_call, async_call = sequence(*outcomes)
+    return (sync_call if mode == "sync" else async_call)(**kwargs)
+
+def test_conditions_and_exceptions(mode):
+    assert run(mode, 503, ValueError(), 200, retries=5, conditions={503: RETRY_EVENT},
+               exceptions={ValueError: RETRY_EVENT}) == 200
+    assert run(mode, 404, conditions={404: lambda response, tries: ("missing", tries)}) == ("missing", 0)
+
+def test_exhausted(mode):
+    assert run(mode, 503, 503, retries=2, conditions={503: RETRY_EVENT}) is None
+    with pytest.raises(RetriesExhausted) as error:
+        run(mode, 503, 503, retries=2, conditions={503: RETRY_EVENT}, raise_exhausted=True)
+    assert error.value.tries == 2 and error.value.last == 503
+
+def test_unhandled_and_raised_exceptions(mode):
+    with pytest.raises(UnhandledException):
+        run(mode, KeyError(), exceptions={ValueError: RETRY_EVENT})
+    with pytest.raises(KeyError):
+        run(mode, KeyError(), exceptions={"raise": True})
+
+def test_async_handlers(mode):
+    async def handler(response, tries):
+        await asyncio.sleep(0)
+        return RETRY_EVENT if tries < 1 else ("handled", response)
+
+    assert run(mode, 503, 503, retries=3, conditions={503: handler}) == ("handled", 503)
+
+def test_async_handlers_of_sync_functions_inside_a_running_loop():
+    async def handler(response, tries):
+        await asyncio.sleep(0)
+        return "handled"
+
+    sync_call, _ = sequence(503)
+
+    async def main():
+        return sync_call(conditions={503: handler})
+
+    assert asyncio.run(main()) == "handled"
+
+def test_sync_functions_dont_need_an_event_loop():
+    sync_call, _ = sequence(503, 200)
+
+    async def main():
+        # Called from inside a running loop, the sync loop still just runs
+        return sync_call(retries=2, conditions={503: RETRY_EVENT})
+
+    assert asyncio.run(main()) == 200
+
+def test_retry_steps_yield_the_delays():
+    outcomes = [503, 503, 200]
+
+    @resilient_call()
+    def fetch():
+        return outcomes.pop(0)
+
+    steps = fetch.retry_steps(retries=5, delay=0.5, conditions={503: RETRY_EVENT})
+    assert [next(steps), next(steps)] == [0.5, 0.5]
+    with pytest.raises(StopIteration) as stop:
+        next(steps)
+    assert stop.value.value == 200
+
+def test_hanging_attempts_stop_at_the_deadline():
+    @resilient_call(max_elapsed_time=0.2)
+    def hang():
+        time.sleep(1)
+
+    @resilient_call(max_elapsed_time=0.2)
+    async def async_hang():
+        await asyncio.sleep(1)
+
+    for call in (hang, lambda **kwargs: asyncio.run(async_hang(**kwargs))):
+        start = time.monotonic()
+        with pytest.raises(RetriesExhausted) as info:
+            call(exceptions={AttemptTimeout: RETRY_EVENT}, raise_exhausted=True)
+        assert isinstance(info.value.last, AttemptTimeout)
+        assert time.monotonic() - start < 0.5
+
+def test_observer_events(mode):
+    events = []
+
+    class Recorder(Observer):
+        def attempt_started(self, event):
+            events.append(("started", event.attempt))
+
+        def attempt_ended(self, event):
+            events.append(("ended", event.outcome, event.handler))
+
+        def call_ended(self, event):
+            events.append(("call", event.outcome))
+
+    run(mode, 503, ValueError(), 200, retries=5, conditions={503: RETRY_EVENT},
+        exceptions={ValueError: RETRY_EVENT}, observer=Recorder())
+    assert events == [
+        ("started", 0), ("ended", "retry", 503), ("started", 1), ("ended", "retry", ValueError),
+        ("started", 2), ("ended", "ok", None), ("call", "ok"),
+    ]